@@ -52,9 +52,66 @@ class Config():
 
     # 3. storage
     # 3.1 Time Series storage
+    # 'hdfstore' or 'parquet'
     TIMESERIES_BACKEND = 'hdfstore'
+    # 'thread' or 'process'. Use 'process' when several processes (e.g.
+    # mod_wsgi daemon processes) share the same storage directory.
+    TIMESERIES_BACKEND_LOCK_MODE = 'thread'
+    # None (one file per timeseries), 'month' or 'year' (one file per
+    # timeseries per period). Existing data must be migrated with
+    # scripts/maintenance/partition_hdf5.py when changing this setting.
+    # 'parquet' backend is always partitioned and defaults to 'month'.
+    TIMESERIES_BACKEND_PARTITION = None
+    # 'hdfstore' backend: maintain hour/day/month rollups to serve resample
+    # and aggregate requests. Rollups of existing data must be built with
+    # scripts/maintenance/build_rollups.py.
+    TIMESERIES_BACKEND_ROLLUPS = False
+    # 'hdfstore' backend: keep values of the last N seconds of each written
+    # timeseries in memory to serve reads of recent values. Only usable with
+    # a single process ('thread' lock mode).
+    TIMESERIES_BACKEND_TAIL_WINDOW = None
+    # 'hdfstore' backend compression library ('zlib', 'lzo', 'bzip2',
+    # 'blosc' or 'blosc:<compressor>' with compressor in 'blosclz', 'lz4',
+    # 'lz4hc', 'snappy', 'zlib', 'zstd') and level (0 to 9). Only applies to
+    # tables created afterwards: existing files remain readable. They can be
+    # converted with scripts/maintenance/repack_hdf5.py --complib --complevel.
+    # Use scripts/benchmark/hdf5_compression.py to compare codecs.
+    TIMESERIES_BACKEND_HDFSTORE_COMPLIB = 'zlib'
+    TIMESERIES_BACKEND_HDFSTORE_COMPLEVEL = 9
+    # Compression overrides by site: {site_id: (complib, complevel)}
+    TIMESERIES_BACKEND_HDFSTORE_SITE_COMPRESSION = None
+    # 'hdfstore' backend: repack files in a background thread every N
+    # seconds, one at a time, while the application keeps running. Files
+    # are repacked when the size of their overwritten or deleted rows
+    # reaches TIMESERIES_BACKEND_HDFSTORE_REPACK_THRESHOLD bytes.
+    TIMESERIES_BACKEND_HDFSTORE_REPACK_INTERVAL = None
+    TIMESERIES_BACKEND_HDFSTORE_REPACK_THRESHOLD = 10 * 1024 * 1024
+    # 'parquet' backend compression codec
+    TIMESERIES_BACKEND_PARQUET_COMPRESSION = 'zstd'
+    # Write-ahead log directory. If set, writes are appended to the log and
+    # merged into the storage by a background thread every
+    # TIMESERIES_BACKEND_WAL_COMPACT_INTERVAL seconds. Only usable with a
+    # single process ('thread' lock mode).
+    TIMESERIES_BACKEND_WAL_DIR = None
+    TIMESERIES_BACKEND_WAL_COMPACT_INTERVAL = 10
+    # Flush log to disk on each write
+    TIMESERIES_BACKEND_WAL_FSYNC = True
+    # Read cache size, in bytes. If set, get and resample results are cached
+    # in memory and invalidated by writes. Only usable with a single process
+    # ('thread' lock mode).
+    TIMESERIES_BACKEND_CACHE_SIZE = None
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     # 3.2 Triple store
+    # Number of HTTP connections to the triple store kept alive, shared by
+    # all requests of a process
+    ONTOLOGY_POOL_SIZE = 10
+    # Connection and query response timeouts, in seconds (None: no timeout)
+    ONTOLOGY_CONNECT_TIMEOUT = 5
+    ONTOLOGY_READ_TIMEOUT = 60
+    # Enumerations (types, units...) are cached until the ontology version
+    # (owl:versionInfo) changes. Minimum delay between version checks, in
+    # seconds (0: check at each request, None: never check)
+    ONTOLOGY_ENUMS_CHECK_INTERVAL = 60
 
     # 4. maintenance
     MAINTENANCE_MODE = False
@@ -1,6 +1,7 @@
 """Database extension"""
 
 from bemserver.database import init_handlers
+from bemserver.database.db_enums import enum_cache
 from .accessor import DBAccessor
 
 
@@ -11,4 +12,10 @@ def init_app(app):
     """Initialize ontology manager"""
 
     base_url = app.config['ONTOLOGY_BASE_URL']
-    db_accessor.set_handler(init_handlers(base_url))
+    db_accessor.set_handler(init_handlers(
+        base_url,
+        pool_size=app.config['ONTOLOGY_POOL_SIZE'],
+        connect_timeout=app.config['ONTOLOGY_CONNECT_TIMEOUT'],
+        read_timeout=app.config['ONTOLOGY_READ_TIMEOUT']))
+    enum_cache.check_interval = app.config['ONTOLOGY_ENUMS_CHECK_INTERVAL']
+    enum_cache.clear()
@@ -4,10 +4,11 @@ Inspired by Flask-Limiter
 """
 
 from collections import defaultdict
+from contextlib import ExitStack
 from threading import BoundedSemaphore
 from functools import wraps
 
-from flask import request
+from flask import request, Response
 from werkzeug.exceptions import TooManyRequests
 
 
@@ -31,6 +32,11 @@ class NonBlockingBoundedSemaphore(BoundedSemaphore):
 
 
 class ConcurrencyLimiter:
+    """Limit the number of concurrent requests to a view, per identity
+
+    The slot is released when the view returns, or, if it returns a streamed
+    response, once the response is closed (sent or aborted).
+    """
 
     def __init__(self, app=None, key_func=get_remote_address):
         self.app = app
@@ -58,8 +64,13 @@ class ConcurrencyLimiter:
                         identity,
                         NonBlockingBoundedSemaphore(max_concurrent_requests)
                     )
-                with sema:
-                    return func(*args, **kwargs)
+                with ExitStack() as stack:
+                    stack.enter_context(sema)
+                    result = func(*args, **kwargs)
+                    # Response body is generated after the view returns
+                    if isinstance(result, Response) and result.is_streamed:
+                        result.call_on_close(stack.pop_all().close)
+                    return result
             return wrapper
         return decorator
 
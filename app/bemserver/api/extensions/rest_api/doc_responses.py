@@ -15,6 +15,7 @@ _RESPONSES = {
     403: {'description': 'access refused'},
     404: {'description': 'item not found'},
     413: {'description': 'request too large'},
+    415: {'description': 'unsupported media type'},
     422: {'description': 'invalid input'},
     500: {'description': 'internal server error'},
 }
@@ -10,7 +10,7 @@ from ...models import (
     SpatialInfo, OrientedSpatialInfo, SurfaceInfo, GeographicInfo,
     Localization, System)
 
-from ...database.db_enums import DBEnumHandler
+from ...database.db_enums import DBEnumHandler, enum_cache
 
 
 @rest_api.definition('Node')
@@ -49,6 +49,15 @@ class TreeSchemaView(ma.Schema):
         description='Type label breadcrumb'
     )
 
+    def dump(self, obj, many=None, update_fields=True, **kwargs):
+        """Serialize enumeration trees from cache only once"""
+        def dump(tree):
+            return super(TreeSchemaView, self).dump(
+                tree, many=many, update_fields=update_fields, **kwargs)
+        if many or self.only or self.exclude or self.context:
+            return dump(obj)
+        return enum_cache.get_dump(obj, self.__class__, dump)
+
 
 def validate_hemisphere(value):
     """Validate a input kind."""
@@ -47,6 +47,20 @@ class TimeseriesQueryArgsSchema(TimeseriesUnitConversionQueryArgsSchema):
     )
 
 
+class TimeseriesStreamQueryArgsSchema(TimeseriesQueryArgsSchema):
+    """Timeseries values streaming GET query parameters schema"""
+
+    format = ma.fields.String(
+        attribute='fmt',
+        missing='json',
+        description=(
+            '`json` for the same document as the non-streamed endpoint, '
+            '`ndjson` for one JSON value per line.'),
+        validate=ma.validate.OneOf(('json', 'ndjson')),
+        example='ndjson'
+    )
+
+
 class TimeseriesStatsQueryArgsSchema(ma.Schema):
     """Timeseries stats GET query parameters schema"""
 
@@ -136,6 +150,37 @@ the minumum value from these timeseries at time stamp.""",
     )
 
 
+class TimeseriesBulkQueryArgsSchema(TimeseriesQueryArgsSchema):
+    """Timeseries bulk GET query parameters schema"""
+
+    ts_ids = ma.fields.List(
+        ma.fields.String,
+        required=True,
+        validate=ma.validate.Length(min=1),
+        description='The list of ID for the timeseries to get.',
+    )
+
+    layout = ma.fields.String(
+        missing='blocks',
+        description=(
+            '`blocks` for the values of each timeseries, `wide` for values '
+            'aligned on the union of all timestamps.'),
+        validate=ma.validate.OneOf(('blocks', 'wide')),
+        example='wide'
+    )
+
+
+class TimeseriesLastQueryArgsSchema(TimeseriesUnitConversionQueryArgsSchema):
+    """Timeseries latest value GET query parameters schema"""
+
+    ts_ids = ma.fields.List(
+        ma.fields.String,
+        required=True,
+        validate=ma.validate.Length(min=1),
+        description='The list of ID for the timeseries to get.',
+    )
+
+
 @rest_api.definition('TimeseriesValue')
 class TimeseriesValueSchema(ma.Schema):
     """Timeseries value schema"""
@@ -185,6 +230,70 @@ class TimeseriesSchema(ma.Schema):
     )
 
 
+class TimeseriesValuesField(ma.fields.Nested):
+    """Nested timeseries values field, loaded without per-value validation
+
+    Documented as a list of TimeseriesValue but only checked to be a list of
+    objects: values are validated and parsed column-wise by tsio.tsload.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(TimeseriesValueSchema, many=True, **kwargs)
+
+    def _deserialize(self, value, attr, data):
+        if not isinstance(value, list) or not all(
+                isinstance(row, dict) for row in value):
+            self.fail('type', input=value, type=value.__class__.__name__)
+        return value
+
+
+class TimeseriesLoadSchema(TimeseriesSchema):
+    """Timeseries values PATCH body schema
+
+    data is only required in application/json content. Other formats are not
+    loaded by this schema.
+    """
+
+    data = TimeseriesValuesField()
+
+
+class TimeseriesBulkValuesField(ma.fields.Dict):
+    """Timeseries values by timeseries ID field
+
+    Each timeseries values are only checked to be a list of objects, like
+    TimeseriesValuesField.
+    """
+
+    def _deserialize(self, value, attr, data):
+        value = super()._deserialize(value, attr, data)
+        values_field = TimeseriesValuesField()
+        errors = {}
+        for ts_id, values in value.items():
+            try:
+                values_field.deserialize(values)
+            except ma.ValidationError as exc:
+                errors[ts_id] = exc.messages
+        if errors:
+            raise ma.ValidationError(errors)
+        return value
+
+
+class TimeseriesBulkLoadSchema(ma.Schema):
+    """Timeseries bulk PATCH body schema"""
+
+    class Meta:
+        """Schema Meta properties"""
+        strict = True
+
+    data = TimeseriesBulkValuesField(
+        required=True,
+        description=(
+            'Values of each timeseries, by timeseries ID, in the same format '
+            'as setting values for a timeseries.'),
+        example={'id_1': [{'timestamp': '2017-01-01T00:00:00', 'value': 42}]}
+    )
+
+
 @rest_api.definition('TimeseriesStats')
 class TimeseriesStatsSchema(ma.Schema):
     """TimeseriesStats schema"""
@@ -1,12 +1,20 @@
 """Serialization and deserialization functions for Timeseries"""
 
-import datetime as dt
+import collections
+import io
+import json
+import threading
+
 import numpy as np
 import pandas as pd
-from flask import current_app
+import pyarrow as pa
+from flask import current_app, request, Response
 
 from bemserver.database.timeseries.hdfstore import (
     HDFStoreTimeseriesMgr)
+from bemserver.database.timeseries.parquet import ParquetTimeseriesMgr
+from bemserver.database.timeseries.wal import BufferedTimeseriesMgr
+from bemserver.database.timeseries.cache import CachedTimeseriesMgr
 
 from bemserver.models import Timeseries
 
@@ -15,93 +23,580 @@ from .exceptions import TimeseriesConfigError
 from ...extensions.rest_api import abort
 
 
-# TODO: do this at init time?
+TIMESERIES_MANAGERS = {
+    'hdfstore': HDFStoreTimeseriesMgr,
+    'parquet': ParquetTimeseriesMgr,
+}
+
+_TIMESERIES_MANAGER_LOCK = threading.Lock()
+
+# Streaming formats
+STREAM_MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+# Approximate number of values read from storage at once when streaming
+STREAM_CHUNKSIZE = 50000
+
+
 # TODO: check at init that storage path exists and is writable?
 
 def get_timeseries_manager():
-    """Return timeseries manager according to application configuration"""
+    """Return timeseries manager according to application configuration
+
+    The manager is created on first call and shared by all requests of the
+    application.
+    """
+    with _TIMESERIES_MANAGER_LOCK:
+        timeseries_mgr = current_app.extensions.get('timeseries_manager')
+        if timeseries_mgr is None:
+            timeseries_mgr = _create_timeseries_manager(current_app.config)
+            current_app.extensions['timeseries_manager'] = timeseries_mgr
+    return timeseries_mgr
+
 
-    app_config = current_app.config
+def _create_timeseries_manager(app_config):
+    """Create timeseries manager from application configuration"""
 
     # Instantiate timeseries manager
     backend = app_config.get('TIMESERIES_BACKEND')
-    if backend == 'hdfstore':
-        try:
-            storage_dir = app_config['TIMESERIES_BACKEND_STORAGE_DIR']
-        except KeyError:
-            raise TimeseriesConfigError(
-                "Missing hdfstore storage directory in configuration")
-        timeseries_mgr = HDFStoreTimeseriesMgr(storage_dir)
-    else:
+    try:
+        manager_cls = TIMESERIES_MANAGERS[backend]
+    except KeyError:
         raise TimeseriesConfigError(
             "Invalid timeseries backend: {}".format(backend))
+    try:
+        storage_dir = app_config['TIMESERIES_BACKEND_STORAGE_DIR']
+    except KeyError:
+        raise TimeseriesConfigError(
+            "Missing {} storage directory in configuration".format(backend))
+    kwargs = {
+        'lock_mode': app_config.get('TIMESERIES_BACKEND_LOCK_MODE', 'thread'),
+    }
+    partition = app_config.get('TIMESERIES_BACKEND_PARTITION')
+    if partition is not None:
+        kwargs['partition'] = partition
+    if backend == 'hdfstore':
+        kwargs['rollups'] = app_config.get(
+            'TIMESERIES_BACKEND_ROLLUPS', False)
+        kwargs['tail_window'] = app_config.get(
+            'TIMESERIES_BACKEND_TAIL_WINDOW')
+        kwargs['complib'] = app_config.get(
+            'TIMESERIES_BACKEND_HDFSTORE_COMPLIB', 'zlib')
+        kwargs['complevel'] = app_config.get(
+            'TIMESERIES_BACKEND_HDFSTORE_COMPLEVEL', 9)
+        kwargs['site_compression'] = app_config.get(
+            'TIMESERIES_BACKEND_HDFSTORE_SITE_COMPRESSION')
+        kwargs['repack_threshold'] = app_config.get(
+            'TIMESERIES_BACKEND_HDFSTORE_REPACK_THRESHOLD', 10 * 1024 * 1024)
+        kwargs['repack_interval'] = app_config.get(
+            'TIMESERIES_BACKEND_HDFSTORE_REPACK_INTERVAL')
+    if backend == 'parquet':
+        kwargs['compression'] = app_config.get(
+            'TIMESERIES_BACKEND_PARQUET_COMPRESSION', 'zstd')
+    try:
+        timeseries_mgr = manager_cls(storage_dir, **kwargs)
+    except ValueError as exc:
+        raise TimeseriesConfigError(
+            "Invalid {} configuration: {}".format(backend, exc))
+
+    # Buffer writes in a write-ahead log
+    wal_dir = app_config.get('TIMESERIES_BACKEND_WAL_DIR')
+    if wal_dir is not None:
+        # Pending writes are only visible to the process that received them
+        if kwargs['lock_mode'] == 'process':
+            raise TimeseriesConfigError(
+                "Write-ahead log can't be used with 'process' lock mode")
+        timeseries_mgr = BufferedTimeseriesMgr(
+            timeseries_mgr, wal_dir,
+            fsync=app_config.get('TIMESERIES_BACKEND_WAL_FSYNC', True),
+            compact_interval=app_config.get(
+                'TIMESERIES_BACKEND_WAL_COMPACT_INTERVAL', 10))
+
+    # Cache reads in memory
+    cache_size = app_config.get('TIMESERIES_BACKEND_CACHE_SIZE')
+    if cache_size:
+        # Writes by other processes would not invalidate the cache
+        if kwargs['lock_mode'] == 'process':
+            raise TimeseriesConfigError(
+                "Read cache can't be used with 'process' lock mode")
+        timeseries_mgr = CachedTimeseriesMgr(
+            timeseries_mgr, max_size=cache_size)
 
     return timeseries_mgr
 
 
-def tsload(data_list):
-    """Deserialize timeseries values from a dict to a structured DataFrame.
+# Value fields, in serialization order
+_VALUE_KEYS = ('timestamp', 'value', 'update_ts', 'quality')
 
-    :param list data_list: Timeseries values (as a list of dicts).
-    :return Timeseries: Timeseries values loaded in structured DataFrame.
+
+def _load_errors(errors, invalid, field, message):
+    """Add message to errors of invalid rows"""
+    for row_idx in np.flatnonzero(invalid):
+        errors.setdefault(int(row_idx), {})[field] = [message]
+
+
+def _parse_timestamps(timestamps, errors):
+    """Parse timestamps to aware UTC timestamps
+
+    :param Series timestamps: ISO 8601 strings (or datetimes if typed)
     """
-    if not data_list:
-        return Timeseries()
+    missing = timestamps.isnull().values
+    if pd.api.types.is_datetime64_any_dtype(timestamps):
+        parsed = pd.to_datetime(timestamps, utc=True)
+    else:
+        if pd.api.types.infer_dtype(timestamps, skipna=False) == 'string':
+            is_str = np.ones(len(timestamps), dtype=bool)
+        else:
+            is_str = timestamps.map(lambda val: isinstance(val, str)).values
+        parsed = pd.to_datetime(
+            timestamps.where(is_str), utc=True, errors='coerce')
+        _load_errors(
+            errors, ~missing & parsed.isnull().values, 'timestamp',
+            'Not a valid datetime.')
+    _load_errors(
+        errors, missing, 'timestamp', 'Missing data for required field.')
+    return pd.DatetimeIndex(parsed).tz_convert('UTC')
+
+
+def _parse_numbers(numbers, errors, field):
+    """Parse numbers to floats
+
+    Return parsed values and missing values mask.
+
+    :param Series numbers: Numbers or numeric strings (or floats if typed)
+    """
+    if numbers.dtype == object:
+        # Null values are missing, NaN is a valid float
+        missing = np.fromiter(
+            (val is None for val in numbers), dtype=bool, count=len(numbers))
+    else:
+        missing = numbers.isnull().values
+    parsed = pd.to_numeric(numbers, errors='coerce')
+    _load_errors(
+        errors, numbers.notnull().values & parsed.isnull().values,
+        field, 'Not a valid number.')
+    return parsed.values.astype('float64'), missing
+
 
-    # Create dataframe and rename columns
-    dataframe = pd.DataFrame(data_list)
-    dataframe = dataframe.rename(columns={
-        'timestamp': Timeseries.TIMESTAMPS_COL,
-        'value': Timeseries.DATA_COL,
-        'update_ts': Timeseries.UPDATE_TIMESTAMP_COL,
-        'quality': Timeseries.QUALITY_COL,
-    })
+def _parse_columns(columns):
+    """Validate and parse timeseries values columns
+
+    Return index, data and quality. Abort with errors by row if invalid.
+
+    :param dict columns: Column name -> Series, as described by
+        TimeseriesValueSchema. Missing optional columns may be omitted.
+    """
+    length = len(columns['timestamp'])
+    errors = {}
+    index = _parse_timestamps(columns['timestamp'], errors)
+    data, missing = _parse_numbers(columns['value'], errors, 'value')
+    _load_errors(
+        errors, missing, 'value', 'Missing data for required field.')
+    quality, missing = _parse_numbers(
+        columns.get('quality', pd.Series([None] * length, dtype=object)),
+        errors, 'quality')
+    # Quality defaults to 1
+    quality[missing] = 1
+    _load_errors(
+        errors, (quality < 0) | (quality > 1), 'quality',
+        'Must be between 0 and 1.')
+    if errors:
+        abort(422, errors={'data': errors})
+    # update_ts is dump only
+    return index, data, quality
+
+
+def _build_timeseries(index, data, quality=None, update_ts=None):
+    """Create timeseries from columns, rejecting duplicate indexes"""
+    index.name = Timeseries.TIMESTAMPS_COL
 
     # Reject if duplicate indexes
-    dups = dataframe[Timeseries.TIMESTAMPS_COL].duplicated()
+    dups = index.duplicated()
     if any(dups):
         abort(422, errors={'data': '{} duplicate indexe(s)'.format(
             np.count_nonzero(dups))})
 
     # Create and return timeseries
-    return Timeseries.from_dataframe(dataframe)
+    return Timeseries(
+        index=index, data=data, quality=quality, update_ts=update_ts)
+
+
+def tsload(data_list, *, parse=False):
+    """Deserialize timeseries values from a dict to a structured DataFrame.
+
+    Values are loaded column-wise.
+
+    :param list data_list: Timeseries values (as a list of dicts).
+    :param bool parse: (optional, default False)
+        If True, values are validated and parsed from their JSON
+        representation (ISO 8601 strings and numbers), as described by
+        TimeseriesValueSchema. Otherwise, they are expected to be already
+        deserialized.
+    :return Timeseries: Timeseries values loaded in structured DataFrame.
+    """
+    if not data_list:
+        return Timeseries()
+
+    # Extract columns
+    columns = {
+        key: [row.get(key) for row in data_list] for key in _VALUE_KEYS}
+
+    if parse:
+        return _build_timeseries(*_parse_columns({
+            key: pd.Series(column, dtype=object)
+            for key, column in columns.items()}))
+
+    # Missing columns are set to default values
+    quality, update_ts = columns['quality'], columns['update_ts']
+    return _build_timeseries(
+        pd.DatetimeIndex(columns['timestamp']),
+        np.array(columns['value'], dtype='float64'),
+        quality=(
+            None if all(val is None for val in quality)
+            else np.array(quality, dtype='float64')),
+        update_ts=(
+            None if all(val is None for val in update_ts)
+            else pd.to_datetime(update_ts).values))
+
+
+def _load_table(columns, length):
+    """Create timeseries from parsed columnar content
+
+    :param dict columns: Column name -> Series, for each column in content
+    :param int length: Number of rows
+    """
+    if not length:
+        return Timeseries()
+    missing = {'timestamp', 'value'} - set(columns)
+    if missing:
+        abort(422, errors={'data': {
+            key: ['Missing data for required field.']
+            for key in sorted(missing)}})
+    return _build_timeseries(*_parse_columns(columns))
+
+
+def tsload_columns(content):
+    """Deserialize timeseries values from columnar JSON
+
+    {"timestamp": [...], "value": [...], "quality": [...]}
+
+    :param bytes content: Request body
+    :return Timeseries: Timeseries values loaded in structured DataFrame.
+    """
+    try:
+        document = json.loads(content.decode('utf-8'))
+    except ValueError:
+        abort(400, errors={'data': ['Invalid JSON.']})
+    if not isinstance(document, dict):
+        abort(422, errors={'data': ['Invalid input type.']})
+    columns = {
+        key: document[key] for key in _VALUE_KEYS if key in document}
+    lengths = {
+        len(column) if isinstance(column, list) else None
+        for column in columns.values()}
+    if None in lengths or len(lengths) > 1:
+        abort(422, errors={'data': ['Columns must be lists of same length.']})
+    return _load_table(
+        {key: pd.Series(column, dtype=object)
+         for key, column in columns.items()},
+        lengths.pop() if lengths else 0)
+
+
+def tsload_csv(content):
+    """Deserialize timeseries values from CSV
+
+    First line is the header: timestamp,value[,quality]
+
+    :param bytes content: Request body
+    :return Timeseries: Timeseries values loaded in structured DataFrame.
+    """
+    try:
+        dataframe = pd.read_csv(io.BytesIO(content), dtype=object)
+    except pd.errors.EmptyDataError:
+        return Timeseries()
+    except (pd.errors.ParserError, UnicodeDecodeError):
+        abort(422, errors={'data': ['Invalid CSV.']})
+    # Empty cells are missing values
+    dataframe = dataframe.where(dataframe.notnull(), None)
+    return _load_table(
+        {key: dataframe[key] for key in _VALUE_KEYS if key in dataframe},
+        len(dataframe))
+
+
+def tsload_arrow(content):
+    """Deserialize timeseries values from Arrow IPC stream
+
+    Timestamps may be Arrow timestamps (naive timestamps are UTC) or
+    ISO 8601 strings.
+
+    :param bytes content: Request body
+    :return Timeseries: Timeseries values loaded in structured DataFrame.
+    """
+    if not content:
+        return Timeseries()
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(content)).read_all()
+    except pa.ArrowException:
+        abort(422, errors={'data': ['Invalid Arrow IPC stream.']})
+    dataframe = table.to_pandas()
+    return _load_table(
+        {key: dataframe[key] for key in _VALUE_KEYS if key in dataframe},
+        len(dataframe))
+
+
+def _isoformat(values):
+    """Format datetime64 values as ISO 8601 UTC strings
+
+    Same strings as datetime.isoformat, with null values as None.
+    """
+    values = np.asarray(values, dtype='datetime64[ns]')
+    result = np.datetime_as_string(values, unit='s').astype(object)
+    # Fractional seconds are only written when not null
+    nanoseconds = values.view('int64') % 10 ** 9
+    for unit, mask in (
+            ('us', (nanoseconds != 0) & (nanoseconds % 1000 == 0)),
+            ('ns', nanoseconds % 1000 != 0),
+    ):
+        if mask.any():
+            result[mask] = np.datetime_as_string(values[mask], unit=unit)
+    result = result + '+00:00'
+    result[np.isnat(values)] = None
+    return result
+
+
+def _to_pydatetime(values):
+    """Convert datetime values to datetime objects, null values as None
+
+    Datetime objects are aware if values are.
+    """
+    result = pd.DatetimeIndex(values).to_pydatetime()
+    result[pd.isnull(values)] = None
+    return result
+
+
+def _convert_distinct(convert, values):
+    """Convert distinct datetime values only, null values as None"""
+    codes, uniques = pd.factorize(values)
+    # Null values have code -1
+    return np.append(convert(uniques), None)[codes]
+
+
+def _to_floats(values):
+    """Convert float values to Python floats, NaN values as None"""
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result
 
 
 def tsdump(timeseries, *, to_isotime=False):
     """Serialize timeseries values.
 
+    Values are serialized column-wise.
+
     :param pandas.DataFrame timeseries:
         Timeseries values in a structured DataFrame.
     :param bool to_isotime: (optional, default False)
         If True, datetime objects are converted into ISO 8601 strings.
     :return list: Timeseries values dict structured.
     """
-    # Rename columns
-    dataframe = timeseries.dataframe.rename(columns={
-        Timeseries.DATA_COL: 'value',
-        Timeseries.UPDATE_TIMESTAMP_COL: 'update_ts',
-        Timeseries.QUALITY_COL: 'quality',
-    })
-    dataframe.index.names = ['timestamp']
-
-    # Replace null values
-    dataframe = dataframe.where((pd.notnull(dataframe)), None)
-
-    # Export as list of dicts
-    dataframe.reset_index(inplace=True)
-    # Surprisingly, we do not use 'to_dict' pandas's function because of a
-    # lack of performance on a huge amount of data. This is due to some
-    # genericity features added in 'to_dict' function unneeded for our
-    # simple use case (for example, no need to convert datetimes...).
-    # Here we could have just written "dataframe.to_dict(orient='records')"...
-    result = []
-    for src_row in dataframe.values:
-        row = {}
-        for key, val in zip(dataframe.columns, src_row):
-            # Convert datetime objects to ISO strings, if needed
-            if to_isotime and key in ('timestamp', 'update_ts',):
-                val = val.replace(tzinfo=dt.timezone.utc).isoformat()
-            row[key] = val
-        result.append(row)
+    dataframe = timeseries.dataframe
+    if dataframe.empty:
+        return []
+    convert_dt = _isoformat if to_isotime else _to_pydatetime
+    columns = (
+        # Keep timezone, if any, when converting to datetime objects
+        convert_dt(dataframe.index),
+        _to_floats(dataframe[Timeseries.DATA_COL].values),
+        # Update timestamps are mostly shared by values written together
+        _convert_distinct(
+            convert_dt, dataframe[Timeseries.UPDATE_TIMESTAMP_COL]),
+        _to_floats(dataframe[Timeseries.QUALITY_COL].values),
+    )
+    # Build dicts from columns rather than using DataFrame.to_dict, which is
+    # much slower on a huge amount of data
+    return [
+        {'timestamp': tstamp, 'value': val, 'update_ts': upd, 'quality': qual}
+        for tstamp, val, upd, qual in zip(
+            *(column.tolist() for column in columns))]
 
-    return result
+
+def tsdump_columns(timeseries):
+    """Serialize timeseries values as columns
+
+    :param pandas.DataFrame timeseries:
+        Timeseries values in a structured DataFrame.
+    :return dict: Column name -> list of values, ISO 8601 timestamps.
+    """
+    dataframe = timeseries.dataframe
+    return {
+        'timestamp': _isoformat(dataframe.index.values).tolist(),
+        'value': _to_floats(dataframe[Timeseries.DATA_COL].values).tolist(),
+        'update_ts': _convert_distinct(
+            _isoformat,
+            dataframe[Timeseries.UPDATE_TIMESTAMP_COL].values).tolist(),
+        'quality': _to_floats(
+            dataframe[Timeseries.QUALITY_COL].values).tolist(),
+    }
+
+
+def tsdump_wide(timeseries_by_id):
+    """Serialize values of several timeseries as a matrix
+
+    Values are aligned on the union of all timestamps, missing values are
+    None. Quality and update timestamps are not serialized.
+
+    :param dict timeseries_by_id: Timeseries ID -> Timeseries
+    :return dict: Timestamps as ISO 8601 strings (timestamp) and values of
+        each timeseries (data: timeseries ID -> list of values).
+    """
+    if not timeseries_by_id:
+        return {'timestamp': [], 'data': {}}
+    dataframe = pd.concat(
+        [timeseries.dataframe[Timeseries.DATA_COL]
+         for timeseries in timeseries_by_id.values()],
+        axis=1, keys=list(timeseries_by_id.keys()), sort=True)
+    return {
+        'timestamp': _isoformat(dataframe.index.values).tolist(),
+        'data': {
+            ts_id: _to_floats(dataframe[ts_id].values).tolist()
+            for ts_id in timeseries_by_id},
+    }
+
+
+def tsdump_csv(timeseries):
+    """Serialize timeseries values as CSV
+
+    Timestamps are ISO 8601 strings, null values are empty.
+
+    :param pandas.DataFrame timeseries:
+        Timeseries values in a structured DataFrame.
+    :return str: CSV document, with header.
+    """
+    dataframe = timeseries.dataframe
+    return pd.DataFrame({
+        'timestamp': _isoformat(dataframe.index.values),
+        'value': dataframe[Timeseries.DATA_COL].values,
+        'update_ts': _convert_distinct(
+            _isoformat, dataframe[Timeseries.UPDATE_TIMESTAMP_COL].values),
+        'quality': dataframe[Timeseries.QUALITY_COL].values,
+    }, columns=_VALUE_KEYS).to_csv(index=False)
+
+
+def _to_arrow(values):
+    """Convert values to Arrow array, NaN and NaT values as null"""
+    if np.issubdtype(values.dtype, np.datetime64):
+        return pa.array(
+            values, type=pa.timestamp('ns', tz='UTC'), from_pandas=True)
+    return pa.array(values, from_pandas=True)
+
+
+def tsdump_arrow(timeseries):
+    """Serialize timeseries values as Arrow IPC stream
+
+    Timestamps are UTC Arrow timestamps.
+
+    :param pandas.DataFrame timeseries:
+        Timeseries values in a structured DataFrame.
+    :return bytes: Arrow IPC stream, with a single record batch.
+    """
+    dataframe = timeseries.dataframe
+    batch = pa.RecordBatch.from_arrays([
+        _to_arrow(dataframe.index.values),
+        _to_arrow(dataframe[Timeseries.DATA_COL].values),
+        _to_arrow(dataframe[Timeseries.UPDATE_TIMESTAMP_COL].values),
+        _to_arrow(dataframe[Timeseries.QUALITY_COL].values),
+    ], list(_VALUE_KEYS))
+    sink = pa.BufferOutputStream()
+    writer = pa.RecordBatchStreamWriter(sink, batch.schema)
+    writer.write_batch(batch)
+    writer.close()
+    return sink.getvalue().to_pybytes()
+
+
+def _tsdump_json(timeseries):
+    return json.dumps({'data': tsdump(timeseries, to_isotime=True)})
+
+
+def _tsdump_columns_json(timeseries):
+    return json.dumps(tsdump_columns(timeseries))
+
+
+# Timeseries values formats
+JSON_MIMETYPE = 'application/json'
+COLUMNS_MIMETYPE = 'application/vnd.bemserver.columns+json'
+CSV_MIMETYPE = 'text/csv'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+# Response formats, by order of preference
+DUMP_FORMATS = collections.OrderedDict((
+    (JSON_MIMETYPE, _tsdump_json),
+    (COLUMNS_MIMETYPE, _tsdump_columns_json),
+    (CSV_MIMETYPE, tsdump_csv),
+    (ARROW_MIMETYPE, tsdump_arrow),
+))
+# Request body formats (JSON list of values is loaded by the body schema)
+LOAD_FORMATS = {
+    COLUMNS_MIMETYPE: tsload_columns,
+    CSV_MIMETYPE: tsload_csv,
+    ARROW_MIMETYPE: tsload_arrow,
+}
+
+
+def tsdump_response(timeseries):
+    """Serialize timeseries values in the format requested by Accept header
+
+    JSON is the default format.
+
+    :param pandas.DataFrame timeseries:
+        Timeseries values in a structured DataFrame.
+    :return Response: Response with serialized values.
+    """
+    mimetype = request.accept_mimetypes.best_match(
+        DUMP_FORMATS.keys(), default=JSON_MIMETYPE)
+    return Response(DUMP_FORMATS[mimetype](timeseries), mimetype=mimetype)
+
+
+def tsload_request(body):
+    """Deserialize timeseries values in the format given by Content-Type
+
+    :param dict body: Request body loaded by TimeseriesLoadSchema, only used
+        for JSON content.
+    :return Timeseries: Timeseries values loaded in structured DataFrame.
+    """
+    mimetype = request.mimetype
+    if mimetype == JSON_MIMETYPE:
+        if 'data' not in body:
+            abort(422, errors={'data': ['Missing data for required field.']})
+        return tsload(body['data'], parse=True)
+    try:
+        load = LOAD_FORMATS[mimetype]
+    except KeyError:
+        abort(415, errors={'data': [
+            'Unsupported content type: {}.'.format(mimetype)]})
+    return load(request.get_data())
+
+
+def tsdump_stream(timeseries_chunks, *, fmt='json'):
+    """Serialize timeseries values chunks incrementally.
+
+    :param iterable timeseries_chunks: Timeseries objects, in time order.
+    :param str fmt: (optional, default 'json')
+        'json' for the same document as the non-streamed response
+        ({"data": [...]}), 'ndjson' for one JSON value per line.
+    :return generator: Serialized document parts.
+    """
+    if fmt == 'json':
+        yield '{"data": ['
+    first = True
+    for timeseries in timeseries_chunks:
+        rows = tsdump(timeseries, to_isotime=True)
+        if not rows:
+            continue
+        if fmt == 'ndjson':
+            yield '\n'.join(json.dumps(row) for row in rows) + '\n'
+        else:
+            # Dump chunk as a list, without brackets
+            yield ('' if first else ', ') + json.dumps(rows)[1:-1]
+        first = False
+    if fmt == 'json':
+        yield ']}'
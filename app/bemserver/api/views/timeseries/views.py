@@ -1,10 +1,12 @@
 """Api Timeseries module views"""
 
-from flask import current_app
+from flask import current_app, Response, stream_with_context
 from flask.views import MethodView
 
 from bemserver.basicservices.timeseries import (
     get_timeseries_by_id_resample, get_item_checked, get_timeseries_by_item,
+    get_timeseries_by_ids, get_timeseries_by_ids_resample,
+    set_timeseries_by_ids, get_last_values_by_ids,
     is_valid_unit, convert_timeseries_unit)
 
 from bemserver.models.timeseries.exceptions import (
@@ -13,10 +15,12 @@ from bemserver.models.timeseries.exceptions import (
 from . import bp as api
 
 from .schemas import (
-    TimeseriesSchema, TimeseriesStatsSchema,
-    TimeseriesQueryArgsSchema, TimeseriesResampleQueryArgsSchema,
+    TimeseriesSchema, TimeseriesLoadSchema, TimeseriesStatsSchema,
+    TimeseriesQueryArgsSchema, TimeseriesStreamQueryArgsSchema,
+    TimeseriesResampleQueryArgsSchema,
     TimeseriesStatsQueryArgsSchema, TimeseriesUnitConversionQueryArgsSchema,
-    TimeseriesAggregateQueryArgsSchema)
+    TimeseriesAggregateQueryArgsSchema, TimeseriesBulkQueryArgsSchema,
+    TimeseriesBulkLoadSchema, TimeseriesLastQueryArgsSchema)
 from . import tsio
 
 from ...extensions.rest_api import abort
@@ -41,13 +45,15 @@ class TimeseriesById(MethodView):
         is too wide in the request, this can take a LONG time!**
         Unit conversion can be performed for a request.<br>
         *Example:* `/timeseries/my_timeseries_id?start_time=2019-06-18T00:00:00
-        &end_time=2019-06-19T00:00:00`
+        &end_time=2019-06-19T00:00:00`<br>
+        Values are returned in the format negotiated from `Accept` header
+        (see formats in PATCH).
         ''',
+        produces=list(tsio.DUMP_FORMATS.keys()),
         responses=build_responses(
             [200, 404, 422, 500], schemas={200: TimeseriesSchema})
     )
     @api.arguments(TimeseriesQueryArgsSchema, location='query')
-    @api.response(disable_etag=True)
     def get(self, args, timeseries_id):
         item = get_item_checked(timeseries_id)
         # Check if unit arguments are valid
@@ -58,7 +64,7 @@ class TimeseriesById(MethodView):
         ret_ts = get_timeseries_by_item(item, t_start, t_end)
         # Convert timeseries unit
         ret_ts = convert_timeseries_unit(ret_ts, item['unit'], target_unit)
-        return {'data': tsio.tsdump(ret_ts, to_isotime=True)}
+        return tsio.tsdump_response(ret_ts)
 
     @auth_required(roles=['module_data_provider', 'module_data_processor'])
     @limiter.limit(1)
@@ -68,10 +74,22 @@ class TimeseriesById(MethodView):
                      values in the form of pairs (timestamp, value).<br>
                      If some values are already stored for some or all of the
                      timestamps given, former values will be replaced with
-                     values in the request.'''),
-        responses=build_responses([204, 404, 422, 500])
+                     values in the request.<br>
+                     Values may be sent in the following formats
+                     (`Content-Type` header):
+
++ `application/json`: list of values documented below
++ `application/vnd.bemserver.columns+json`: one list per field
+(`{"timestamp": [...], "value": [...], "quality": [...]}`)
++ `text/csv`: one line per value, with a `timestamp,value,quality` header
++ `application/vnd.apache.arrow.stream`: Arrow IPC stream with `timestamp`
+(Arrow timestamp or ISO 8601 string), `value` and `quality` columns
+
+`quality` is optional.'''),
+        consumes=[tsio.JSON_MIMETYPE] + list(tsio.LOAD_FORMATS.keys()),
+        responses=build_responses([204, 404, 415, 422, 500])
     )
-    @api.arguments(TimeseriesSchema)
+    @api.arguments(TimeseriesLoadSchema)
     @api.arguments(TimeseriesUnitConversionQueryArgsSchema, location='query')
     @api.response(code=204, disable_etag=True)
     def patch(self, data, args, timeseries_id):
@@ -86,7 +104,7 @@ class TimeseriesById(MethodView):
         current_app.logger.info('Setting values for timeseries "%s/%s"',
                                 item['site_id'], item['ts_id'])
         ts_mgr = tsio.get_timeseries_manager()
-        data_ts = tsio.tsload(data['data'])
+        data_ts = tsio.tsload_request(data)
         # Convert values to asked unit
         if source_unit is not None:
             try:
@@ -113,6 +131,46 @@ class TimeseriesById(MethodView):
         ts_mgr.delete(item['site_id'], item['ts_id'], t_start, t_end)
 
 
+@api.route('/<string:timeseries_id>/stream')
+@auth_required(roles=[
+    'building_manager', 'module_data_provider', 'module_data_processor'])
+@limiter.limit(1)
+@api.doc(
+    summary='Stream values for a timeseries',
+    description='''Same as getting values for a timeseries, except values
+    are read from storage and sent by chunks: the response starts
+    immediately and memory usage does not depend on the time range. Use this
+    endpoint to export wide time ranges.<br>
+    With `ndjson` format, each line is a JSON value.<br>
+    *Example:* `/timeseries/my_timeseries_id/stream?
+    start_time=2019-01-01T00:00:00&end_time=2020-01-01T00:00:00&format=ndjson`
+    ''',
+    produces=list(tsio.STREAM_MIMETYPES.values()),
+    responses=build_responses(
+        [200, 404, 422, 500], schemas={200: TimeseriesSchema})
+)
+@api.arguments(TimeseriesStreamQueryArgsSchema, location='query')
+def timeseries_by_id_stream(args, timeseries_id):
+    item = get_item_checked(timeseries_id)
+    # Check if unit arguments are valid before starting the response
+    target_unit = args.get('unit')
+    is_valid_unit(item['unit'], target_unit)
+    convert_timeseries_unit(Timeseries(), item['unit'], target_unit)
+    # Get timeseries by chunks
+    ts_mgr = tsio.get_timeseries_manager()
+    chunks = (
+        convert_timeseries_unit(ts_chunk, item['unit'], target_unit)
+        for ts_chunk in ts_mgr.iter_get(
+            item['site_id'], item['ts_id'],
+            t_start=args['t_start'], t_end=args['t_end'],
+            chunksize=tsio.STREAM_CHUNKSIZE)
+    )
+    fmt = args['fmt']
+    return Response(
+        stream_with_context(tsio.tsdump_stream(chunks, fmt=fmt)),
+        mimetype=tsio.STREAM_MIMETYPES[fmt])
+
+
 @api.route('/<string:timeseries_id>/stats')
 @auth_required(roles=[
     'building_manager', 'module_data_provider', 'module_data_processor'])
@@ -126,15 +184,22 @@ class TimeseriesById(MethodView):
 + index/timestamp of last value.
 
 This can be useful to parse timeseries, i.e. to check whether some new values
-can be read.'''),
+can be read.
+
+Stats about the whole timeseries (no time range in the request) are read from
+metadata: their cost does not depend on the size of the timeseries.'''),
     responses=build_responses([200, 404, 422, 500])
 )
 @api.arguments(TimeseriesStatsQueryArgsSchema, location='query')
 @api.response(TimeseriesStatsSchema)
 def timeseries_by_id_stats(args, timeseries_id):
     item = get_item_checked(timeseries_id)
-    # Get timeseries
     t_start, t_end = args.get('t_start', None), args.get('t_end', None)
+    # Whole timeseries: get stats from metadata
+    if t_start is None and t_end is None:
+        ts_mgr = tsio.get_timeseries_manager()
+        return ts_mgr.stats(item['site_id'], item['ts_id'])
+    # Get timeseries
     ret_ts = get_timeseries_by_item(item, t_start, t_end)
     return ret_ts.stats()
 
@@ -154,19 +219,21 @@ def timeseries_by_id_stats(args, timeseries_id):
                  consumption can be transformed into a daily energy consumption
                  with parameters `'day`' and `'sum`'<br>A measure of ambient
                  temperature collected every second, can be gathered at an
-                 hourly frequency with parameters `'hour`' and `'mean`'.'''),
+                 hourly frequency with parameters `'hour`' and `'mean`'.<br>
+                 Values are returned in the format negotiated from `Accept`
+                 header.'''),
+    produces=list(tsio.DUMP_FORMATS.keys()),
     responses=build_responses(
         [200, 404, 422, 500], schemas={200: TimeseriesSchema})
 )
 @api.arguments(TimeseriesResampleQueryArgsSchema, location='query')
-@api.response(disable_etag=True)
 def timeseries_by_id_resample(args, timeseries_id):
     t_start, t_end = args['t_start'], args['t_end']
     target_unit = args.get('unit')
     freq, aggregation = args['freq'], args['aggregation']
     ret_ts = get_timeseries_by_id_resample(
         timeseries_id, t_start, t_end, target_unit, freq, aggregation)
-    return {'data': tsio.tsdump(ret_ts, to_isotime=True)}
+    return tsio.tsdump_response(ret_ts)
 
 
 @api.route('/aggregate')
@@ -183,23 +250,108 @@ def timeseries_by_id_resample(args, timeseries_id):
                  measures in some room, one can get the average temperature in
                  the room based on these two measures:<br>
                  `/timeseries/aggregate/?start_time=DATE1&end_time=DATE2&
-                 freq=min&ts_ids=['measure1','measure2']&operation=mean`'''),
+                 freq=min&ts_ids=['measure1','measure2']&operation=mean`<br>
+                 Values are returned in the format negotiated from `Accept`
+                 header.'''),
+    produces=list(tsio.DUMP_FORMATS.keys()),
     responses=build_responses(
         [200, 404, 422, 500], schemas={200: TimeseriesSchema})
 )
 @api.arguments(TimeseriesAggregateQueryArgsSchema, location='query')
-@api.response(disable_etag=True)
 def timeseries_aggregate(args):
     ts_ids = args['ts_ids']
     t_start, t_end = args['t_start'], args['t_end']
     target_unit = args.get('unit')
     freq, aggregation = args['freq'], args['rs_agg']
 
-    timeserie_list = [
-        get_timeseries_by_id_resample(
-            ts_id, t_start, t_end, target_unit, freq, aggregation)
-        for ts_id in ts_ids
-    ]
+    timeserie_list = get_timeseries_by_ids_resample(
+        ts_ids, t_start, t_end, target_unit, freq, aggregation)
     operation = args['ts_agg']
     ret_ts = Timeseries.aggregate(timeserie_list, operation)
-    return {'data': tsio.tsdump(ret_ts, to_isotime=True)}
+    return tsio.tsdump_response(ret_ts)
+
+
+@api.route('/bulk')
+class TimeseriesBulk(MethodView):
+    """Timeseries bulk resources endpoint"""
+
+    @auth_required(roles=[
+        'building_manager', 'module_data_provider', 'module_data_processor'])
+    @limiter.limit(1)
+    @api.doc(
+        summary='Get values for several timeseries',
+        description='''Same as getting values for each timeseries, in a
+        single request. Timeseries are read in parallel.<br>
+        With `blocks` layout (default), the response contains the values of
+        each timeseries: `{"data": {"id_1": [{"timestamp": ..., "value": ...,
+        "update_ts": ..., "quality": ...}, ...], ...}}`.<br>
+        With `wide` layout, the response is a matrix of values aligned on the
+        union of all timestamps, `null` where a timeseries has no value:
+        `{"timestamp": [...], "data": {"id_1": [...], ...}}`.<br>
+        *Example:* `/timeseries/bulk?ts_ids=id_1&ts_ids=id_2&
+        start_time=2019-06-18T00:00:00&end_time=2019-06-19T00:00:00&
+        layout=wide`
+        ''',
+        responses=build_responses([200, 404, 422, 500])
+    )
+    @api.arguments(TimeseriesBulkQueryArgsSchema, location='query')
+    @api.response(disable_etag=True)
+    def get(self, args):
+        ts_by_id = get_timeseries_by_ids(
+            args['ts_ids'], args['t_start'], args['t_end'], args.get('unit'))
+        if args['layout'] == 'wide':
+            return tsio.tsdump_wide(ts_by_id)
+        return {'data': {
+            ts_id: tsio.tsdump(ret_ts, to_isotime=True)
+            for ts_id, ret_ts in ts_by_id.items()}}
+
+    @auth_required(roles=['module_data_provider', 'module_data_processor'])
+    @limiter.limit(1)
+    @api.doc(
+        summary='Set values for several timeseries',
+        description='''Same as setting values for each timeseries, in a
+        single request: `{"data": {"id_1": [{"timestamp": ..., "value": ...,
+        "quality": ...}, ...], ...}}`.<br>
+        Values are written grouped by storage file.<br>
+        Each timeseries is written independently of the others. The response
+        contains the result for each timeseries, with the status that setting
+        its values alone would have returned, and the number of written
+        values or the errors:
+        `{"data": {"id_1": {"status": 204, "count": 42},
+        "id_2": {"status": 404}, "id_3": {"status": 422, "errors": {...}}}}`
+        ''',
+        responses=build_responses([200, 422, 500])
+    )
+    @api.arguments(TimeseriesBulkLoadSchema)
+    @api.arguments(TimeseriesUnitConversionQueryArgsSchema, location='query')
+    @api.response(disable_etag=True)
+    def patch(self, data, args):
+        return {'data': set_timeseries_by_ids(data['data'], args.get('unit'))}
+
+
+@api.route('/last')
+@auth_required(roles=[
+    'building_manager', 'module_data_provider', 'module_data_processor'])
+@limiter.limit(1)
+@api.doc(
+    summary='Get latest value of several timeseries',
+    description='''Returns the value with the latest timestamp of each
+    timeseries, or `null` if a timeseries has no value:
+    `{"data": {"id_1": {"timestamp": ..., "value": ..., "update_ts": ...,
+    "quality": ...}, "id_2": null}}`.<br>
+    Latest values are maintained by the storage when values are written, so
+    this doesn't depend on the size of the timeseries.<br>
+    *Example:* `/timeseries/last?ts_ids=id_1&ts_ids=id_2`
+    ''',
+    responses=build_responses([200, 404, 422, 500])
+)
+@api.arguments(TimeseriesLastQueryArgsSchema, location='query')
+@api.response(disable_etag=True)
+def get_last_values(args):
+    """Get latest value of several timeseries"""
+    ts_by_id = get_last_values_by_ids(args['ts_ids'], args.get('unit'))
+    data = {}
+    for ts_id, ret_ts in ts_by_id.items():
+        values = tsio.tsdump(ret_ts, to_isotime=True)
+        data[ts_id] = values[0] if values else None
+    return {'data': data}
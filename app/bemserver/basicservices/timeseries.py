@@ -1,9 +1,16 @@
 """Timeseries basics services - Utils for helping building timeseries views."""
 
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.exceptions import Forbidden, UnprocessableEntity
+
 from bemserver.models import (
-    Sensor, Measure, OutputTimeSeries, Site, Building, Floor, Zone, Space)
+    Sensor, Measure, OutputTimeSeries, Site, Building, Floor, Zone, Space,
+    Timeseries)
 from bemserver.models.timeseries.exceptions import (
     TimeseriesUnitConversionError)
+from bemserver.database.timeseries.base import resample_chunks
 
 from ..api.extensions.auth import verify_scope
 from ..api.extensions.rest_api import abort
@@ -18,13 +25,127 @@ def get_timeseries_by_id_resample(
     item = get_item_checked(ts_id)
     # Check if unit arguments are valid
     is_valid_unit(item['unit'], target_unit)
-    # Get timeseries
-    ret_ts = get_timeseries_by_item(item, t_start, t_end)
+    ts_mgr = tsio.get_timeseries_manager()
+    return _resample_item(
+        ts_mgr, item, t_start, t_end, target_unit, freq, aggregation)
+
+
+def get_timeseries_by_ids_resample(
+        ts_ids, t_start, t_end, target_unit, freq, aggregation,
+        max_workers=4):
+    """Get several Timeseries by id and resample them.
+
+    Items are searched in batch and timeseries are resampled in parallel
+    threads. Return list of resampled Timeseries, in ts_ids order.
+    """
+    items, statuses = get_items_checked(ts_ids)
+    for ts_id in ts_ids:
+        if ts_id in statuses:
+            abort(statuses[ts_id])
+    # Check if unit arguments are valid
+    for item in items.values():
+        is_valid_unit(item['unit'], target_unit)
+    ts_mgr = tsio.get_timeseries_manager()
+
+    def resample(ts_id):
+        return _resample_item(
+            ts_mgr, items[ts_id], t_start, t_end, target_unit, freq,
+            aggregation)
+
+    unique_ids = list(dict.fromkeys(ts_ids))
+    if len(unique_ids) <= 1 or max_workers <= 1:
+        results = [resample(ts_id) for ts_id in unique_ids]
+    else:
+        with ThreadPoolExecutor(
+                max_workers=min(max_workers, len(unique_ids))) as executor:
+            results = list(executor.map(resample, unique_ids))
+    results = dict(zip(unique_ids, results))
+    return [results[ts_id] for ts_id in ts_ids]
+
+
+def get_timeseries_by_ids(ts_ids, t_start, t_end, target_unit=None):
+    """Get several Timeseries by id. Return dict of ts_id -> Timeseries."""
+    items, statuses = get_items_checked(ts_ids)
+    for ts_id in ts_ids:
+        if ts_id in statuses:
+            abort(statuses[ts_id])
+    # Check if unit arguments are valid
+    for item in items.values():
+        is_valid_unit(item['unit'], target_unit)
+    # Get all timeseries at once
+    ts_mgr = tsio.get_timeseries_manager()
+    ts_list = ts_mgr.get_many(
+        [(item['site_id'], item['ts_id']) for item in items.values()],
+        t_start=t_start, t_end=t_end)
     # Convert timeseries unit
-    ret_ts = convert_timeseries_unit(ret_ts, item['unit'], target_unit)
-    # Resample timeseries
-    ret_ts.resample(freq, aggregation)
-    return ret_ts
+    return {
+        ts_id: convert_timeseries_unit(ret_ts, item['unit'], target_unit)
+        for (ts_id, item), ret_ts in zip(items.items(), ts_list)}
+
+
+def get_last_values_by_ids(ts_ids, target_unit=None):
+    """Get latest value of several Timeseries by id.
+
+    Return dict of ts_id -> Timeseries of at most one value.
+    """
+    items, statuses = get_items_checked(ts_ids)
+    for ts_id in ts_ids:
+        if ts_id in statuses:
+            abort(statuses[ts_id])
+    # Check if unit arguments are valid
+    for item in items.values():
+        is_valid_unit(item['unit'], target_unit)
+    ts_mgr = tsio.get_timeseries_manager()
+    return {
+        ts_id: convert_timeseries_unit(
+            ts_mgr.last(item['site_id'], item['ts_id']),
+            item['unit'], target_unit)
+        for ts_id, item in items.items()}
+
+
+def set_timeseries_by_ids(values_by_id, source_unit=None):
+    """Set values of several Timeseries by id.
+
+    Values are written in a single call to the timeseries manager. A
+    timeseries that can't be written doesn't prevent writing the others.
+
+    :param dict values_by_id: ts_id -> list of values, as loaded by
+        TimeseriesBulkLoadSchema.
+    :param str source_unit: (optional) Unit of the values, if they must be
+        converted to timeseries units.
+    :return dict: ts_id -> result: HTTP status (the same as setting values
+        of this timeseries only), number of written values or errors.
+    """
+    items, statuses = get_items_checked(list(values_by_id))
+    results = {ts_id: {'status': status} for ts_id, status in statuses.items()}
+    writes = []
+    for ts_id, item in items.items():
+        # Load data and convert values to asked unit
+        try:
+            is_valid_unit(item['unit'], source_unit)
+            data_ts = tsio.tsload(values_by_id[ts_id], parse=True)
+            if source_unit is not None:
+                data_ts = convert_timeseries_unit(
+                    data_ts, source_unit, item['unit'])
+        except UnprocessableEntity as exc:
+            results[ts_id] = {'status': 422, 'errors': exc.data['errors']}
+            continue
+        writes.append((ts_id, item, data_ts))
+    current_app.logger.info('Setting values for %d timeseries', len(writes))
+    ts_mgr = tsio.get_timeseries_manager()
+    exceptions = ts_mgr.set_many([
+        (item['site_id'], item['ts_id'], data_ts)
+        for _, item, data_ts in writes])
+    for (ts_id, item, data_ts), exc in zip(writes, exceptions):
+        if exc is not None:
+            current_app.logger.error(
+                'Error while setting values for timeseries "%s/%s"',
+                item['site_id'], item['ts_id'], exc_info=exc)
+            results[ts_id] = {'status': 500}
+        else:
+            results[ts_id] = {
+                'status': 204, 'count': len(data_ts.dataframe)}
+    return results
 
 
 def get_item_checked(timeseries_id):
@@ -36,6 +157,30 @@ def get_item_checked(timeseries_id):
     return item
 
 
+def get_items_checked(timeseries_ids):
+    """Get several items and check permission to use them.
+
+    Items are searched in batch. Return a dict of timeseries_id -> item and
+    a dict of timeseries_id -> HTTP error status for items not found (404)
+    or not authorized (403).
+    """
+    items = _get_items(timeseries_ids)
+    statuses = {}
+    for ts_id in timeseries_ids:
+        if ts_id not in items:
+            statuses[ts_id] = 404
+            continue
+        # permissions checks
+        try:
+            verify_scope(sites=[items[ts_id]['site_id']])
+        except Forbidden:
+            statuses[ts_id] = 403
+    items = {
+        ts_id: item for ts_id, item in items.items()
+        if ts_id not in statuses}
+    return items, statuses
+
+
 def get_timeseries_by_item(item, t_start, t_end):
     """Get Timeserie from item element."""
     ts_mgr = tsio.get_timeseries_manager()
@@ -63,6 +208,24 @@ def convert_timeseries_unit(timeseries, source_unit=None, target_unit=None):
     return ret_ts
 
 
+def _resample_item(
+        ts_mgr, item, t_start, t_end, target_unit, freq, aggregation):
+    # Without unit conversion, let timeseries manager resample (it may use
+    # precomputed rollups)
+    if target_unit is None:
+        return ts_mgr.resample(
+            item['site_id'], item['ts_id'], freq, aggregation,
+            t_start=t_start, t_end=t_end)
+    # Check units are compatible, even if there is no value
+    convert_timeseries_unit(Timeseries(), item['unit'], target_unit)
+    # Convert timeseries unit and resample chunk by chunk
+    return resample_chunks((
+        convert_timeseries_unit(ts_obj, item['unit'], target_unit).dataframe
+        for ts_obj in ts_mgr.iter_get(
+            item['site_id'], item['ts_id'], t_start=t_start, t_end=t_end)
+    ), freq, aggregation)
+
+
 def _get_item_or_404(timeseries_id):
     # A. search in measures
     #  parent site can be reached through sensor
@@ -107,3 +270,60 @@ def _get_item_or_404(timeseries_id):
         )
 
     return result
+
+
+def _get_items(timeseries_ids):
+    # Same as _get_item_or_404 for several timeseries, with one query for
+    # measures, one for outputs and one for each kind of parent site.
+    # Return a dict of timeseries_id -> item, without items not found.
+
+    # Ugly hack to keep compatibility with ugly ontology stub for @clean TS
+    external_ids = {
+        ts_id: ts_id[:-6] if ts_id.endswith('@clean') else ts_id
+        for ts_id in timeseries_ids}
+    ids = sorted(set(external_ids.values()))
+    if not ids:
+        return {}
+
+    # A. get measures from timeseries_ids (measures' external_id)
+    measures = {
+        item.external_id: item
+        for item in db_accessor.get_list(Measure, {'external_ids': ids})}
+    # B. get output timeseries from other timeseries_ids
+    ids = [ext_id for ext_id in ids if ext_id not in measures]
+    outputs = {
+        item.external_id: item
+        for item in db_accessor.get_list(
+            OutputTimeSeries, {'external_ids': ids})} if ids else {}
+
+    # Get parent sites
+    sensor_sites = db_accessor.get_parents(
+        Sensor, list({str(item.sensor_id) for item in measures.values()}))
+    # Same as get_parent_many_classes, for all outputs at once
+    location_sites = db_accessor.get_parents_many_classes(
+        [Space, Zone, Floor, Building, Site],
+        list({str(item.localization) for item in outputs.values()}))
+
+    # C. build responses with items data
+    result = {}
+    for ts_id, ext_id in external_ids.items():
+        if ext_id in measures:
+            item = measures[ext_id]
+            kind, unit = 'measure', item.unit
+            sites, parent_id = sensor_sites, str(item.sensor_id)
+        elif ext_id in outputs:
+            item = outputs[ext_id]
+            kind, unit = 'output', item.values_desc.unit
+            sites, parent_id = location_sites, str(item.localization)
+        else:
+            continue
+        # Parent site not found
+        if parent_id not in sites:
+            continue
+        result[ts_id] = {
+            'kind': kind,
+            'ts_id': item.external_id + ts_id[len(ext_id):],
+            'unit': unit,
+            'site_id': sites[parent_id],
+        }
+    return result
@@ -25,9 +25,9 @@ from .db_model import ModelDB
 from .db_output import OutputDB
 
 
-def init_handlers(url=None):
+def init_handlers(url=None, **onto_options):
     if url:
-        ontology_manager_factory.open(url)
+        ontology_manager_factory.open(url, **onto_options)
     return {
         Site: SiteDB(),
         Building: BuildingDB(),
@@ -95,14 +95,13 @@ class BuildingDB(StructuralElementDB):
             filters.pop(key, None)
         return filter_str + str_filter(filters)
 
-    def _pre_load_binding(self, binding):
-        quantities = self.get_quantities_for(
-            PREFIX.ROOT.alias_uri(PREFIX.get_name(binding['URI'])),
-            relation=self.PROPERTIES['properties'], kind='Area')
+    def _load_quantities(self, binding, quantities):
         for quantity in quantities:
-            binding[self.TYPE_ATTR_MAPPING[quantity.kind]] = quantity.value
+            if quantity.kind in self.TYPE_ATTR_MAPPING:
+                binding[self.TYPE_ATTR_MAPPING[quantity.kind]] = \
+                    quantity.value
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         if element.kind is not None:
             _class = PREFIX.BUILDING_INFRA.alias_uri(element.kind)
         else:
@@ -1,11 +1,138 @@
 """Serialize/deserialize elements into the data storage solution"""
 
 import abc
+from collections import defaultdict
+import functools
+import logging
+import threading
+import time
 
 from .ontology.manager import SPARQLOP, PREFIX, ontology_manager_factory
 from ..models.tree import Node
 
 
+logger = logging.getLogger('bemserver')
+
+
+class EnumCache():
+    """Process-wide cache of enumeration trees
+
+    Enumeration trees are built once and shared by all callers, which must
+    not modify them (see `Node.copy`). Serialized trees may be cached along.
+
+    The cache is cleared when the ontology version marker (`owl:versionInfo`
+    of the ontologies in triple store) changes, or when `clear` is called.
+    The version marker is read at most every `check_interval` seconds
+    (0: at each access, None: never).
+    """
+
+    VERSION_QUERY = """
+        SELECT ?ontology ?version
+        WHERE {
+            ?ontology rdf:type owl:Ontology.
+            ?ontology owl:versionInfo ?version.
+        }"""
+
+    def __init__(self, check_interval=60):
+        self.check_interval = check_interval
+        self._trees = {}
+        self._dumps = {}
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Clear cache
+
+        Version marker is read again at next access.
+        """
+        with self._lock:
+            self._clear()
+            self._checked_at = None
+        logger.info('Enumeration cache cleared')
+
+    def _clear(self):
+        self._trees.clear()
+        self._dumps.clear()
+
+    def get(self, key, build, onto_mgr):
+        """Return enumeration tree from cache, build it if not found
+
+        :param key: Cache key of the enumeration
+        :param callable build: Function returning the enumeration tree
+        :param OntologyMgr onto_mgr: Ontology manager used to read version
+        """
+        self._check_version(onto_mgr)
+        with self._lock:
+            tree = self._trees.get(key)
+        if tree is None:
+            # Build outside the lock: concurrent builds are harmless
+            tree = build()
+            with self._lock:
+                tree = self._trees.setdefault(key, tree)
+        return tree
+
+    def get_dump(self, tree, key, dump):
+        """Return serialized enumeration tree
+
+        Trees that are not in cache are serialized at each call.
+
+        :param Node tree: Enumeration tree
+        :param key: Serialization key (schema...)
+        :param callable dump: Function serializing the tree
+        """
+        with self._lock:
+            if not self._is_cached(tree):
+                cached = False
+            else:
+                cached = True
+                result = self._dumps.get((id(tree), key))
+        if not cached:
+            return dump(tree)
+        if result is None:
+            result = dump(tree)
+            with self._lock:
+                # Cache may have been cleared meanwhile
+                if self._is_cached(tree):
+                    self._dumps[(id(tree), key)] = result
+        return result
+
+    def _is_cached(self, tree):
+        return any(tree is elt for elt in self._trees.values())
+
+    def _check_version(self, onto_mgr):
+        now = time.monotonic()
+        with self._lock:
+            checked_at = self._checked_at
+        if checked_at is not None and (
+                self.check_interval is None or
+                now - checked_at < self.check_interval):
+            return
+        res = onto_mgr.perform(SPARQLOP.SELECT, self.VERSION_QUERY)
+        version = (onto_mgr.base_url, tuple(sorted(
+            (elt['ontology'], elt['version']) for elt in res.values)))
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    logger.info('Ontology version changed, '
+                                'enumeration cache cleared')
+                self._clear()
+                self._version = version
+            self._checked_at = now
+
+
+enum_cache = EnumCache()
+
+
+def cached_enum(func):
+    """Decorator caching the enumeration tree returned by a getter"""
+    @functools.wraps(func)
+    def wrapper(self):
+        return enum_cache.get(
+            func.__name__, functools.partial(func, self), self.onto_mgr)
+    return wrapper
+
+
 class AbsDBEnum(abc.ABC):
     """An interface for access to enumeration types in the data model."""
 
@@ -191,25 +318,35 @@ class DBEnumHandler(AbsDBEnum):
         :param QueryResult query_result: a `QueryResult` instance
         :result Node: Tree node of enum values.
         """
-        name = PREFIX.get_name(uri)
-        root = Node(name)
+        # Group entries by parent once: parent URI -> list of
+        # (class URI, None) for subclasses or (None, name) for individuals
+        children = defaultdict(list)
         for elt in query_result.values:
-            if elt.get('parent') == uri:
+            if 'parent' in elt:
                 # elt is a class!!!
-                child = self._build_tree(elt['class'], query_result)
-                root.add_child(child)
-            elif elt['class'] == uri and 'indiv' in elt:
+                children[elt['parent']].append((elt['class'], None))
+            elif 'indiv' in elt:
                 # element is a literal
-                name = elt.get('label', PREFIX.get_name(elt['indiv']))
-                root.add_child(Node(name))
-        return root
+                children[elt['class']].append(
+                    (None, elt.get('label', PREFIX.get_name(elt['indiv']))))
+
+        def build(uri):
+            root = Node(PREFIX.get_name(uri))
+            root.add_children(
+                build(child_uri) if child_uri is not None else Node(name)
+                for child_uri, name in children[uri])
+            return root
+
+        return build(uri)
 
+    @cached_enum
     def get_building_types(self):
         """Return building types (from IFC2x3 ontology)."""
         result = self._get_enum('IfcBuilding', PREFIX.IFC2x3, instance=False)
         result.label = 'BuildingType'
         return result
 
+    @cached_enum
     def get_floor_types(self):
         """Return floor types (from IFC2x3 ontology)."""
         result = self._get_enum(
@@ -217,6 +354,7 @@ class DBEnumHandler(AbsDBEnum):
         result.label = 'Floor'
         return result
 
+    @cached_enum
     def get_slab_types(self):
         """Return floor types (from IFC2x3 ontology)."""
         result = self._get_enum(
@@ -224,26 +362,31 @@ class DBEnumHandler(AbsDBEnum):
         result.label = 'Slab'
         return result
 
+    @cached_enum
     def get_space_types(self):
         """Return space types (from IFC2x3 ontology)."""
         result = self._get_enum('IfcSpace', PREFIX.IFC2x3, instance=False)
         result.label = 'Space'
         return result
 
+    @cached_enum
     def get_window_covering_types(self):
         """Return window covering types (from building ontology)."""
         result = self._get_enum('WindowCoveringType', PREFIX.BUILDING_INFRA)
         result.label = 'WindowCovering'
         return result
 
+    @cached_enum
     def get_hemisphere_types(self):
         """Return hemisphere types (from sensor ontology)."""
         return self._get_enum('Hemisphere', PREFIX.BUILDING_INFRA)
 
+    @cached_enum
     def get_climate_types(self):
         """Return climate types (from property ontology)."""
         return self._get_enum('Climate', PREFIX.BUILDING_INFRA)
 
+    @cached_enum
     def get_orientation_types(self):
         """Return orientation types (from building ontology)."""
         return self._get_enum('Orientation', PREFIX.BUILDING_INFRA)
@@ -251,6 +394,7 @@ class DBEnumHandler(AbsDBEnum):
     def get_system_types(self):
         pass
 
+    @cached_enum
     def get_units(self):
         unit_typenames = [
             'temperature', 'humidity', 'pressure', 'length', 'flow',
@@ -260,60 +404,74 @@ class DBEnumHandler(AbsDBEnum):
         units = Node('Units')
         for unit_typename in unit_typenames:
             unit_funcname = 'get_{}_units'.format(unit_typename)
-            units.add_child(getattr(self, unit_funcname)())
+            # Cached trees are shared: add copies
+            units.add_child(getattr(self, unit_funcname)().copy())
         return units
 
+    @cached_enum
     def get_temperature_units(self):
         """Return temperature units (from QUDT ontology)."""
         return self._get_enum('TemperatureUnit', PREFIX.QUDT)
 
+    @cached_enum
     def get_humidity_units(self):
         """Return humidity units (from QUDT ontology)."""
         return self._get_enum('HumidityUnit', PREFIX.QUDT)
 
+    @cached_enum
     def get_pressure_units(self):
         """Return pressure units (from QUDT ontology)."""
         result = self._get_enum('PressureOrStressUnit', PREFIX.QUDT)
         result.label = 'PressureUnit'
         return result
 
+    @cached_enum
     def get_length_units(self):
         """Get length units (from QUDT ontology)."""
         return self._get_enum('LengthUnit', PREFIX.QUDT)
 
+    @cached_enum
     def get_flow_units(self):
         result = self._get_enum('VolumePerTimeUnit', PREFIX.QUDT)
         result.label = 'FlowUnit'
         return result
 
+    @cached_enum
     def get_distance_units(self):
         return self._get_enum('AreaUnit', PREFIX.QUDT)
 
+    @cached_enum
     def get_volume_units(self):
         return self._get_enum('VolumeUnit', PREFIX.QUDT)
 
+    @cached_enum
     def get_radiance_units(self):
         return self._get_enum('RadianceUnit', PREFIX.QUDT)
 
+    @cached_enum
     def get_power_units(self):
         """Return power units (from QUDT ontology)."""
         return self._get_enum('PowerUnit', PREFIX.QUDT)
 
+    @cached_enum
     def get_electric_current_units(self):
         return self._get_enum('ElectricCurrentUnit', PREFIX.QUDT)
 
+    @cached_enum
     def get_electric_charge_units(self):
         return self._get_enum('ElectricChargeUnit', PREFIX.QUDT)
 
     def get_location_types(self):
         pass
 
+    @cached_enum
     def get_occupant_states(self):
         """Return occupant states (from property ontology)"""
         result = self._get_enum('OccupantStateProperties', PREFIX.PROPERTY)
         result.label = 'OccupantState'
         return result
 
+    @cached_enum
     def get_gender_types(self):
         """Return gender types (from BEM ontology)."""
         return self._get_enum('Gender', PREFIX.OCCUPANT)
@@ -322,24 +480,28 @@ class DBEnumHandler(AbsDBEnum):
     def get_age_categories(self):
         pass
 
+    @cached_enum
     def get_energy_sources(self):
         """Select all energy sources"""
         result = self._get_enum('DERBranch', PREFIX.ONTO_MG)
         result.label = 'EnergySource'
         return result
 
+    @cached_enum
     def get_renewable_energy_sources(self):
         """Select all renewable energy sources"""
         result = self._get_enum('RenewableDERBranch', PREFIX.ONTO_MG)
         result.label = 'RenewableEnergySource'
         return result
 
+    @cached_enum
     def get_non_renewable_energy_sources(self):
         """Select all non-renewable energy sources"""
         result = self._get_enum('NonRenewableDERBranch', PREFIX.ONTO_MG)
         result.label = 'NonRenewableEnergySource'
         return result
 
+    @cached_enum
     def get_observation_types(self):
         """Get values for observation types."""
         result = self._get_enum('PhysicalProperty', PREFIX.PROPERTY)
@@ -348,6 +510,7 @@ class DBEnumHandler(AbsDBEnum):
         result.label = 'ObservationType'
         return result
 
+    @cached_enum
     def get_medium_types(self):
         """Get values for medium types."""
         result = self._get_enum('PhysicalMedium', PREFIX.BUILDING_INFRA)
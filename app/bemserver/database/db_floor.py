@@ -91,12 +91,11 @@ class FloorDB(StructuralElementDB):
             filters.pop(key, None)
         return filter_str + str_filter(filters)
 
-    def _pre_load_binding(self, binding):
-        binding['spatial_info'] = self._create_spatial_info_binding(
-            SpatialInfo, PREFIX.ROOT.alias_uri(binding['id']))
-        # binding['spatial_info'] = quantities
+    def _load_quantities(self, binding, quantities):
+        binding['spatial_info'] = self._spatial_info_binding(
+            SpatialInfo, quantities)
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         # Build the query
         query = """{{
                 {0} a {1};
@@ -3,7 +3,7 @@
 from .ontology.generic import ThingDB
 from .ontology.manager import PREFIX
 from .schemas import MeasureSchema
-from .utils import str_insert, str_filter
+from .utils import str_insert, str_filter, values_clause
 
 
 class MeasureDB(ThingDB):
@@ -52,6 +52,10 @@ class MeasureDB(ThingDB):
         # 'property': PREFIX.PROPERTY.alias_uri('hasMeasurementProperty'),
         'associated_locations': PREFIX.SOSA.alias_uri('hasFeatureOfInterest'),
     }
+    # ... associated location types: IFC class names
+    LOCATION_TYPES = {
+        'site': 'IfcSite', 'building': 'IfcBuilding',
+        'floor': 'IfcBuildingStorey', 'space': 'IfcSpace'}
 
     # Check references exist
     REFERENCES = {
@@ -173,6 +177,12 @@ class MeasureDB(ThingDB):
             query += """?URI {} "{}".\n""".format(
                 self.FIELD_TO_RELATION["external_id"],
                 filters.pop('external_id'))
+        # Several external IDs matched in a single query
+        if 'external_ids' in filters:
+            query += """?URI {} ?external_ids.\n""".format(
+                self.FIELD_TO_RELATION["external_id"])
+            query += values_clause(
+                'external_ids', filters.pop('external_ids'))
         query += self._str_select("id")
         query += self._str_select("description", optional=True)
         query += self._str_select("method")
@@ -193,25 +203,41 @@ class MeasureDB(ThingDB):
         query += "}"
         return query
 
-    def _get_locations(self, uri):
-        """Performs the query to get the related locations"""
-        location_types = {
-            'site': 'IfcSite', 'building': 'IfcBuilding',
-            'floor': 'IfcBuildingStorey', 'space': 'IfcSpace'}
-        binding_locations = []
-        for type_name in location_types:
-            ids = self.get_related_individuals_id(
-                uri, self.OPT_LINKS['associated_locations'],
-                parent_cls=PREFIX.IFC2x3.alias_uri(location_types[type_name]))
-            binding_locations.extend(list(map(
-                lambda x: {'type': type_name, 'id': x}, ids
-            )))
-        return binding_locations
+    def _get_locations_many(self, ids):
+        """Performs the query to get the related locations of several
+        measures
+
+        :param list ids: IDs of the measures
+        :return dict: ID: list of locations ({'type': ..., 'id': ...}),
+            sorted by location type
+        """
+        type_names = {
+            cls_name: type_name
+            for type_name, cls_name in self.LOCATION_TYPES.items()}
+        type_order = list(self.LOCATION_TYPES)
+        related = self.get_related_individuals_ids(
+            ids, self.OPT_LINKS['associated_locations'],
+            parent_classes=[
+                PREFIX.IFC2x3.alias_uri(cls_name)
+                for cls_name in self.LOCATION_TYPES.values()])
+        locations = {}
+        for _id in ids:
+            binding_locations = [
+                {'type': type_names[cls_name], 'id': indiv}
+                for indiv, cls_name in related.get(_id, [])]
+            binding_locations.sort(
+                key=lambda loc: type_order.index(loc['type']))
+            locations[_id] = binding_locations
+        return locations
+
+    def _pre_load_bindings(self, bindings):
+        # get locations references of all measures at once
+        locations = self._get_locations_many(
+            [binding['id'] for binding in bindings])
+        for binding in bindings:
+            binding['associated_locations'] = locations[binding['id']]
 
     def _pre_load_binding(self, binding):
-        # get locations references
-        binding['associated_locations'] = self._get_locations(
-            PREFIX.ROOT.alias_uri(binding['id']))
         # uri = PREFIX.ROOT.alias_uri(binding['id_'])
         binding['unit'] = PREFIX.get_name(binding['unit'])
         value_pties = {
@@ -229,7 +255,7 @@ class MeasureDB(ThingDB):
 #                   CREATION
 #############################################
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         _class = PREFIX.SOSA.alias_uri('Observation')
         # Build the query
         query = """{{
@@ -259,15 +285,12 @@ class MeasureDB(ThingDB):
         query += "{rel} {pref}:{id};".format(
             rel=self.LINKS['sensor'], pref=PREFIX.ROOT.alias,
             id=element.sensor_id)
-        # Units - check which prefix first
-        for prefix in self.REFERENCES_ENUM['unit']['prefix']:
-            if self._check_exists(
-                    element.unit, self.REFERENCES_ENUM['unit']['type'],
-                    prefix, True):
-                query += "{rel} {pref}:{id};".format(
-                    rel=self.LINKS_ENUMERATE['unit'], pref=prefix.alias,
-                    id=element.unit)
-                break
+        # Units - prefix found when validating references
+        prefix = ref_prefixes.get('unit')
+        if prefix is not None:
+            query += "{rel} {pref}:{id};".format(
+                rel=self.LINKS_ENUMERATE['unit'], pref=prefix.alias,
+                id=element.unit)
         query += "{rel} {pref}:{id};".format(
             rel=self.LINKS_ENUMERATE['medium'],
             pref=PREFIX.BUILDING_INFRA.alias,
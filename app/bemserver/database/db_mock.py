@@ -3,7 +3,7 @@
 from operator import attrgetter
 
 import inspect
-from uuid import uuid1 as uuid_gen
+from uuid import UUID, uuid1 as uuid_gen
 
 from .exceptions import (
     ItemNotFoundError, ItemSaveError, ItemDeleteError)
@@ -19,6 +19,21 @@ class DatabaseMock():
     Stores data in a dict (by collections) and provides data management methods
     """
 
+    # Filters matching any value of a list: filter name -> attribute name
+    LIST_SIEVES = {
+        'external_ids': 'external_id',
+    }
+
+    # Attributes referencing a parent item -> parent collection names
+    PARENT_ATTRS = (
+        ('site_id', ('Site',)),
+        ('building_id', ('Building',)),
+        ('floor_id', ('Floor',)),
+        ('space_id', ('Space',)),
+        ('sensor_id', ('Sensor',)),
+        ('localization', ('Space', 'Zone', 'Floor', 'Building', 'Site')),
+    )
+
     def __init__(self):
         self.items = {}
 
@@ -49,6 +64,12 @@ class DatabaseMock():
         # apply the filter
         if sieve is not None and len(items) > 0:
             for f_name, f_val in sieve.items():
+                if f_name in self.LIST_SIEVES:
+                    attr = self.LIST_SIEVES[f_name]
+                    items = [
+                        it for it in items
+                        if hasattr(it, attr) and getattr(it, attr) in f_val]
+                    continue
                 items = [
                     it for it in items
                     if hasattr(it, f_name) and getattr(it, f_name) == f_val]
@@ -124,3 +145,40 @@ class DatabaseMock():
         items = self._get_collection_data(item_cls)
         index = self._get_item_index(item, items)
         del items[index]
+
+    def get_parents(self, item_cls, item_ids):
+        """Retrieve the site IDs of 'item_cls' items, following references
+        to parent items. Return a dict item ID -> site ID, without the items
+        not found or not attached to a site"""
+        parents = {}
+        for item_id in item_ids:
+            item = self._find(item_cls.__name__, item_id)
+            site_id = self._get_site_id(item) if item is not None else None
+            if site_id is not None:
+                parents[item_id] = site_id
+        return parents
+
+    def _find(self, collection_name, item_id):
+        # IDs may be given as strings
+        return next((
+            item for item in self.items.get(collection_name, [])
+            if str(item.id) == str(item_id)), None)
+
+    def _get_site_id(self, item):
+        if item.__class__.__name__ == 'Site':
+            return str(item.id)
+        for attr, collection_names in self.PARENT_ATTRS:
+            parent_id = getattr(item, attr, None)
+            if not parent_id:
+                continue
+            # Localization object: search its own references
+            if not isinstance(parent_id, (str, UUID)):
+                return self._get_site_id(parent_id)
+            if attr == 'site_id':
+                return str(parent_id)
+            for collection_name in collection_names:
+                parent = self._find(collection_name, parent_id)
+                if parent is not None:
+                    return self._get_site_id(parent)
+            return None
+        return None
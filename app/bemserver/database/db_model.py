@@ -130,7 +130,7 @@ class ModelDB(ThingDB):
 
 # ------------INSERTION
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         _class = PREFIX.SERVICES.alias_uri('Model')
         # Build the query
         query = """{{{0} a {1}; {2} "{3}" ;""".format(
@@ -4,7 +4,7 @@ from .ontology.generic import ThingDB
 from ..models import OutputEvent
 from .ontology.manager import PREFIX
 from .schemas import OutputSchema
-from .utils import str_insert, str_filter
+from .utils import str_insert, str_filter, values_clause
 
 
 class OutputDB(ThingDB):
@@ -126,6 +126,12 @@ class OutputDB(ThingDB):
                            ?URI a ?cls.
                 """.format(sel=select,
                            clss=PREFIX.SERVICES.alias_uri('Output'),)
+        # Several external IDs matched in a single query
+        if 'external_ids' in filters:
+            query += """?URI {} ?external_ids.\n""".format(
+                self.FIELD_TO_RELATION["external_id"])
+            query += values_clause(
+                'external_ids', filters.pop('external_ids'))
         query += self._str_select("id")
         query += self._str_select("sampling", optional=True)
         query += self._str_select("external_id", optional=True)
@@ -166,7 +172,7 @@ class OutputDB(ThingDB):
         attr_ = attr if not prefix else prefix.alias_uri(attr)
         return str_insert(dict_, obj, attr_, optional=optional, final=final)
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         is_event = isinstance(element, OutputEvent)
         _class = PREFIX.SERVICES.alias_uri('Event' if is_event
                                            else 'TimeSeries')
@@ -189,14 +195,11 @@ class OutputDB(ThingDB):
         query.append("{rel} {obj};".format(
             rel=self.LINKS['localization'],
             obj=PREFIX.ROOT.alias_uri(element.localization)))
-        for prefix in self.REFERENCES_ENUM['unit']['prefix']:
-            if self._check_exists(
-                    element.values_desc.unit,
-                    self.REFERENCES_ENUM['unit']['type'], prefix, True):
-                query += "{rel} {pref}:{id};".format(
-                    rel=self.LINKS_ENUMERATE['unit'], pref=prefix.alias,
-                    id=element.values_desc.unit)
-                break
+        prefix = ref_prefixes.get('unit')
+        if prefix is not None:
+            query.append("{rel} {pref}:{id};".format(
+                rel=self.LINKS_ENUMERATE['unit'], pref=prefix.alias,
+                id=element.values_desc.unit))
         query.append("{rel} {obj};".format(
             rel=self.LINKS_ENUMERATE['kind'],
             obj=PREFIX.PROPERTY.alias_uri(element.values_desc.kind)))
@@ -7,7 +7,7 @@ All elements are related with concepts in the QUDT ontology
 import abc
 
 from .schemas import QuantitySchema
-from .utils import str_insert
+from .utils import str_insert, values_clause
 from .ontology.manager import SPARQLOP, PREFIX, ontology_manager_factory
 from .utils import generate_id
 from .exceptions import ItemNotFoundError
@@ -163,6 +163,68 @@ class QuantityDB(QuantityDAO):
         uris = self.get_all_uris_for(url, relation=relation, kind=kind)
         return (self.get(uri) for uri in uris)
 
+    def get_all_for_many(self, ids, relation=None, kind=None, kinds=None):
+        """Get all quantities associated to several concepts, in a single
+        query. If required, the search is restricted to the relation given in
+        parameter
+
+        :ids list: IDs of the concepts
+        :relation string: the name of the relation used as a filter
+        :kind string: the quantity kind
+        :kinds list: the quantity kinds to match. Quantities of one of these
+            kinds, or of a subclass, are returned with that kind. Others are
+            omitted.
+        :return a dict name of the concept (ID): list of Quantity objects.
+            Concepts without quantities are omitted.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        _relation = "?p" if not relation else relation
+        if kind is None:
+            _kind = PREFIX.PROPERTY.alias_uri('PhenomenonProperty')
+        else:
+            _kind = PREFIX.PROPERTY.alias_uri(kind)
+        if kinds is None:
+            kinds_filter = """?kind rdfs:subClassOf* {}.
+                       ?uri a ?kind.""".format(
+                           PREFIX.PROPERTY.alias_uri('PhenomenonProperty'))
+        else:
+            kinds_filter = """{}
+                       ?kind_class rdfs:subClassOf* ?kind.
+                       ?uri a ?kind_class.""".format(
+                           values_clause(
+                               'kind', kinds, prefix=PREFIX.PROPERTY))
+        # Build query
+        query = """SELECT ?elt ?uri ?kind ?unit ?value
+                   WHERE {{
+                       {values}
+                       ?elt {rel} ?uri.
+                       ?class rdfs:subClassOf* {kind}.
+                       ?uri a ?class.
+                       {kinds}
+                       ?uri {value} ?value;
+                            {unit} ?unit.
+                   }}""".format(
+                       values=values_clause('elt', ids, prefix=PREFIX.ROOT),
+                       rel=_relation, kind=_kind, kinds=kinds_filter,
+                       value=self.QUANTITY['value'],
+                       unit=self.QUANTITY['unit'])
+        result = self.onto_mgr.perform(SPARQLOP.SELECT, query)
+        # Keep first binding for each quantity (and kind, if kinds are
+        # given), as get does
+        bindings = {}
+        for binding in result.values:
+            key = (binding.pop('elt'), binding.pop('uri'))
+            if kinds is not None:
+                key += (binding['kind'], )
+            bindings.setdefault(key, binding)
+        quantities = {}
+        for key, binding in bindings.items():
+            quantities.setdefault(PREFIX.get_name(key[0]), []).append(
+                self._to_object(binding))
+        return quantities
+
     def get_all_uris_for(self, url, relation=None, kind=None):
         """Get all URIS associated to the url. If
         required, the search is restricted to the relation given in parameter
@@ -168,7 +168,7 @@ class SensorDB(ThingDB):
     def _post_get(self, values):
         return (r for r in values if 'id' in r)
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         _class = PREFIX.SOSA.alias_uri('Sensor')
         # Build the query
         query = """{{
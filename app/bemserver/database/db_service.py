@@ -114,7 +114,7 @@ class ServiceDB(ThingDB):
     def _post_get(self, values):
         return (r for r in values if 'id' in r)
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         _class = PREFIX.SERVICES.alias_uri(element.kind or 'Service')
         # Build the query
         query = """{{{0} a {1}; {2} "{3}" ;""".format(
@@ -100,7 +100,7 @@ class SiteDB(ThingDB):
         binding['geographic_info'] = {
             key: binding.pop(key) for key in geo_info_keys if key in binding}
 
-    def _build_create_query(self, _id, site):
+    def _build_create_query(self, _id, site, ref_prefixes):
         """Create sites into the data model
 
         :param site: A Site object to be created
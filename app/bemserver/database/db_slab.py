@@ -95,10 +95,10 @@ class SlabDB(StructuralElementDB):
             {x: filters[x] for x in filters if x not in self.FILTERS_REF})
         return filter_str + str_filter_relation(filters, self.FILTERS_REF)
 
+    def _load_quantities(self, binding, quantities):
+        binding['surface_info'] = self._surface_info_binding(quantities)
+
     def _pre_load_binding(self, binding):
-        # Get quantities
-        binding['surface_info'] = self._create_surface_info_binding(
-            PREFIX.ROOT.alias_uri(binding['id']))
         # Get deilimited elements
         binding['floors'] = list(self.get_related_individuals_id(
             PREFIX.ROOT.alias_uri(binding['id']),
@@ -110,7 +110,7 @@ class SlabDB(StructuralElementDB):
             self.LINKS["windows"],
             PREFIX.IFC2x3.alias_uri('IfcWindow')))
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         _class = PREFIX.IFC2x3.alias_uri('IfcSlab') if not element.kind else \
             PREFIX.BUILDING_INFRA.alias_uri(element.kind)
         # Build the query
@@ -99,10 +99,11 @@ class SpaceDB(StructuralElementDB):
             filters.pop(key, None)
         return filter_str + str_filter(filters)
 
+    def _load_quantities(self, binding, quantities):
+        binding['spatial_info'] = self._spatial_info_binding(
+            SpatialInfo, quantities)
+
     def _pre_load_binding(self, binding):
-        binding['spatial_info'] = self._create_spatial_info_binding(
-            SpatialInfo,
-            PREFIX.ROOT.alias_uri(PREFIX.get_name(binding['URI'])))
         # Add quantities
         occupancy_keys = ('nb_max', 'nb_permanents')
         occupancy = {
@@ -111,7 +112,7 @@ class SpaceDB(StructuralElementDB):
         if occupancy:
             binding['occupancy'] = occupancy
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         if element.kind is not None:
             _class = PREFIX.BUILDING_INFRA.alias_uri(element.kind)
         else:
@@ -115,15 +115,15 @@ class WindowDB(StructuralElementDB):
                 pref=PREFIX.BUILDING_INFRA.alias) for x in self.LINKS})
         return filter_str
 
+    def _load_quantities(self, binding, quantities):
+        binding['surface_info'] = self._surface_info_binding(quantities)
+
     def _pre_load_binding(self, binding):
-        # Get quantities
-        binding['surface_info'] = self._create_surface_info_binding(
-            PREFIX.ROOT.alias_uri(binding['id']))
         for key in self.REFERENCES_ENUM:
             if key in binding:
                 binding[key] = PREFIX.get_name(binding[key])
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         _class = PREFIX.IFC2x3.alias_uri('IfcWindow')
         # Build the query
         query = """{{
@@ -92,7 +92,7 @@ class ZoneDB(ThingDB):
             self.LINKS["zones"],
             PREFIX.IFC2x3.alias_uri('IfcZone')))
 
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         # Build the query
         query = """{{
                 {0} a {1};
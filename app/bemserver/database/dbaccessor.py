@@ -97,3 +97,25 @@ class DBAccessor():
         handler, is_mock = self._get_handler(item_cls)
         return handler.get_parent(item_id) if not is_mock\
             else None
+
+    def get_parents(self, item_cls, item_ids):
+        """Get the parent IDs of the objects identified by item_ids, in a
+        single request. Return a dict item_id -> parent ID, without the
+        objects whose parent is not found. For control access purpose"""
+        handler, is_mock = self._get_handler(item_cls)
+        return handler.get_parents(item_ids) if not is_mock\
+            else self._db.get_parents(item_cls, item_ids)
+
+    def get_parents_many_classes(self, item_clss, item_ids):
+        """Same as get_parents, for objects of several classes. Classes are
+        tried in order, each one for the objects whose parent is not found
+        yet. For control access purpose"""
+        parents = {}
+        item_ids = list(item_ids)
+        for item_cls in item_clss:
+            if not item_ids:
+                break
+            parents.update(self.get_parents(item_cls, item_ids))
+            item_ids = [
+                item_id for item_id in item_ids if item_id not in parents]
+        return parents
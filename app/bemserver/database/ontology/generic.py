@@ -9,7 +9,7 @@ from marshmallow import ValidationError
 
 from .manager import PREFIX, SPARQLOP, ontology_manager_factory
 from ..db_quantity import QuantityDB
-from ..utils import generate_id
+from ..utils import generate_id, values_clause
 from ..exceptions import ItemNotFoundError, ItemError
 
 
@@ -88,6 +88,16 @@ class ThingDB(abc.ABC):
         :param dict binding: Element of QueryResult.result
         """
 
+    def _pre_load_bindings(self, bindings):
+        """Mutate bindings to prepare loading by object Schema
+
+        Called with all bindings of a query result, before _pre_load_binding
+        is called for each binding. Override to fetch related data for all
+        bindings in a single query.
+
+        :param list bindings: QueryResult.result
+        """
+
     def _get(self, identifier=None, **filters):
         """Get elements. Request can be filtered by identifier
 
@@ -97,6 +107,7 @@ class ThingDB(abc.ABC):
         query = self._build_select_query(identifier=identifier, **filters)
         result = self.onto_mgr.perform(SPARQLOP.SELECT, query)
         values = self._post_get(result.values)
+        self._pre_load_bindings(values)
         return (self._to_object(bind) for bind in values)
 
     def _post_get(self, values):
@@ -140,9 +151,9 @@ class ThingDB(abc.ABC):
         :param Thing element: Element object to be created
         :return: Created element ID
         """
-        self._validate_refs(element)
+        ref_prefixes = self._validate_refs(element)
         _id = generate_id()
-        query = self._build_create_query(_id, element)
+        query = self._build_create_query(_id, element, ref_prefixes)
         self.onto_mgr.perform(SPARQLOP.INSERT, 'INSERT DATA {}'.format(query))
         element.id = _id
         return _id
@@ -151,67 +162,123 @@ class ThingDB(abc.ABC):
         """Validate type and existence of references
 
         This is meant to be called before create/update operations.
+
+        :return dict: Prefixes of enumerated references (see
+            _validate_refs_many)
+        """
+        errors, prefixes = self._validate_refs_many([element])
+        if errors[0]:
+            raise ValidationError(errors[0])
+        return prefixes[0]
+
+    def _validate_refs_many(self, elements):
+        """Validate type and existence of references of several elements
+
+        All references are checked in a single query. This is meant to be
+        called before create/update operations, possibly in bulk.
+
+        :param list elements: Element objects
+        :return tuple: (errors, prefixes) lists. For each element, errors is
+            a dict of errors by attribute, empty if all references are
+            valid, and prefixes is a dict of the first prefix with which
+            each enumerated (REFERENCES_ENUM) reference exists
+        """
+        # (element index, attribute, list index) -> candidate references
+        refs = {}
+        for elt_idx, element in enumerate(elements):
+            for attr, _type in self.REFERENCES.items():
+                refs.update(self._get_ref_candidates(
+                    elt_idx, element, attr, _type))
+            for attr, pties in self.REFERENCES_ENUM.items():
+                refs.update(self._get_ref_candidates(
+                    elt_idx, element, attr, pties['type'], pties['prefix'],
+                    pties['indiv']))
+        existing = self._find_existing_refs(
+            {ref for candidates in refs.values() for ref in candidates})
+        errors = [{} for _ in elements]
+        prefixes = [{} for _ in elements]
+        for (elt_idx, attr, idx), candidates in refs.items():
+            found = [candidate in existing for candidate in candidates]
+            if not any(found):
+                if idx is None:
+                    errors[elt_idx][attr] = ['Reference not found', ]
+                else:
+                    errors[elt_idx].setdefault(attr, {})
+                    errors[elt_idx][attr][str(idx)] = [
+                        'Reference not found', ]
+            elif idx is None and attr in self.REFERENCES_ENUM:
+                # Candidates are in prefixes order
+                prefix = self.REFERENCES_ENUM[attr]['prefix']
+                if not isinstance(prefix, list):
+                    prefix = [prefix]
+                prefixes[elt_idx][attr] = prefix[found.index(True)]
+        return errors, prefixes
+
+    @staticmethod
+    def _get_ref_candidates(
+            elt_idx, element, attr, _type, prefix=None, indiv=True):
+        """Get references to check for an element attribute
+
+        A reference is valid if any of its candidates exists: one candidate
+        per prefix, if several prefixes are possible.
+
+        :return dict: (element index, attribute, list index or None) ->
+            list of candidates (see _find_existing_refs)
         """
-        errors = {}
-        for attr, _type in self.REFERENCES.items():
-            errors.update(self._validate_single_ref(element, attr, _type))
-        for attr, pties in self.REFERENCES_ENUM.items():
-            errors.update(self._validate_single_ref(
-                element, attr, pties['type'], pties['prefix'], pties['indiv']))
-        if errors:
-            raise ValidationError(errors)
-
-    def _validate_single_ref(
-            self, element, attr, _type, prefix=None, indiv=True):
         prefixes = [prefix] if not isinstance(prefix, list) else prefix
-        errors = {}
-        for _prefix in prefixes:
-            errors = self._validate_single_ref_single_type(
-                element, attr, _type, _prefix, indiv)
-            if len(errors) == 0:
-                return errors
-        return errors
-
-    def _validate_single_ref_single_type(
-            self, element, attr, _type, prefix, indiv):
-        """Validate a reference"""
-        errors = {}
         if not isinstance(_type, list):
             _id = getattr(element, attr, None)
-            if _id is not None:
-                if not self._check_exists(_id, _type, prefix, indiv):
-                    errors[attr] = ['Reference not found', ]
+            ids = {None: _id} if _id is not None else {}
         else:
-            _id_list = getattr(element, attr, [])
-            for idx, _id in enumerate(_id_list):
-                if not self._check_exists(_id, _type[0], prefix, indiv):
-                    errors.setdefault(attr, {})
-                    errors[attr][str(idx)] = ['Reference not found', ]
-        return errors
-
-    def _check_exists(self, _id, _type, prefix, individuals):
-        """Check existence and type of an element
-
-        :param str _id: UUID of the element
-        :param str _type: alias URI of the element type
-        :param prefix: the prefix used to build the URI of the element
-        :param bool individuals: True if the element is supposed to be an
-            individual
+            ids = dict(enumerate(getattr(element, attr, [])))
+            _type = _type[0]
+        return {
+            (elt_idx, attr, idx): [
+                (PREFIX.ROOT.alias_uri(_id) if not _prefix
+                 else _prefix.alias_uri(_id), _type, indiv)
+                for _prefix in prefixes]
+            for idx, _id in ids.items()}
+
+    def _find_existing_refs(self, refs):
+        """Check existence and type of several elements in a single query
+
+        :param set refs: (alias URI of the element, alias URI of the element
+            type, individuals) tuples, individuals being True if the element
+            is supposed to be an individual of the type (or of a subclass),
+            False if it is supposed to be the type (or a subclass)
+        :return set: Subset of refs that exist
         """
-        uri = PREFIX.ROOT.alias_uri(_id) if not prefix\
-            else prefix.alias_uri(_id)
-        param_query = "ASK WHERE {{?c {rel}* {type}. {uri} a ?c}}"\
-            if individuals else "ASK WHERE {{{uri} {rel}* {type}}}"
-        query = param_query.format(
-            rel=PREFIX.RDFS.alias_uri('subClassOf'), type=_type, uri=uri)
-        result = self.onto_mgr.perform(SPARQLOP.ASK, query)
-        return result.values
+        refs = list(refs)
+        if not refs:
+            return set()
+        patterns = {
+            True: '?cls {rel}* ?type. ?uri a ?cls.',
+            False: '?uri {rel}* ?type.',
+        }
+        branches = []
+        for individuals, pattern in patterns.items():
+            rows = [
+                '({} {} {})'.format(idx, uri, _type)
+                for idx, (uri, _type, indiv) in enumerate(refs)
+                if bool(indiv) is individuals]
+            if rows:
+                branches.append(
+                    '{{VALUES (?idx ?uri ?type) {{{rows}}} {pattern}}}'.format(
+                        rows=' '.join(rows),
+                        pattern=pattern.format(
+                            rel=PREFIX.RDFS.alias_uri('subClassOf'))))
+        query = 'SELECT DISTINCT ?idx WHERE {{{}}}'.format(
+            ' UNION '.join(branches))
+        result = self.onto_mgr.perform(SPARQLOP.SELECT, query)
+        return {refs[int(binding['idx'])] for binding in result.values}
 
     @abc.abstractmethod
-    def _build_create_query(self, _id, element):
+    def _build_create_query(self, _id, element, ref_prefixes):
         """Build query to add element to the ontology
 
         @element: element to add
+        @ref_prefixes: prefixes of enumerated references, as returned by
+            _validate_refs
         """
 
     def remove(self, identifier):
@@ -260,10 +327,11 @@ class ThingDB(abc.ABC):
         :param Thing new_element: new element that should replace the one
             identified by identifier
         """
-        self._validate_refs(new_element)
+        ref_prefixes = self._validate_refs(new_element)
         delete, where = self._get_delete_for_update(
             PREFIX.ROOT.alias_uri(identifier))
-        insert = self._build_create_query(identifier, new_element)
+        insert = self._build_create_query(
+            identifier, new_element, ref_prefixes)
         self.onto_mgr.perform(
             SPARQLOP.UPDATE, "{} INSERT {} {}".format(delete, insert, where))
         new_element.id = identifier
@@ -289,6 +357,48 @@ class ThingDB(abc.ABC):
         result = self.onto_mgr.perform(SPARQLOP.SELECT, query)
         return [PREFIX.get_name(indiv['indiv']) for indiv in result.values]
 
+    def get_related_individuals_ids(
+            self, my_uuids, relation, parent_classes=None):
+        """Get IDs of individuals related to several objects, in a single
+        query
+
+        :param list my_uuids: UUIDs of the objects
+        :param str relation: Relation linking the objects to the individuals
+        :param list parent_classes: URLs of the classes of the individuals
+        :return: dict UUID: list of (individual ID, class name) tuples, class
+            name being the name of the parent class the individual belongs
+            to, or None if no parent class is given. Objects without related
+            individuals are omitted.
+        """
+        my_uuids = list(dict.fromkeys(my_uuids))
+        if not my_uuids:
+            return {}
+        if parent_classes:
+            filter_ = (
+                'VALUES ?parent_cls {{{0}}}. ?cls {1}* ?parent_cls. '
+                '?indiv a ?cls'.format(
+                    ' '.join(parent_classes),
+                    PREFIX.RDFS.alias_uri('subClassOf')))
+        else:
+            filter_ = ''
+        # An individual may be found through several classes (several types
+        # or several subclass paths to a parent class)
+        query = """SELECT DISTINCT ?uri ?indiv ?parent_cls WHERE {{
+                   {values}
+                   ?uri {rel} ?indiv.
+                   {filt}
+                }}""".format(
+                    values=values_clause('uri', my_uuids, prefix=PREFIX.ROOT),
+                    rel=relation, filt=filter_)
+        result = self.onto_mgr.perform(SPARQLOP.SELECT, query)
+        related = {}
+        for binding in result.values:
+            parent_cls = binding.get('parent_cls')
+            related.setdefault(PREFIX.get_name(binding['uri']), []).append((
+                PREFIX.get_name(binding['indiv']),
+                PREFIX.get_name(parent_cls) if parent_cls else None))
+        return related
+
     def _create_relation_to(self, subj, relation, obj):
         """Create a relation between objects
 
@@ -311,13 +421,12 @@ class ThingDB(abc.ABC):
             {} ?rel ?obj. {}}}""".format(triple, subj, filter_)
         self.onto_mgr.perform(SPARQLOP.DELETE, query)
 
-    def _create_spatial_info_binding(self, class_, uri):
+    @staticmethod
+    def _spatial_info_binding(class_, quantities):
         """Create bindings for spatial information associated to a Schema
 
-        :param uri: The URI associated to the object
+        :param quantities: The quantities associated to the object
         :return: Dictionary to create a spatial information"""
-        quantities = self.get_quantities_for(
-            uri, relation=self.PROPERTIES['properties'])
         return {
             class_.get_attr_name(q.kind): q.value for q in quantities}
 
@@ -334,6 +443,27 @@ class ThingDB(abc.ABC):
             raise ItemError
         return PREFIX.get_name(result.values[0]['parent_site'])
 
+    def get_parents(self, my_uuids):
+        '''Returns the site IDs to which the objects identified by my_uuids
+        are attached, in a single query.
+        :param my_uuids list: the UUIDs of the objects
+        :return a dict UUID: UUID of the parent. Objects not attached to
+            exactly one site are omitted'''
+        if not my_uuids:
+            return {}
+        query = "SELECT ?uri ?parent_site WHERE {{{values} ?uri {rel} "\
+            "?parent_site}}".format(
+                values=values_clause('uri', my_uuids, prefix=PREFIX.ROOT),
+                rel=PREFIX.BUILDING_INFRA.alias_uri('parentSite'))
+        result = self.onto_mgr.perform(SPARQLOP.SELECT, query)
+        parents = {}
+        for binding in result.values:
+            parents.setdefault(PREFIX.get_name(binding['uri']), []).append(
+                PREFIX.get_name(binding['parent_site']))
+        return {
+            uuid: sites[0] for uuid, sites in parents.items()
+            if len(sites) == 1}
+
 
 class StructuralElementDB(ThingDB):
     """An abstract class for Structural elements"""
@@ -342,6 +472,10 @@ class StructuralElementDB(ThingDB):
         'properties': PREFIX.SSN.alias_uri('hasProperty'),
     }
 
+    # Surface information attribute: quantity kind mapping, if any (see
+    # _surface_info_binding)
+    DIMENSIONS = None
+
     def __init__(self):
         super().__init__()
         self.quantity_db = QuantityDB()
@@ -368,23 +502,40 @@ class StructuralElementDB(ThingDB):
             self.quantity_db.create_for(
                 quantity, self.PROPERTIES['properties'], elt_url)
 
-    def _create_surface_info_binding(self, uri):
-        """Create bindings for spatial information associated to a WallSchema
+    def _surface_info_binding(self, quantities):
+        """Create bindings for surface information associated to a WallSchema
 
-        :param uri: The URI associated to the object
-        :param dimensions: A dictionary
-        :param properties: The PROPERTIES dictionary of DB handler
-        :return: Dictionary to create a spatial information"""
+        Quantities are expected to be loaded with DIMENSIONS kinds (see
+        _pre_load_bindings), so that a quantity of a subclass of a dimension
+        kind counts for that dimension.
+
+        :param quantities: The quantities associated to the object
+        :return: Dictionary to create a surface information"""
         spatial_binding = {}
         for quantity in self.DIMENSIONS:
-            quantities = self.get_quantities_for(
-                uri,
-                relation=self.PROPERTIES['properties'],
-                kind=self.DIMENSIONS[quantity])
-            spatial_binding[quantity] = quantities[0].value\
-                if len(list(quantities)) == 1 else None
+            values = [
+                q.value for q in quantities
+                if q.kind == self.DIMENSIONS[quantity]]
+            spatial_binding[quantity] = values[0]\
+                if len(values) == 1 else None
         return spatial_binding
 
+    def _pre_load_bindings(self, bindings):
+        # Get quantities of all elements at once
+        quantities = self.quantity_db.get_all_for_many(
+            [binding['id'] for binding in bindings],
+            relation=self.PROPERTIES['properties'],
+            kinds=list(self.DIMENSIONS.values()) if self.DIMENSIONS else None)
+        for binding in bindings:
+            self._load_quantities(binding, quantities.get(binding['id'], []))
+
+    def _load_quantities(self, binding, quantities):
+        """Mutate binding to add element quantities
+
+        :param dict binding: Element of QueryResult.result
+        :param list quantities: Quantities associated to the element
+        """
+
     def remove(self, identifier):
         """Remove an element identified by its id
 
@@ -1,10 +1,13 @@
 """Module related to the usage of the Apache Jena/Fuseki RDF triple store"""
 
+import os
 import enum
-import urllib
+import time
 import logging
+import threading
 
-import SPARQLWrapper as sprqlw
+import requests
+from requests.adapters import HTTPAdapter
 
 from .exceptions import SPARQLError
 from ...tools.custom_enum import AutoEnum
@@ -104,7 +107,23 @@ class QueryResult:
 
 
 class OntologyMgr:
-    """A manager of the data model instantiated in a Jena system"""
+    """A manager of the data model instantiated in a Jena system
+
+    Queries are sent through a requests session keeping HTTP connections
+    alive in a pool, so that successive queries don't open a new connection
+    each. The manager can be shared by threads.
+
+    :param str base_url: Jena/Fuseki dataset URL
+    :param int pool_size: (optional, default 10)
+        Maximum number of connections kept alive by endpoint. Connections
+        opened beyond this number by concurrent queries are closed after
+        use.
+    :param float connect_timeout: (optional, default 5)
+        Connection timeout, in seconds. None means no timeout.
+    :param float read_timeout: (optional, default 60)
+        Timeout waiting for query response, in seconds. None means no
+        timeout.
+    """
 
     QRY_TYPE_OP_URL_MAPPING = {
         SPARQLOP.SELECT: 'query',
@@ -117,32 +136,74 @@ class OntologyMgr:
     QRY_PREFIX_LIST = '\n'.join(
         ['PREFIX {}:<{}>'.format(p.alias, p.url) for p in PREFIX])
 
-    def __init__(self, base_url):
+    def __init__(self, base_url, *, pool_size=10, connect_timeout=5,
+                 read_timeout=60):
         if not base_url.endswith('/'):
             base_url += '/'
         self.base_url = base_url
-        # Create query and update wrapper
-        self.wrappers = {op: sprqlw.SPARQLWrapper(''.join((self.base_url, op)))
-                         for op in ('query', 'update')}
+        self.timeout = (connect_timeout, read_timeout)
+        # One pool for query and update endpoints (same host)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Per-operation latency: SPARQLOP -> [count, total time, max time]
+        self._latency = {}
+        self._latency_lock = threading.Lock()
 
-    def _get_wrapper(self, sparqlop):
-        """Return SPARQLWrapper corresponding to SPARQL operation"""
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+    def _get_endpoint(self, sparqlop):
+        """Return URL of endpoint corresponding to SPARQL operation"""
         try:
-            return self.wrappers[self.QRY_TYPE_OP_URL_MAPPING[sparqlop]]
+            return ''.join(
+                (self.base_url, self.QRY_TYPE_OP_URL_MAPPING[sparqlop]))
         except KeyError:
             raise SPARQLError('Invalid SPARQL operator "{}"'.format(sparqlop))
 
-    @staticmethod
-    def _query(sparqlw):
+    def _query(self, sparqlop, query):
+        """Send query to endpoint and return response"""
+        endpoint = self._get_endpoint(sparqlop)
+        op_url = self.QRY_TYPE_OP_URL_MAPPING[sparqlop]
+        headers = {}
+        if op_url == 'query':
+            headers['Accept'] = 'application/sparql-results+json'
+        start = time.perf_counter()
         try:
-            return sparqlw.query()
-        except (
-                sprqlw.SPARQLExceptions.SPARQLWrapperException,
-                urllib.error.URLError
-        ) as exc:
+            response = self.session.post(
+                endpoint, data={op_url: query}, headers=headers,
+                timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as exc:
             logger.error('Error while executing SPARQL query: %s\nQuery:\n%s',
-                         exc, sparqlw.queryString)
+                         exc, query)
             raise SPARQLError(exc)
+        finally:
+            self._record_latency(sparqlop, time.perf_counter() - start)
+        return response
+
+    def _record_latency(self, sparqlop, duration):
+        logger.debug('SPARQL %s query executed in %.3f s',
+                     sparqlop.name, duration)
+        with self._latency_lock:
+            latency = self._latency.setdefault(sparqlop, [0, 0., 0.])
+            latency[0] += 1
+            latency[1] += duration
+            latency[2] = max(latency[2], duration)
+
+    def latency_stats(self):
+        """Return latency statistics of queries performed so far
+
+        :return dict: SPARQLOP -> dict with number of queries ("count"),
+            total and maximum query time in seconds ("total", "max")
+        """
+        with self._latency_lock:
+            return {
+                sparqlop: {'count': count, 'total': total, 'max': max_}
+                for sparqlop, (count, total, max_) in self._latency.items()}
 
     def perform(self, sparqlop, query):
         """Perform SPARQL query
@@ -151,40 +212,71 @@ class OntologyMgr:
         :param str query: SPARQL query
         :return: A QueryResult instance
         """
-        sparqlw = self._get_wrapper(sparqlop)
         query = '{}\n{}'.format(self.QRY_PREFIX_LIST, query)
-        sparqlw.setQuery(query)
+        response = self._query(sparqlop, query)
         if sparqlop is SPARQLOP.SELECT or sparqlop is SPARQLOP.ASK:
-            sparqlw.setReturnFormat(sprqlw.JSON)
-            result = QueryResult.from_jena_query(
-                self._query(sparqlw).convert(), sparqlop)
+            try:
+                content = response.json()
+            except ValueError as exc:
+                logger.error(
+                    'Error while reading SPARQL query result: %s\nQuery:\n%s',
+                    exc, query)
+                raise SPARQLError(exc)
+            result = QueryResult.from_jena_query(content, sparqlop)
         else:
-            sparqlw.setMethod('POST')
-            query_response = self._query(sparqlw)
-            result = QueryResult(query_response.response.status,
-                                 message=query_response.response.reason)
+            result = QueryResult(response.status_code,
+                                 message=response.reason)
         return result
 
 
 class OntologyMgrFactory:
-    """Factory class producing OntologyMgr instances"""
+    """Factory class producing OntologyMgr instances
+
+    All callers of a process share the same OntologyMgr instance, and its
+    connection pool. A forked process gets its own instance.
+    """
 
     def __init__(self):
         self.base_url = None
+        self.options = {}
+        self._onto_mgr = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def open(self, url, **options):
+        """Set base URL and OntologyMgr options
 
-    def open(self, url):
-        """Set base URL"""
-        self.base_url = url
+        :param str url: Jena/Fuseki dataset URL
+        :param options: OntologyMgr keyword arguments (pool size, timeouts)
+        """
+        with self._lock:
+            self._reset()
+            self.base_url = url
+            self.options = options
 
     def close(self):
         """Unset base URL"""
-        self.base_url = None
+        with self._lock:
+            self._reset()
+            self.base_url = None
+            self.options = {}
+
+    def _reset(self):
+        if self._onto_mgr is not None and self._pid == os.getpid():
+            self._onto_mgr.close()
+        self._onto_mgr = None
+        self._pid = None
 
     def get_ontology_manager(self):
-        """Produce an OntologyMgr instance"""
-        if self.base_url is None:
-            raise RuntimeError('OntologyMgrFactory is not initialized')
-        return OntologyMgr(self.base_url)
+        """Return the OntologyMgr instance of current process"""
+        with self._lock:
+            if self.base_url is None:
+                raise RuntimeError('OntologyMgrFactory is not initialized')
+            # Don't share connections with parent process
+            if self._onto_mgr is None or self._pid != os.getpid():
+                self._onto_mgr = OntologyMgr(self.base_url, **self.options)
+                self._pid = os.getpid()
+            return self._onto_mgr
 
 
 ontology_manager_factory = OntologyMgrFactory()
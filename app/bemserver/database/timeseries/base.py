@@ -1,6 +1,122 @@
 """Abstract timeseries database manager"""
 
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+import pandas as pd
+
+from bemserver.models.timeseries import Timeseries
+
+from . import partitions
+from . import rollups
+
+
+def fsync(path):
+    """Flush file or directory to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def dataframe_stats(dataframe):
+    """Return stats of a timeseries dataframe
+
+    Same as Timeseries.stats, without building a Timeseries.
+    """
+    if dataframe.empty:
+        return {'count': 0}
+    return {
+        'count': len(dataframe),
+        'start': dataframe.index.min(),
+        'end': dataframe.index.max(),
+        'update_ts': dataframe[Timeseries.UPDATE_TIMESTAMP_COL].max(),
+    }
+
+
+def _common_tz(timestamps):
+    """Make timestamps comparable
+
+    If naive and aware timestamps are mixed, naive ones are considered UTC.
+    """
+    timestamps = [pd.Timestamp(t) for t in timestamps]
+    if any(t.tz is not None for t in timestamps):
+        timestamps = [
+            t.tz_localize('UTC') if t.tz is None else t for t in timestamps]
+    return [t for t in timestamps if t is not pd.NaT]
+
+
+def merge_stats(stats_list):
+    """Merge stats of distinct parts of a timeseries (e.g. time partitions)
+
+    :param list stats_list: List of stats dicts, as returned by stats
+    """
+    stats_list = [stats for stats in stats_list if stats['count']]
+    if not stats_list:
+        return {'count': 0}
+    return {
+        'count': sum(stats['count'] for stats in stats_list),
+        'start': min(_common_tz(stats['start'] for stats in stats_list)),
+        'end': max(_common_tz(stats['end'] for stats in stats_list)),
+        'update_ts': max(
+            _common_tz(stats['update_ts'] for stats in stats_list),
+            default=pd.NaT),
+    }
+
+
+def select_range(dataframe, t_start=None, t_end=None):
+    """Return dataframe rows in [t_start, t_end)"""
+    index = partitions.to_naive_utc(dataframe.index)
+    mask = np.ones(len(dataframe), dtype=bool)
+    if t_start is not None:
+        mask &= index >= partitions.to_naive_utc(t_start)
+    if t_end is not None:
+        mask &= index < partitions.to_naive_utc(t_end)
+    return dataframe[mask]
+
+
+def upsert(dataframe, new_df):
+    """Merge new values into dataframe, new values replace existing ones
+
+    If naive and aware indexes are mixed, naive indexes are considered UTC.
+    """
+    if (dataframe.index.tz is None) != (new_df.index.tz is None):
+        if dataframe.index.tz is None:
+            dataframe = dataframe.tz_localize('UTC')
+        else:
+            new_df = new_df.tz_localize('UTC')
+    return pd.concat([
+        dataframe[~dataframe.index.isin(new_df.index)], new_df])
+
+
+def resample_chunks(chunks, freq, operation):
+    """Resample values read in chunks and return Timeseries
+
+    Same as Timeseries.resample on the concatenation of chunks. Each chunk
+    is folded into partial aggregates per resampling bucket (see rollups
+    module), so that memory use depends on the number of buckets, not on
+    the number of values. Chunks may overlap buckets and come in any order.
+
+    :param iterable chunks: Timeseries dataframes
+    :param str freq: Resampling frequency (key in Timeseries.AGG_FREQUENCIES)
+    :param str operation: Aggregation operation (in Timeseries.AGG_OPERATIONS)
+    """
+    partials = None
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        chunk_partials = rollups.to_partials(chunk)
+        chunk_partials.index = partitions.to_naive_utc(chunk_partials.index)
+        chunk_partials = rollups.fold(chunk_partials, freq)
+        partials = (
+            chunk_partials if partials is None
+            else rollups.fold(pd.concat([partials, chunk_partials]), freq))
+    if partials is None:
+        return Timeseries()
+    return rollups.resample(partials, freq, operation)
 
 
 class TimeseriesMgr(ABC):
@@ -23,34 +139,218 @@ class TimeseriesMgr(ABC):
     Bottom line, you'd better stick with naive (implicit UTC) or aware (UTC).
     """
 
+    # Default number of parallel reads in get_many
+    max_read_workers = 4
+
     @abstractmethod
-    def get(self, ts_id, t_start, t_end):
+    def get(self, site, ts_id, *, t_start=None, t_end=None):
         """Get values for a time series in a given interval
 
+        :param str site: Site ID
         :param str ts_id: Time series ID
-        :param datetime t_start: Start time
-        :param datetime t_end: End time (exclusive)
+        :param datetime t_start: (optional) Start time
+        :param datetime t_end: (optional) End time (exclusive)
+
+        Returns a Timeseries with the values for [t_start, t_end)
+        """
+
+    def get_many(self, site_ts_pairs, *, t_start=None, t_end=None,
+                 max_workers=None):
+        """Get values for several time series in a given interval
+
+        Time series are read in parallel threads. Each time series is stored
+        in its own files, so reads don't wait for each other's file locks.
+        Managers whose reads are serialized anyway read sequentially by
+        default (max_read_workers is 1).
+
+        :param list site_ts_pairs: (site ID, time series ID) pairs
+        :param datetime t_start: (optional) Start time
+        :param datetime t_end: (optional) End time (exclusive)
+        :param int max_workers: (optional, default max_read_workers)
+            Maximum number of parallel reads
 
-        Returns a dataframe with the values for [t_start, t_end)
+        Returns the list of Timeseries for [t_start, t_end), in the same
+        order as site_ts_pairs.
         """
+        pairs = list(dict.fromkeys(site_ts_pairs))
+        if not pairs:
+            return []
+        if max_workers is None:
+            max_workers = self.max_read_workers
+
+        def get(pair):
+            return self.get(*pair, t_start=t_start, t_end=t_end)
+
+        if len(pairs) == 1 or max_workers <= 1:
+            results = [get(pair) for pair in pairs]
+        else:
+            with ThreadPoolExecutor(
+                    max_workers=min(max_workers, len(pairs))) as executor:
+                results = list(executor.map(get, pairs))
+        results = dict(zip(pairs, results))
+        return [results[pair] for pair in site_ts_pairs]
+
+    def iter_get(
+            self, site, ts_id, *, t_start=None, t_end=None, chunksize=100000):
+        """Iterate over values for a time series in a given interval
+
+        :param str site: Site ID
+        :param str ts_id: Time series ID
+        :param datetime t_start: (optional) Start time
+        :param datetime t_end: (optional) End time (exclusive)
+        :param int chunksize: (optional, default 100000)
+            Approximate number of values in each chunk
+
+        Yields Timeseries of consecutive time windows of [t_start, t_end).
+        Window duration is computed from stats so that each window holds
+        about chunksize values if values are evenly spread in time.
+        """
+        stats = self.stats(site, ts_id)
+        if not stats['count']:
+            return
+        first = partitions.to_naive_utc(stats['start'])
+        last = partitions.to_naive_utc(stats['end'])
+        start = first
+        if t_start is not None:
+            start = max(start, partitions.to_naive_utc(t_start))
+        end = last + pd.Timedelta(1)
+        if t_end is not None:
+            end = min(end, partitions.to_naive_utc(t_end))
+        window = max(
+            (last - first) * (chunksize / stats['count']),
+            pd.Timedelta(1, unit='s'))
+        while start < end:
+            stop = min(start + window, end)
+            ts_obj = self.get(site, ts_id, t_start=start, t_end=stop)
+            if not ts_obj.dataframe.empty:
+                yield ts_obj
+            start = stop
+
+    def iter_chunks(
+            self, site, ts_id, *, t_start=None, t_end=None, chunksize=100000):
+        """Iterate over values for a time series in a given interval, by chunk
+
+        :param str site: Site ID
+        :param str ts_id: Time series ID
+        :param datetime t_start: (optional) Start time
+        :param datetime t_end: (optional) End time (exclusive)
+        :param int chunksize: (optional, default 100000)
+            Approximate number of values in each chunk
+
+        Yields dataframes of values of [t_start, t_end). Unlike iter_get,
+        chunks are not sorted by time, so managers may read values in
+        storage order. This implementation uses iter_get.
+        """
+        for ts_obj in self.iter_get(
+                site, ts_id, t_start=t_start, t_end=t_end,
+                chunksize=chunksize):
+            yield ts_obj.dataframe
+
+    def resample(
+            self, site, ts_id, freq, operation, *, t_start=None, t_end=None):
+        """Get values for a time series in a given interval, resampled
+
+        :param str site: Site ID
+        :param str ts_id: Time series ID
+        :param str freq: Resampling frequency
+            (key in Timeseries.AGG_FREQUENCIES)
+        :param str operation: Aggregation operation
+            (in Timeseries.AGG_OPERATIONS)
+        :param datetime t_start: (optional) Start time
+        :param datetime t_end: (optional) End time (exclusive)
+
+        Returns the same Timeseries as Timeseries.resample on the values for
+        [t_start, t_end), with naive UTC timestamps. Values are read by
+        chunk (see iter_chunks and resample_chunks), so memory use doesn't
+        depend on the number of values.
+        """
+        return resample_chunks(
+            self.iter_chunks(site, ts_id, t_start=t_start, t_end=t_end),
+            freq, operation)
+
+    def last(self, site, ts_id):
+        """Get the value with the latest timestamp of a time series
+
+        :param str site: Site ID
+        :param str ts_id: Time series ID
+
+        Returns a Timeseries with this value only, or an empty Timeseries if
+        the time series is empty.
+
+        This implementation gets stats then reads values from the last
+        timestamp. Managers should override it to get the value from
+        metadata.
+        """
+        stats = self.stats(site, ts_id)
+        if not stats['count']:
+            return Timeseries()
+        return self.get(site, ts_id, t_start=stats['end'])
 
     @abstractmethod
-    def set(self, ts_id, data):
+    def set(self, site, ts_id, ts_obj, *, set_update_ts=True):
         """Set values for a time series
 
+        Values with same timestamps as new values are replaced.
+
+        :param str site: Site ID
         :param str ts_id: Time series ID
-        :param dataframe data: Data to write. Index should be a DatetimeIndex.
+        :param Timeseries ts_obj: Values to write
+        :param bool set_update_ts: (optional, default True)
+            Set update timestamp to current time. If False, update timestamps
+            in ts_obj are kept.
         """
 
+    def set_many(self, site_ts_objs, *, set_update_ts=True):
+        """Set values for several time series
+
+        A time series that can't be written doesn't prevent writing the
+        others.
+
+        :param list site_ts_objs: (site ID, time series ID, Timeseries)
+            tuples
+        :param bool set_update_ts: (optional, default True)
+            Set update timestamp to current time. If False, update timestamps
+            in Timeseries are kept.
+
+        Returns the list of exceptions raised while writing each time series
+        (None if it was written), in the same order as site_ts_objs.
+        Managers may override it to group writes.
+        """
+        exceptions = []
+        for site, ts_id, ts_obj in site_ts_objs:
+            try:
+                self.set(site, ts_id, ts_obj, set_update_ts=set_update_ts)
+            except Exception as exc:  # pylint: disable=broad-except
+                exceptions.append(exc)
+            else:
+                exceptions.append(None)
+        return exceptions
+
     @abstractmethod
-    def delete(self, ts_id, t_start, t_end):
+    def delete(self, site, ts_id, t_start, t_end):
         """Remove values for a time series in a given interval
 
+        :param str site: Site ID
         :param str ts_id: Time series ID
         :param datetime t_start: Start time
         :param datetime t_end: End time (exclusive)
         """
 
+    def stats(self, site, ts_id):
+        """Get stats about a time series
+
+        :param str site: Site ID
+        :param str ts_id: Time series ID
+
+        Returns a dict with the number of values (count), the first and last
+        timestamps (start, end) and the last update timestamp (update_ts).
+        Timestamps are omitted if the time series is empty.
+
+        This implementation reads all values. Managers should override it to
+        get stats from metadata.
+        """
+        return dataframe_stats(self.get(site, ts_id).dataframe)
+
     # TODO: implement delete_timeseries?
     # @abstractmethod
     def delete_timeseries(self, ts_id):
@@ -0,0 +1,220 @@
+"""Read cache for timeseries database managers
+
+Results of get and resample are kept in memory, keyed by timeseries, time
+range and resampling parameters, so that repeated queries (e.g. dashboards
+refreshing the same views) don't read and decompress storage files again.
+
+The cache is bounded by the memory size of cached values. Least recently
+used entries are evicted first.
+
+Writes and deletes invalidate the entries of the timeseries whose time range
+overlaps the modified time range. Resampled values only depend on values in
+the requested time range, so they are invalidated the same way.
+"""
+
+from collections import OrderedDict, defaultdict
+import threading
+
+import pandas as pd
+
+from bemserver.models.timeseries import Timeseries
+
+from .base import TimeseriesMgr
+from . import partitions
+
+
+def _overlaps(start, end, t_min, t_max):
+    """Return True if [start, end) and [t_min, t_max] overlap
+
+    start and end may be None (unbounded). All bounds are naive UTC.
+    """
+    return (
+        (start is None or t_max >= start) and
+        (end is None or t_min < end))
+
+
+def _naive_utc(timestamp):
+    return None if timestamp is None else partitions.to_naive_utc(timestamp)
+
+
+class CachedTimeseriesMgr(TimeseriesMgr):
+    """Timeseries manager caching reads of another timeseries manager
+
+    Only writes going through this manager invalidate cached values, so the
+    storage must not be written by another process or manager.
+
+    :param TimeseriesMgr mgr: Cached timeseries manager
+    :param int max_size: (optional, default 256 MiB)
+        Maximum memory size of cached values, in bytes.
+    """
+
+    COUNTERS = ('hits', 'misses', 'evictions', 'invalidations')
+
+    def __init__(self, mgr, *, max_size=256 * 1024 * 1024):
+        self.mgr = mgr
+        self.max_size = max_size
+        self.size = 0
+        # Protects entries, size, counters and generations
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+        # (site, ts_id) -> key -> (start, end, dataframe, size)
+        self._entries = defaultdict(dict)
+        # (site, ts_id, key) -> None, least recently used first
+        self._lru = OrderedDict()
+        # (site, ts_id) -> number of invalidations. A value read before an
+        # invalidation is not cached.
+        self._generations = defaultdict(int)
+
+    @property
+    def max_read_workers(self):
+        return self.mgr.max_read_workers
+
+    def cache_stats(self):
+        """Return cache hit, miss, eviction and invalidation counts and size
+
+        Counts are cumulated since manager creation or last reset.
+        """
+        with self._lock:
+            return dict(
+                self._counters, entries=len(self._lru), size=self.size,
+                max_size=self.max_size)
+
+    def reset_cache_stats(self):
+        """Reset cache counters"""
+        with self._lock:
+            self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def clear(self):
+        """Remove all cached values"""
+        with self._lock:
+            for series in self._generations:
+                self._generations[series] += 1
+            self._entries.clear()
+            self._lru.clear()
+            self.size = 0
+
+    def _cached(self, series, key, start, end, read):
+        """Return cached values, or read them and cache them"""
+        with self._lock:
+            entry = self._entries.get(series, {}).get(key)
+            if entry is not None:
+                self._counters['hits'] += 1
+                self._lru.move_to_end(series + (key, ))
+                dataframe = entry[2]
+            else:
+                self._counters['misses'] += 1
+                generation = self._generations[series]
+        if entry is None:
+            dataframe = read().dataframe
+            self._add(series, key, start, end, dataframe, generation)
+        # Callers may modify returned Timeseries in place
+        return Timeseries.from_dataframe(dataframe.copy())
+
+    def _add(self, series, key, start, end, dataframe, generation):
+        size = int(dataframe.memory_usage(index=True).sum())
+        if size > self.max_size:
+            return
+        dataframe = dataframe.copy()
+        with self._lock:
+            # Don't cache values read before an invalidation
+            if self._generations[series] != generation:
+                return
+            if key in self._entries.get(series, {}):
+                return
+            self._entries[series][key] = (start, end, dataframe, size)
+            self._lru[series + (key, )] = None
+            self.size += size
+            while self.size > self.max_size:
+                site, ts_id, old_key = self._lru.popitem(last=False)[0]
+                self._remove((site, ts_id), old_key)
+                self._counters['evictions'] += 1
+
+    def _remove(self, series, key):
+        """Remove entry, without removing it from LRU order"""
+        self.size -= self._entries[series].pop(key)[3]
+        if not self._entries[series]:
+            del self._entries[series]
+
+    def _invalidate(self, site, ts_id, t_min=None, t_max=None):
+        """Invalidate entries overlapping modified time range [t_min, t_max]
+
+        If t_min and t_max are None, all entries of the timeseries are
+        invalidated.
+        """
+        series = (site, ts_id)
+        with self._lock:
+            self._generations[series] += 1
+            for key, (start, end, _, _) in list(
+                    self._entries.get(series, {}).items()):
+                if t_min is None or _overlaps(start, end, t_min, t_max):
+                    self._remove(series, key)
+                    del self._lru[series + (key, )]
+                    self._counters['invalidations'] += 1
+
+    def get(self, site, ts_id, *, t_start=None, t_end=None):
+        start, end = _naive_utc(t_start), _naive_utc(t_end)
+        return self._cached(
+            (site, ts_id), ('get', start, end), start, end,
+            lambda: self.mgr.get(site, ts_id, t_start=t_start, t_end=t_end))
+
+    def iter_get(
+            self, site, ts_id, *, t_start=None, t_end=None, chunksize=100000):
+        # Streamed values are not cached
+        return self.mgr.iter_get(
+            site, ts_id, t_start=t_start, t_end=t_end, chunksize=chunksize)
+
+    def resample(
+            self, site, ts_id, freq, operation, *, t_start=None, t_end=None):
+        start, end = _naive_utc(t_start), _naive_utc(t_end)
+        return self._cached(
+            (site, ts_id), ('resample', start, end, freq, operation),
+            start, end,
+            lambda: self.mgr.resample(
+                site, ts_id, freq, operation, t_start=t_start, t_end=t_end))
+
+    def stats(self, site, ts_id):
+        return self.mgr.stats(site, ts_id)
+
+    def last(self, site, ts_id):
+        return self.mgr.last(site, ts_id)
+
+    def set(self, site, ts_id, ts_obj, *, set_update_ts=True):
+        try:
+            self.mgr.set(site, ts_id, ts_obj, set_update_ts=set_update_ts)
+        except Exception:
+            # Values may have been partially written
+            self._invalidate(site, ts_id)
+            raise
+        self._invalidate_written(site, ts_id, ts_obj)
+
+    def set_many(self, site_ts_objs, *, set_update_ts=True):
+        try:
+            exceptions = self.mgr.set_many(
+                site_ts_objs, set_update_ts=set_update_ts)
+        except Exception:
+            for site, ts_id, _ in site_ts_objs:
+                self._invalidate(site, ts_id)
+            raise
+        for (site, ts_id, ts_obj), exc in zip(site_ts_objs, exceptions):
+            if exc is not None:
+                self._invalidate(site, ts_id)
+            else:
+                self._invalidate_written(site, ts_id, ts_obj)
+        return exceptions
+
+    def _invalidate_written(self, site, ts_id, ts_obj):
+        # Update timestamps are only set on written values: modified values
+        # are in the written time range
+        index = ts_obj.dataframe.index
+        if len(index):
+            index = partitions.to_naive_utc(index)
+            self._invalidate(site, ts_id, index.min(), index.max())
+
+    def delete(self, site, ts_id, t_start, t_end):
+        try:
+            self.mgr.delete(site, ts_id, t_start, t_end)
+        finally:
+            # t_end is excluded
+            self._invalidate(
+                site, ts_id, _naive_utc(t_start),
+                _naive_utc(t_end) - pd.Timedelta(1))
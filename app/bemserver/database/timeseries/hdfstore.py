@@ -1,43 +1,134 @@
 """Pandas/PyTables HDFStore timeseries database manager"""
 
-from contextlib import contextmanager
-import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
 import datetime as dt
+import logging
 from pathlib import Path
+import threading
 import warnings
 
 import pandas as pd
+import tables
 from tables import NaturalNameWarning
 
 from bemserver.models.timeseries import Timeseries
 
-from .base import TimeseriesMgr
+from .base import (
+    TimeseriesMgr, dataframe_stats, fsync, merge_stats, select_range, upsert)
+from .locks import FileLocks, TimedLock
+from . import partitions
+from . import repack
+from . import rollups
 
 
+logger = logging.getLogger('bemserver')
+
 # XXX: useless?
 pd.set_option('io.hdf.default_format', 'table')
 
 
-# TODO: If we split the data in several files, we'll need several locks
-# HDF_LOCKS = defaultdict(threading.Lock)
-HDF_LOCK = threading.Lock()
+# One readers-writer lock per file
+HDF_LOCKS = FileLocks(extra_stats_modes=('pytables', ))
+# PyTables is not thread-safe, nor is HDF5 unless built with the (non
+# default) thread-safe option: PyTables access within the process is
+# serialized, even for different files. The lock is only held around each
+# PyTables call (or short sequence of calls on a store), so that other work,
+# such as flushing written files to disk, is done concurrently.
+PYTABLES_LOCK = TimedLock(HDF_LOCKS.stats, 'pytables')
+# Default compression library and level
 COMPLEVEL = 9
 COMPLIB = 'zlib'
+# Compression libraries supported by PyTables. Blosc compressors are given
+# as 'blosc:<compressor>'.
+COMPLIBS = (
+    'zlib', 'lzo', 'bzip2', 'blosc', 'blosc:blosclz', 'blosc:lz4',
+    'blosc:lz4hc', 'blosc:snappy', 'blosc:zlib', 'blosc:zstd')
+# Timeseries table attribute storing timeseries stats
+STATS_ATTR = 'bemserver_stats'
+# Timeseries table attribute storing the value with the latest timestamp
+LAST_ATTR = 'bemserver_last'
+
+
+def _last_row(dataframe):
+    """Return the row with the latest timestamp of a timeseries dataframe
+
+    Return a dict with index and columns values.
+    """
+    position = dataframe.index.argmax()
+    row = {'index': dataframe.index[position]}
+    for column in (
+            Timeseries.DATA_COL, Timeseries.QUALITY_COL,
+            Timeseries.UPDATE_TIMESTAMP_COL):
+        row[column] = dataframe[column].iloc[position]
+    return row
+
+
+def check_compression(complib, complevel):
+    """Check compression library and level are valid and available
+
+    Raise ValueError otherwise.
+    """
+    if complib not in COMPLIBS:
+        raise ValueError('Invalid compression library: {}'.format(complib))
+    if complevel not in range(10):
+        raise ValueError('Invalid compression level: {}'.format(complevel))
+    lib, _, compressor = complib.partition(':')
+    if (tables.which_lib_version(lib) is None or (
+            compressor and
+            compressor not in tables.blosc_compressor_list())):
+        raise ValueError(
+            'Compression library not available: {}'.format(complib))
 
 
 @contextmanager
-def locked_store(file_path):
+def locked_store(
+        file_path, *, write=False, process_lock=False,
+        complib=COMPLIB, complevel=COMPLEVEL):
+    """Open HDFStore holding file lock
+
+    Readers share the lock, writers hold it exclusively.
+
+    If process_lock is True, the file is also protected from concurrent
+    access by other processes using OS advisory locks.
+
+    complib and complevel are used to compress tables created in write mode.
+    Existing tables keep the compression they were created with.
+
+    PyTables access within the process is serialized: the caller must hold
+    PYTABLES_LOCK around each use of the store. The store is opened and
+    closed holding it. Written files are then flushed to disk without it.
+
+    In read mode, yield None if the file does not exist.
+    """
+    # Reading a missing file must not create its lock file
+    if not write and not Path(file_path).is_file():
+        yield None
+        return
     # http://pandas-docs.github.io/pandas-docs-travis/io.html#caveats
     # If you use locks to manage write access between multiple processes,
     # you may want to use fsync() before releasing write locks.
-    # For convenience you can use store.flush(fsync=True) to do this for you.
-    with HDF_LOCK:
-        # Always open in 'a' mode to ensure 'read' works even if file missing
-        with pd.HDFStore(
-                file_path, mode='a', complevel=COMPLEVEL, complib=COMPLIB
-                ) as store:
+    with HDF_LOCKS.locked(file_path, write=write, process=process_lock):
+        if not write:
+            # File may have been removed meanwhile
+            if not Path(file_path).is_file():
+                yield None
+                return
+            with PYTABLES_LOCK:
+                store = pd.HDFStore(file_path, mode='r')
+        else:
+            with PYTABLES_LOCK:
+                store = pd.HDFStore(
+                    file_path, mode='a', complevel=complevel,
+                    complib=complib)
+        try:
             yield store
-            store.flush(fsync=True)
+        finally:
+            with PYTABLES_LOCK:
+                store.close()
+        if write:
+            fsync(file_path)
 
 
 class HDFStoreTimeseriesMgr(TimeseriesMgr):
@@ -45,28 +136,242 @@ class HDFStoreTimeseriesMgr(TimeseriesMgr):
 
     Uses HDFStore from Pandas/PyTable
 
+    By default, each timeseries is stored in a single file. If partition is
+    specified, each timeseries is stored as one file per time period in a
+    directory: <site>/<ts_id>/<period>.hdf5. Reads only open the files
+    overlapping the requested time range and writes only touch the periods
+    they affect. Files of past periods are only modified when older data is
+    written or deleted, so they don't need to be repacked regularly.
+
+    Stats (count, first/last timestamps, last update) and the value with the
+    latest timestamp are stored in each file as table attributes. Writes
+    update them. Deletes invalidate them and they are computed again from
+    the data on next stats or last call.
+
+    If tail_window is specified, the values of each written timeseries since
+    tail_window before the last write are kept in memory. They are loaded
+    from files on first read after a write, and updated by next writes and
+    deletes. Reads starting in that time window are served from memory.
+    Only the least recently used tail_max_series timeseries are kept.
+    Writes by other processes would not be seen, so this can't be used with
+    'process' lock mode.
+
+    PyTables access within the process is serialized (see PYTABLES_LOCK):
+    files are locked independently from each other, but PyTables calls on
+    different files wait for each other.
+
+    Tables are compressed with complib and complevel, or with the
+    compression specified for their site in site_compression. Compression
+    only applies to tables created afterwards (new timeseries, partitions
+    or repacked files): files written with another compression remain
+    readable.
+
+    Overwritten and deleted rows leave files fragmented (see repack module).
+    repack rewrites files whose size of removed rows reaches
+    repack_threshold, one at a time, holding their write lock. The copy runs
+    in a subprocess, without PYTABLES_LOCK: other files remain available
+    meanwhile. Files modified by this manager are tracked
+    in memory, other files are only found by a full scan. If repack_interval
+    is specified, a background thread scans all files on start, then
+    repacks tracked files every repack_interval seconds.
+
+    If rollups is True, hour, day and month rollups (see rollups module) are
+    maintained on each write and used to resample data. Rollups of existing
+    timeseries must be built with scripts/maintenance/build_rollups.py.
+    Until then, raw data is used. Writing with rollups disabled flags
+    rollups as incomplete.
+
     :param str dir_path: Path to storage directory
+    :param str lock_mode: (optional, default 'thread')
+        'thread' to only protect files from concurrent access within the
+        process, 'process' to also use OS file locks, which is needed when
+        several processes share the same storage directory.
+    :param str partition: (optional, default None)
+        Time partitioning of timeseries files: None, 'month' or 'year'.
+    :param bool rollups: (optional, default False)
+        Maintain resampling rollups.
+    :param float tail_window: (optional, default None)
+        Duration of the recent values kept in memory, in seconds.
+    :param int tail_max_series: (optional, default 1000)
+        Maximum number of timeseries whose recent values are kept in memory.
+    :param str complib: (optional, default 'zlib')
+        Compression library, in COMPLIBS.
+    :param int complevel: (optional, default 9)
+        Compression level, from 0 (no compression) to 9.
+    :param dict site_compression: (optional, default None)
+        site -> (complib, complevel) mapping overriding compression for
+        some sites.
+    :param int repack_threshold: (optional, default 10 MiB)
+        Size of removed rows triggering a file repack, in bytes.
+    :param float repack_interval: (optional, default None)
+        Background repack interval, in seconds. If None, no background
+        thread is started.
     """
 
-    def __init__(self, dir_path):
+    LOCK_MODES = ('thread', 'process')
+    PARTITIONS = tuple(partitions.PARTITION_FREQS.keys())
+    # Reads wait for each other on PYTABLES_LOCK: read sequentially
+    max_read_workers = 1
+
+    def __init__(
+            self, dir_path, *, lock_mode='thread', partition=None,
+            rollups=False, tail_window=None, tail_max_series=1000,
+            complib=COMPLIB, complevel=COMPLEVEL, site_compression=None,
+            repack_threshold=10 * 1024 * 1024, repack_interval=None):
+        if lock_mode not in self.LOCK_MODES:
+            raise ValueError('Invalid lock mode: {}'.format(lock_mode))
+        if partition is not None and partition not in self.PARTITIONS:
+            raise ValueError('Invalid partition: {}'.format(partition))
+        if tail_window is not None and lock_mode == 'process':
+            raise ValueError(
+                "Recent values can't be kept in memory with 'process' lock "
+                "mode")
+        site_compression = {
+            site.lstrip('/'): tuple(compression)
+            for site, compression in (site_compression or {}).items()}
+        for compression in [(complib, complevel), *site_compression.values()]:
+            check_compression(*compression)
         self.storage_dir = Path(dir_path)
+        self.lock_mode = lock_mode
+        self.partition = partition
+        self.rollups = rollups
+        self.compression = (complib, complevel)
+        self.site_compression = site_compression
+        self.tail_window = (
+            None if tail_window is None
+            else pd.Timedelta(seconds=tail_window))
+        self.tail_max_series = tail_max_series
+        # (site, ts_id) -> (start, dataframe of values since start), or None
+        # if not loaded yet. Dataframes are replaced, never modified in place.
+        self._tails = OrderedDict()
+        # Protects _tails and _tail_locks
+        self._tails_lock = threading.Lock()
+        # (site, ts_id) -> [lock held while writing timeseries and its tail,
+        # number of threads using it]. Unused locks are removed.
+        self._tail_locks = {}
+        self.repack_threshold = repack_threshold
+        self.repack_interval = repack_interval
+        # file path -> size of rows removed since last repack
+        self._removed = {}
+        # Protects _removed
+        self._removed_lock = threading.Lock()
+        self._repack_stop = threading.Event()
+        self._repack_thread = None
+        if repack_interval is not None:
+            self.start_repacker()
+
+    @contextmanager
+    def _locked_store(self, file_path, *, write=False):
+        complib, complevel = self.file_compression(file_path)
+        with locked_store(
+                file_path, write=write,
+                process_lock=self.lock_mode == 'process',
+                complib=complib, complevel=complevel) as store:
+            yield store
+            if write:
+                with PYTABLES_LOCK:
+                    size = repack.removed_bytes(store)
+                self._track_removed(file_path, size)
+
+    def file_compression(self, file_path):
+        """Return (complib, complevel) used to write file"""
+        site = Path(file_path).relative_to(self.storage_dir).parts[0]
+        return self.site_compression.get(site, self.compression)
 
     def file_path(self, site, ts_id):
+        """Return timeseries file path
+
+        The site directory is only created when writing (see _split).
+        """
         # Clean site and ts_id to avoid trying to write in '/'
         site = site.lstrip('/')
         ts_id = ts_id.lstrip('/')
         site_dir = self.storage_dir / site
-        site_dir.mkdir(exist_ok=True)
         # str() is needed for Python < 3.6
         # https://stackoverflow.com/a/42961904
         return str(site_dir / ('{}.hdf5'.format(ts_id)))
 
+    def series_dir(self, site, ts_id):
+        """Return partitioned timeseries directory"""
+        return self.storage_dir / site.lstrip('/') / ts_id.lstrip('/')
+
+    def partition_file_path(self, site, ts_id, period):
+        """Return partition file path"""
+        return str(self.series_dir(site, ts_id) / '{}.hdf5'.format(
+            partitions.period_name(period)))
+
+    def _partitions(self, site, ts_id, t_start=None, t_end=None):
+        """Return (period, file path) of partitions overlapping time range"""
+        return partitions.list_partitions(
+            self.series_dir(site, ts_id), self.partition, '.hdf5',
+            t_start, t_end)
+
+    def _file_paths(self, site, ts_id, t_start=None, t_end=None):
+        """Return paths of files storing time range"""
+        if self.partition is None:
+            return [self.file_path(site, ts_id)]
+        return [
+            file_path for _, file_path
+            in self._partitions(site, ts_id, t_start, t_end)]
+
+    @staticmethod
+    def lock_wait_stats():
+        """Return lock acquisition count and wait time, by lock mode
+
+        'read' and 'write' are file locks acquisitions, 'pytables' are
+        PYTABLES_LOCK acquisitions. Wait times are cumulated since process
+        start, in seconds.
+        """
+        return HDF_LOCKS.stats.as_dict()
+
     def get(self, site, ts_id, *, t_start=None, t_end=None):
-        with locked_store(self.file_path(site, ts_id)) as store:
-            # TODO: use a try/catch?
-            # https://github.com/pandas-dev/pandas/issues/17912
-            if ts_id not in store:
-                return Timeseries()
+        if self.tail_window is not None and t_start is not None:
+            dataframe = self._get_tail(site, ts_id, t_start, t_end)
+            if dataframe is not None:
+                dataframe['quality'].fillna(1, inplace=True)
+                return Timeseries.from_dataframe(dataframe)
+        return self._get(site, ts_id, t_start=t_start, t_end=t_end)
+
+    def _get(self, site, ts_id, *, t_start=None, t_end=None):
+        """Read time range from files"""
+        dataframes = []
+        for file_path in self._file_paths(site, ts_id, t_start, t_end):
+            dataframe = self._read(file_path, ts_id, t_start, t_end)
+            if dataframe is not None:
+                dataframes.append(dataframe)
+        if not dataframes:
+            return Timeseries()
+        sel_df = (
+            dataframes[0] if len(dataframes) == 1
+            else self._concat(dataframes))
+        sel_df.sort_index(inplace=True)
+        # XXX: Convert all NaN to 1 in quality column.
+        # This shouldn't be needed on a new database. It is needed for
+        # quality recorded before the default was set.
+        sel_df['quality'].fillna(1, inplace=True)
+        return Timeseries.from_dataframe(sel_df)
+
+    @staticmethod
+    def _concat(dataframes):
+        """Concatenate dataframes read from several files
+
+        If naive and aware indexes are mixed, naive indexes are considered
+        UTC, like when they are mixed in a single file.
+        """
+        if any(df.index.tz is not None for df in dataframes):
+            dataframes = [
+                df.tz_localize('UTC') if df.index.tz is None else df
+                for df in dataframes]
+        return pd.concat(dataframes)
+
+    def _read(self, file_path, ts_id, t_start, t_end):
+        """Read time range from file
+
+        Return None if timeseries is not in file.
+        """
+        with self._locked_store(file_path) as store:
+            if store is None:
+                return None
             # Turn t_start and t_end into a condition string
             kwargs = {}
             bounds = []
@@ -76,37 +381,638 @@ class HDFStoreTimeseriesMgr(TimeseriesMgr):
                 bounds.append('index<t_end')
             if bounds:
                 kwargs['where'] = ' and '.join(bounds)
-            sel_df = store.select(ts_id, **kwargs)
-            sel_df.sort_index(inplace=True)
-            # XXX: Convert all NaN to 1 in quality column.
-            # This shouldn't be needed on a new database. It is needed for
-            # quality recorded before the default was set.
-            sel_df['quality'].fillna(1, inplace=True)
-            return Timeseries.from_dataframe(sel_df)
-
-    def set(self, site, ts_id, ts_obj):
-        with locked_store(self.file_path(site, ts_id)) as store:
-            # Silently ignore empty dataframeframes
-            if ts_obj.dataframe.empty:
-                return
-            # Set update timestamp
+            with PYTABLES_LOCK:
+                # TODO: use a try/catch?
+                # https://github.com/pandas-dev/pandas/issues/17912
+                if ts_id not in store:
+                    return None
+                return store.select(ts_id, **kwargs)
+
+    def iter_chunks(
+            self, site, ts_id, *, t_start=None, t_end=None, chunksize=100000):
+        """Iterate over values for a time series in a given interval, by chunk
+
+        Each file is read with a PyTables iterator, holding its read lock
+        until all its chunks are consumed. PYTABLES_LOCK is only held while
+        reading each chunk, not while the caller processes it. Chunks are in
+        storage order.
+
+        See TimeseriesMgr.iter_chunks.
+        """
+        for file_path in self._file_paths(site, ts_id, t_start, t_end):
+            with self._locked_store(file_path) as store:
+                if store is None:
+                    continue
+                with PYTABLES_LOCK:
+                    if ts_id not in store:
+                        continue
+                    bounds = []
+                    if t_start is not None:
+                        bounds.append('index>=t_start')
+                    if t_end is not None:
+                        bounds.append('index<t_end')
+                    chunks = iter(store.select(
+                        ts_id, where=' and '.join(bounds) or None,
+                        iterator=True, chunksize=chunksize))
+                while True:
+                    with PYTABLES_LOCK:
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    yield chunk
+
+    def stats(self, site, ts_id):
+        return merge_stats([
+            self._file_stats(file_path, ts_id)
+            for file_path in self._file_paths(site, ts_id)])
+
+    def _file_stats(self, file_path, ts_id):
+        """Return stats of timeseries in file
+
+        If stats are not recorded in file, compute and record them.
+        """
+        with self._locked_store(file_path) as store:
+            if store is None:
+                return {'count': 0}
+            with PYTABLES_LOCK:
+                if ts_id not in store:
+                    return {'count': 0}
+                stats = self._get_attr(store, ts_id, STATS_ATTR)
+        if stats is not None:
+            return stats
+        # Stats invalidated by a delete or file written by a former version
+        with self._locked_store(file_path, write=True) as store:
+            with PYTABLES_LOCK:
+                if ts_id not in store:
+                    return {'count': 0}
+                stats = self._get_attr(store, ts_id, STATS_ATTR)
+                if stats is not None:
+                    return stats
+                dataframe = store.select(ts_id)
+            stats = dataframe_stats(dataframe)
+            with PYTABLES_LOCK:
+                self._set_attr(store, ts_id, STATS_ATTR, stats)
+        return stats
+
+    def last(self, site, ts_id):
+        if self.tail_window is not None:
+            with self._tails_lock:
+                tail = self._tails.get((site, ts_id))
+            # Tail holds all values since its start
+            if tail is not None and not tail[1].empty:
+                return self._last_timeseries(_last_row(tail[1]))
+        # Partitions are sorted by period: latest value is in the last
+        # partition holding values
+        for file_path in reversed(self._file_paths(site, ts_id)):
+            row = self._file_last(file_path, ts_id)
+            if row is not None:
+                return self._last_timeseries(row)
+        return Timeseries()
+
+    @staticmethod
+    def _last_timeseries(row):
+        quality = row[Timeseries.QUALITY_COL]
+        return Timeseries(
+            index=pd.DatetimeIndex(
+                [row['index']], name=Timeseries.TIMESTAMPS_COL),
+            data=[row[Timeseries.DATA_COL]],
+            # XXX: See get
+            quality=[1 if pd.isnull(quality) else quality],
+            update_ts=[row[Timeseries.UPDATE_TIMESTAMP_COL]])
+
+    def _file_last(self, file_path, ts_id):
+        """Return the row with the latest timestamp of timeseries in file
+
+        Return None if the file holds no value. If the row is not recorded
+        in file, find it and record it.
+        """
+        with self._locked_store(file_path) as store:
+            if store is None:
+                return None
+            with PYTABLES_LOCK:
+                if ts_id not in store:
+                    return None
+                row = self._get_attr(store, ts_id, LAST_ATTR)
+        if row is not None:
+            return row
+        # Invalidated by a delete or file written by a former version
+        with self._locked_store(file_path, write=True) as store:
+            with PYTABLES_LOCK:
+                if ts_id not in store:
+                    return None
+                row = self._get_attr(store, ts_id, LAST_ATTR)
+                if row is not None:
+                    return row
+                index = store.select_column(ts_id, 'index')
+            if not len(index):
+                return None
+            # Values are not sorted in file
+            position = int(index.values.argmax())
+            with PYTABLES_LOCK:
+                row = _last_row(store.select(
+                    ts_id, start=position, stop=position + 1))
+                self._set_attr(store, ts_id, LAST_ATTR, row)
+        return row
+
+    @staticmethod
+    def _get_attr(store, ts_id, attr):
+        return getattr(store.get_storer(ts_id).attrs, attr, None)
+
+    @staticmethod
+    def _set_attr(store, ts_id, attr, value):
+        setattr(store.get_storer(ts_id).attrs, attr, value)
+
+    @staticmethod
+    def _del_attr(store, ts_id, attr):
+        attrs = store.get_storer(ts_id).attrs
+        if attr in attrs:
+            delattr(attrs, attr)
+
+    def resample(
+            self, site, ts_id, freq, operation, *, t_start=None, t_end=None):
+        level = (
+            rollups.resample_level(freq, t_start, t_end) if self.rollups
+            else None)
+        if level is not None:
+            partials = self._read_rollups(site, ts_id, level, t_start, t_end)
+            if partials is not None:
+                return rollups.resample(partials, freq, operation)
+        return super().resample(
+            site, ts_id, freq, operation, t_start=t_start, t_end=t_end)
+
+    def _read_rollups(self, site, ts_id, level, t_start=None, t_end=None):
+        """Read rollups of a level in a time range
+
+        Return None if rollups are not complete.
+        """
+        if t_start is not None:
+            t_start = partitions.to_naive_utc(t_start)
+        if t_end is not None:
+            t_end = partitions.to_naive_utc(t_end)
+        dataframes = []
+        for file_path in self._file_paths(site, ts_id, t_start, t_end):
+            with self._locked_store(file_path) as store:
+                if store is None:
+                    continue
+                with PYTABLES_LOCK:
+                    if ts_id not in store:
+                        continue
+                    if not rollups.is_complete(store, ts_id):
+                        return None
+                    dataframe = rollups.select(
+                        store, rollups.rollup_key(ts_id, level),
+                        t_start, t_end)
+            if dataframe is not None:
+                dataframes.append(dataframe)
+        if not dataframes:
+            return pd.DataFrame(columns=list(rollups.PARTIALS.keys()))
+        return pd.concat(dataframes).sort_index()
+
+    def build_rollups(self, site, ts_id):
+        """Compute rollups of a timeseries from all its raw data"""
+        for file_path in self._file_paths(site, ts_id):
+            with self._locked_store(file_path, write=True) as store:
+                with PYTABLES_LOCK:
+                    if ts_id in store:
+                        rollups.rebuild(store, ts_id)
+
+    def set(self, site, ts_id, ts_obj, *, set_update_ts=True):
+        # Silently ignore empty dataframeframes
+        if ts_obj.dataframe.empty:
+            return
+        # Set update timestamp
+        if set_update_ts:
             ts_obj.set_update_timestamp(dt.datetime.utcnow())
-            # Remove row if index in new data, then add all new data
-            # https://stackoverflow.com/a/45642486
-            # TODO: data_columns=True?
-            # http://pandas.pydata.org/pandas-docs/stable/generated/
-            #   pandas.HDFStore.append.html
-            if ts_id in store:
-                store.remove(
-                    ts_id,
-                    where=store[ts_id].index.isin(ts_obj.dataframe.index))
+        with self._tails_locked([(site, ts_id)]):
+            for file_path, dataframe in self._split(
+                    site, ts_id, ts_obj.dataframe):
+                self._write(file_path, ts_id, dataframe)
+            self._update_tail(site, ts_id, ts_obj.dataframe)
+
+    def set_many(
+            self, site_ts_objs, *, set_update_ts=True, max_workers=4):
+        """Set values for several time series
+
+        Writes are grouped by file: each file is locked, written and flushed
+        to disk once. Files are written in parallel threads: PyTables calls
+        are serialized (see PYTABLES_LOCK), but dataframe processing between
+        calls and flushing files to disk overlap.
+
+        :param int max_workers: (optional, default 4)
+            Maximum number of parallel writes
+
+        See TimeseriesMgr.set_many.
+        """
+        update_ts = dt.datetime.utcnow()
+        exceptions = [None] * len(site_ts_objs)
+        # file path -> list of (position in site_ts_objs, ts_id, dataframe)
+        writes = OrderedDict()
+        for position, (site, ts_id, ts_obj) in enumerate(site_ts_objs):
+            try:
+                # Silently ignore empty dataframes
+                if ts_obj.dataframe.empty:
+                    continue
+                if set_update_ts:
+                    ts_obj.set_update_timestamp(update_ts)
+                file_dfs = list(self._split(site, ts_id, ts_obj.dataframe))
+            except Exception as exc:  # pylint: disable=broad-except
+                exceptions[position] = exc
+                continue
+            for file_path, dataframe in file_dfs:
+                writes.setdefault(file_path, []).append(
+                    (position, ts_id, dataframe))
+
+        def write(file_path):
+            try:
+                self._write_many(file_path, [
+                    (ts_id, dataframe)
+                    for _, ts_id, dataframe in writes[file_path]])
+            except Exception as exc:  # pylint: disable=broad-except
+                for position, _, _ in writes[file_path]:
+                    exceptions[position] = exc
+
+        with self._tails_locked(
+                (site, ts_id) for site, ts_id, _ in site_ts_objs):
+            if len(writes) <= 1 or max_workers <= 1:
+                for file_path in writes:
+                    write(file_path)
+            else:
+                with ThreadPoolExecutor(
+                        max_workers=min(max_workers, len(writes))
+                        ) as executor:
+                    list(executor.map(write, writes))
+            for (site, ts_id, ts_obj), exc in zip(site_ts_objs, exceptions):
+                if exc is not None:
+                    # Values may have been partially written
+                    self._drop_tail(site, ts_id)
+                elif not ts_obj.dataframe.empty:
+                    self._update_tail(site, ts_id, ts_obj.dataframe)
+        return exceptions
+
+    @contextmanager
+    def _tails_locked(self, series_list):
+        """Hold tail locks of timeseries while writing them
+
+        Locks are acquired in a consistent order to avoid deadlocks. Locks
+        are only kept while used, so that they don't pile up as timeseries
+        are written and their tails evicted.
+        """
+        if self.tail_window is None:
+            yield
+            return
+        series_list = sorted(set(series_list))
+        with self._tails_lock:
+            locks = []
+            for series in series_list:
+                entry = self._tail_locks.setdefault(
+                    series, [threading.Lock(), 0])
+                entry[1] += 1
+                locks.append(entry[0])
+        try:
+            with ExitStack() as stack:
+                for lock in locks:
+                    stack.enter_context(lock)
+                yield
+        finally:
+            with self._tails_lock:
+                for series in series_list:
+                    entry = self._tail_locks[series]
+                    entry[1] -= 1
+                    if not entry[1]:
+                        del self._tail_locks[series]
+
+    def _get_tail(self, site, ts_id, t_start, t_end):
+        """Read time range from recent values in memory
+
+        Return None if time range doesn't start in tail.
+        """
+        with self._tails_lock:
+            if (site, ts_id) not in self._tails:
+                return None
+            tail = self._tails[(site, ts_id)]
+            self._tails.move_to_end((site, ts_id))
+        if tail is None:
+            tail = self._load_tail(site, ts_id)
+        if tail is None or partitions.to_naive_utc(t_start) < tail[0]:
+            return None
+        return select_range(tail[1], t_start, t_end).copy()
+
+    def _load_tail(self, site, ts_id):
+        """Load recent values of a written timeseries from files
+
+        Return the tail, or None if it was dropped meanwhile.
+        """
+        with self._tails_locked([(site, ts_id)]):
+            with self._tails_lock:
+                if (site, ts_id) not in self._tails:
+                    return None
+                tail = self._tails[(site, ts_id)]
+            # May have been loaded by another read meanwhile
+            if tail is None:
+                start = pd.Timestamp(dt.datetime.utcnow()) - self.tail_window
+                tail = (start, self._get(site, ts_id, t_start=start).dataframe)
+                with self._tails_lock:
+                    if (site, ts_id) in self._tails:
+                        self._tails[(site, ts_id)] = tail
+        return tail
+
+    def _update_tail(self, site, ts_id, dataframe):
+        """Merge written values into recent values in memory
+
+        Must be called holding timeseries tail lock, after values are
+        written to files. The tail of a timeseries written for the first
+        time is only loaded from files on first read.
+        """
+        if self.tail_window is None:
+            return
+        with self._tails_lock:
+            tail = self._tails.get((site, ts_id))
+        if tail is not None:
+            start = pd.Timestamp(dt.datetime.utcnow()) - self.tail_window
+            tail_df = upsert(
+                select_range(tail[1], start), select_range(dataframe, start))
+            tail = (start, tail_df.sort_index())
+        with self._tails_lock:
+            self._tails[(site, ts_id)] = tail
+            self._tails.move_to_end((site, ts_id))
+            while len(self._tails) > self.tail_max_series:
+                self._tails.popitem(last=False)
+
+    def _drop_tail(self, site, ts_id):
+        with self._tails_lock:
+            self._tails.pop((site, ts_id), None)
+
+    def _split(self, site, ts_id, dataframe):
+        """Split dataframe by file
+
+        Yield (file path, dataframe) pairs.
+        """
+        if self.partition is None:
+            file_path = self.file_path(site, ts_id)
+            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+            yield file_path, dataframe
+            return
+        self.series_dir(site, ts_id).mkdir(parents=True, exist_ok=True)
+        for period, period_df in partitions.split(dataframe, self.partition):
+            yield self.partition_file_path(site, ts_id, period), period_df
+
+    def _write(self, file_path, ts_id, dataframe):
+        """Write dataframe to file, replacing values with same timestamps"""
+        self._write_many(file_path, [(ts_id, dataframe)])
+
+    def _write_many(self, file_path, writes):
+        """Write dataframes to file, replacing values with same timestamps
+
+        The file is locked and flushed once for all writes.
+
+        :param list writes: (ts_id, dataframe) pairs
+        """
+        with self._locked_store(file_path, write=True) as store:
+            for ts_id, dataframe in writes:
+                self._append(store, ts_id, dataframe)
+
+    def _append(self, store, ts_id, dataframe):
+        """Write dataframe to open store"""
+        # Remove row if index in new data, then add all new data
+        # https://stackoverflow.com/a/45642486
+        # TODO: data_columns=True?
+        # http://pandas.pydata.org/pandas-docs/stable/generated/
+        #   pandas.HDFStore.append.html
+        with PYTABLES_LOCK:
+            new_ts = ts_id not in store
+            if not new_ts:
+                self._remove_overlap(store, ts_id, dataframe.index)
+                stats = self._get_attr(store, ts_id, STATS_ATTR)
+                last = self._get_attr(store, ts_id, LAST_ATTR)
+            else:
+                stats = {'count': 0}
+                last = None
+        with PYTABLES_LOCK:
             # XXX: We may use TS ID that include dots or other wrong chars...
             with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", category=NaturalNameWarning)
-                store.append(ts_id, ts_obj.dataframe)
+                warnings.filterwarnings(
+                    "ignore", category=NaturalNameWarning)
+                store.append(ts_id, dataframe)
+            nrows = store.get_storer(ts_id).nrows
+        attrs = {}
+        # Update stats, unless invalidated
+        if stats is not None:
+            stats = merge_stats([stats, dataframe_stats(dataframe)])
+            # Replaced values are counted twice
+            stats['count'] = nrows
+            attrs[STATS_ATTR] = stats
+        # Update latest value, unless invalidated
+        if new_ts or last is not None:
+            new_last = _last_row(dataframe)
+            if last is None or (
+                    partitions.to_naive_utc(new_last['index']) >=
+                    partitions.to_naive_utc(last['index'])):
+                attrs[LAST_ATTR] = new_last
+        with PYTABLES_LOCK:
+            for attr, value in attrs.items():
+                self._set_attr(store, ts_id, attr, value)
+        self._update_rollups(
+            store, ts_id, dataframe.index.min(), dataframe.index.max(),
+            new_ts=new_ts)
+
+    def _update_rollups(self, store, ts_id, t_min, t_max, *, new_ts=False):
+        """Update rollups after raw data in [t_min, t_max] was modified"""
+        with PYTABLES_LOCK:
+            if not self.rollups:
+                # Rollups are not maintained anymore
+                rollups.set_complete(store, ts_id, False)
+            elif new_ts or rollups.is_complete(store, ts_id):
+                rollups.update(store, ts_id, t_min, t_max)
+                rollups.set_complete(store, ts_id)
+
+    @staticmethod
+    def _remove_overlap(store, ts_id, index):
+        """Remove stored rows whose timestamp is in index
+
+        Only rows in index time range are read, using an indexed query on
+        timestamps. In the append-only case, nothing is read nor removed.
+
+        Must be called holding PYTABLES_LOCK.
+
+        Return the number of removed rows.
+        """
+        t_min, t_max = index.min(), index.max()
+        coords = store.select_as_coordinates(
+            ts_id, where='index>=t_min and index<=t_max')
+        if not len(coords):
+            return 0
+        in_range = store.select(
+            ts_id, where=coords, columns=[Timeseries.DATA_COL])
+        overlap = coords[in_range.index.isin(index)]
+        # Beware: an empty selection would remove all rows
+        if not len(overlap):
+            return 0
+        store.remove(ts_id, where=overlap)
+        repack.record_removed(store, ts_id, len(overlap))
+        return len(overlap)
 
     def delete(self, site, ts_id, t_start, t_end):
-        with locked_store(self.file_path(site, ts_id)) as store:
-            if ts_id in store:
+        with self._tails_locked([(site, ts_id)]):
+            try:
+                self._delete_files(site, ts_id, t_start, t_end)
+            except Exception:
+                # Values may have been partially removed
+                self._drop_tail(site, ts_id)
+                raise
+            with self._tails_lock:
+                tail = self._tails.get((site, ts_id))
+                if tail is not None:
+                    start, tail_df = tail
+                    self._tails[(site, ts_id)] = (start, tail_df.drop(
+                        select_range(tail_df, t_start, t_end).index))
+
+    def _delete_files(self, site, ts_id, t_start, t_end):
+        """Remove time range from files"""
+        if self.partition is None:
+            file_path = self.file_path(site, ts_id)
+            # Don't create missing file (nor its directory)
+            if Path(file_path).is_file():
+                self._delete(file_path, ts_id, t_start, t_end)
+            return
+        for period, file_path in self._partitions(
+                site, ts_id, t_start, t_end):
+            # Drop partitions entirely in time range rather than removing
+            # all their rows
+            if partitions.is_covered(period, t_start, t_end):
+                with HDF_LOCKS.locked(
+                        file_path, write=True,
+                        process=self.lock_mode == 'process'):
+                    try:
+                        Path(file_path).unlink()
+                    except FileNotFoundError:
+                        pass
+                    self._track_removed(file_path, 0)
+            else:
+                self._delete(file_path, ts_id, t_start, t_end)
+
+    def _delete(self, file_path, ts_id, t_start, t_end):
+        """Remove time range from file"""
+        with self._locked_store(file_path, write=True) as store:
+            with PYTABLES_LOCK:
+                if ts_id not in store:
+                    return
                 where = 'index>=t_start and index<t_end'
-                store.remove(ts_id, where=where)
+                removed = store.remove(ts_id, where=where)
+                repack.record_removed(store, ts_id, removed)
+                if removed:
+                    # First/last timestamps and last update may have been
+                    # removed
+                    self._del_attr(store, ts_id, STATS_ATTR)
+                    self._del_attr(store, ts_id, LAST_ATTR)
+            if removed:
+                self._update_rollups(
+                    store, ts_id, t_start,
+                    partitions.to_naive_utc(t_end) - pd.Timedelta(1))
+
+    def _track_removed(self, file_path, size):
+        """Record size of rows removed from file since last repack"""
+        with self._removed_lock:
+            if size:
+                self._removed[file_path] = size
+            else:
+                self._removed.pop(file_path, None)
+
+    def removed_bytes(self):
+        """Return size of rows removed since last repack, by file
+
+        Only files modified by this manager or found by a scan are listed.
+        """
+        with self._removed_lock:
+            return dict(self._removed)
+
+    def repack(self, *, threshold=None, scan=False):
+        """Repack files whose size of removed rows reaches threshold
+
+        Files are repacked one at a time, using the current compression
+        settings. Reads and writes of a file wait for its repack to finish.
+
+        :param int threshold: (optional, default repack_threshold)
+            Size of removed rows triggering a repack, in bytes.
+        :param bool scan: (optional, default False)
+            Check all storage files, not only those modified by this
+            manager.
+
+        Return the list of repacked file paths.
+        """
+        if threshold is None:
+            threshold = self.repack_threshold
+        if scan:
+            for file_path in self.storage_dir.glob('**/*.hdf5'):
+                with self._locked_store(str(file_path)) as store:
+                    if store is None:
+                        continue
+                    with PYTABLES_LOCK:
+                        size = repack.removed_bytes(store)
+                self._track_removed(str(file_path), size)
+        with self._removed_lock:
+            file_paths = [
+                file_path for file_path, size in self._removed.items()
+                if size >= threshold]
+        return [
+            file_path for file_path in file_paths
+            if self.repack_file(file_path, threshold=threshold)]
+
+    def repack_file(self, file_path, *, threshold=0):
+        """Repack file if its size of removed rows reaches threshold
+
+        Return True if the file was repacked.
+        """
+        complib, complevel = self.file_compression(file_path)
+        with HDF_LOCKS.locked(
+                file_path, write=True, process=self.lock_mode == 'process'):
+            if not Path(file_path).is_file():
+                self._track_removed(file_path, 0)
+                return False
+            with PYTABLES_LOCK:
+                with pd.HDFStore(file_path, mode='r') as store:
+                    size = repack.removed_bytes(store)
+            # Size may have changed since file was selected (e.g. repacked
+            # by another process)
+            if not size or size < threshold:
+                self._track_removed(file_path, size)
+                return False
+            old_size = Path(file_path).stat().st_size
+            # The copy runs in a subprocess, PyTables calls on other files
+            # only wait for the file swap
+            repack.repack(
+                file_path, complib, complevel, replace_lock=PYTABLES_LOCK)
+            self._track_removed(file_path, 0)
+            new_size = Path(file_path).stat().st_size
+        logger.info(
+            'Repacked %s (%d removed bytes): %d -> %d bytes', file_path,
+            size, old_size, new_size)
+        return True
+
+    def start_repacker(self):
+        """Start background repack thread"""
+        self._repack_stop.clear()
+        self._repack_thread = threading.Thread(
+            target=self._run_repacker, name='timeseries-repacker',
+            daemon=True)
+        self._repack_thread.start()
+
+    def _run_repacker(self):
+        scan = True
+        while True:
+            try:
+                self.repack(scan=scan)
+                scan = False
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Error while repacking timeseries files')
+            if self._repack_stop.wait(self.repack_interval):
+                return
+
+    def stop_repacker(self):
+        """Stop background repack thread
+
+        Wait for the file being repacked, if any.
+        """
+        self._repack_stop.set()
+        if self._repack_thread is not None:
+            self._repack_thread.join()
+            self._repack_thread = None
@@ -0,0 +1,209 @@
+"""Locks for file based timeseries storage
+
+Files are locked independently from each other, with shared read /
+exclusive write semantics.
+
+Thread locks only protect files from concurrent access within a process.
+When several processes share the same storage, OS advisory locks (fcntl) are
+also acquired on a lock file next to the data file.
+"""
+
+from contextlib import contextmanager
+import fcntl
+import threading
+import time
+from weakref import WeakValueDictionary
+
+
+class RWLock():
+    """Readers-writer lock
+
+    Any number of readers can hold the lock at the same time. A writer holds
+    it exclusively. Waiting writers take precedence over new readers to
+    avoid writer starvation.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    def locked(self):
+        """Return True if the lock is held by a reader or a writer"""
+        with self._cond:
+            return self._writer or bool(self._readers)
+
+
+class LockWaitStats():
+    """Lock wait time counters
+
+    Counts lock acquisitions and accumulates the time spent waiting for the
+    lock, for read and write acquisitions separately, and for each
+    additional mode.
+
+    :param tuple extra_modes: (optional) Additional acquisition modes
+    """
+
+    MODES = ('read', 'write')
+
+    def __init__(self, extra_modes=()):
+        self.modes = self.MODES + tuple(extra_modes)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {
+                mode: {'count': 0, 'wait_time': 0.0, 'max_wait_time': 0.0}
+                for mode in self.modes
+            }
+
+    def record(self, mode, wait_time):
+        """Record a lock acquisition
+
+        :param str mode: 'read', 'write' or an additional mode
+        :param float wait_time: Time spent waiting for the lock, in seconds
+        """
+        with self._lock:
+            stats = self._stats[mode]
+            stats['count'] += 1
+            stats['wait_time'] += wait_time
+            stats['max_wait_time'] = max(stats['max_wait_time'], wait_time)
+
+    def as_dict(self):
+        """Return a copy of the counters"""
+        with self._lock:
+            return {mode: dict(stats) for mode, stats in self._stats.items()}
+
+
+class TimedLock():
+    """Reentrant lock recording its wait times
+
+    :param LockWaitStats stats: Counters to record acquisitions in
+    :param str mode: Mode acquisitions are recorded as
+    """
+
+    def __init__(self, stats, mode):
+        self._lock = threading.RLock()
+        self._stats = stats
+        self._mode = mode
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._stats.record(self._mode, time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *args):
+        self._lock.release()
+
+
+@contextmanager
+def os_file_lock(file_path, *, write=False):
+    """Hold OS advisory lock associated to a file
+
+    The lock is taken on a separate '.lock' file so that it survives the
+    data file being replaced and does not interfere with HDF5 own locking.
+
+    :param str file_path: Path of the file to lock
+    :param bool write: Exclusive lock if True, shared lock otherwise
+    """
+    with open('{}.lock'.format(file_path), 'a') as lock_file:
+        fcntl.flock(
+            lock_file.fileno(), fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class FileLocks():
+    """Registry of readers-writer locks keyed by file path
+
+    Locks are only referenced weakly by the registry: a lock is dropped as
+    soon as it is not used anymore, so that the registry does not grow with
+    every file ever accessed.
+
+    :param tuple extra_stats_modes: (optional) Additional modes counted in
+        stats, for other locks protecting the same files (see TimedLock)
+    """
+
+    def __init__(self, extra_stats_modes=()):
+        self._locks = WeakValueDictionary()
+        self._registry_lock = threading.Lock()
+        self.stats = LockWaitStats(extra_stats_modes)
+
+    def __len__(self):
+        """Return the number of locks in use"""
+        with self._registry_lock:
+            return len(self._locks)
+
+    def get(self, file_path):
+        """Return the lock associated to a file path
+
+        The same lock is returned as long as a reference to it is kept.
+        """
+        file_path = str(file_path)
+        with self._registry_lock:
+            lock = self._locks.get(file_path)
+            if lock is None:
+                lock = RWLock()
+                self._locks[file_path] = lock
+            return lock
+
+    @contextmanager
+    def locked(self, file_path, *, write=False, process=False):
+        """Hold file lock in shared (read) or exclusive (write) mode
+
+        :param str file_path: Path of the file to lock
+        :param bool write: Exclusive lock if True, shared lock otherwise
+        :param bool process: Also acquire OS advisory lock to protect file
+            from other processes
+        """
+        lock = self.get(file_path)
+        acquire, release = (
+            (lock.acquire_write, lock.release_write) if write
+            else (lock.acquire_read, lock.release_read))
+        start = time.perf_counter()
+        acquire()
+        try:
+            if process:
+                with os_file_lock(file_path, write=write):
+                    self.stats.record(
+                        'write' if write else 'read',
+                        time.perf_counter() - start)
+                    yield
+            else:
+                self.stats.record(
+                    'write' if write else 'read', time.perf_counter() - start)
+                yield
+        finally:
+            release()
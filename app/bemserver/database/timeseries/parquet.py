@@ -0,0 +1,319 @@
+"""Parquet timeseries database manager"""
+
+import datetime as dt
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from bemserver.models.timeseries import Timeseries
+
+from .base import TimeseriesMgr, dataframe_stats, fsync, merge_stats
+from .locks import FileLocks
+from . import partitions
+
+
+# One readers-writer lock per file
+PARQUET_LOCKS = FileLocks()
+
+COLUMNS = (
+    Timeseries.TIMESTAMPS_COL,
+    Timeseries.DATA_COL,
+    Timeseries.QUALITY_COL,
+    Timeseries.UPDATE_TIMESTAMP_COL,
+)
+
+
+def _stat_to_timestamp(value):
+    """Convert timestamp column statistic to Timestamp
+
+    Depending on pyarrow version, statistics are returned as datetime or as
+    raw integer. Timestamps are written with microsecond resolution.
+    """
+    if isinstance(value, int):
+        return pd.Timestamp(value, unit='us')
+    return pd.Timestamp(value)
+
+
+class ParquetTimeseriesMgr(TimeseriesMgr):
+    """Parquet timeseries manager
+
+    Uses Parquet columnar files through pyarrow.
+
+    Each timeseries is stored as one file per time period in a directory:
+    <site>/<ts_id>/<period>.parquet. Rows are sorted by timestamp and
+    written in row groups. Row groups min/max timestamp statistics are used
+    to only read the row groups overlapping the requested time range.
+
+    Parquet files can't be modified in place, so each write rewrites the
+    periods it affects.
+
+    Timestamps are stored as naive UTC datetimes, with microsecond
+    resolution. Aware datetimes are converted to UTC. Writing timestamps
+    with a sub-microsecond part raises ValueError rather than silently
+    truncating them.
+
+    Like in HDFStoreTimeseriesMgr, missing quality values are read as 1.
+
+    Stats are computed from file footers (row count and column statistics),
+    without reading data.
+
+    :param str dir_path: Path to storage directory
+    :param str lock_mode: (optional, default 'thread')
+        'thread' to only protect files from concurrent access within the
+        process, 'process' to also use OS file locks, which is needed when
+        several processes share the same storage directory.
+    :param str partition: (optional, default 'month')
+        Time partitioning of timeseries files: 'month' or 'year'.
+    :param str compression: (optional, default 'zstd')
+        Parquet compression codec.
+    :param int row_group_size: (optional, default 65536)
+        Maximum number of rows in a row group.
+    """
+
+    LOCK_MODES = ('thread', 'process')
+    PARTITIONS = tuple(partitions.PARTITION_FREQS.keys())
+    COMPRESSIONS = ('none', 'snappy', 'gzip', 'brotli', 'lz4', 'zstd')
+
+    def __init__(
+            self, dir_path, *, lock_mode='thread', partition='month',
+            compression='zstd', row_group_size=65536):
+        if lock_mode not in self.LOCK_MODES:
+            raise ValueError('Invalid lock mode: {}'.format(lock_mode))
+        if partition not in self.PARTITIONS:
+            raise ValueError('Invalid partition: {}'.format(partition))
+        if compression not in self.COMPRESSIONS:
+            raise ValueError('Invalid compression: {}'.format(compression))
+        self.storage_dir = Path(dir_path)
+        self.lock_mode = lock_mode
+        self.partition = partition
+        self.compression = compression
+        self.row_group_size = row_group_size
+
+    def _locked(self, file_path, *, write=False):
+        return PARQUET_LOCKS.locked(
+            file_path, write=write, process=self.lock_mode == 'process')
+
+    def series_dir(self, site, ts_id):
+        """Return timeseries directory"""
+        return self.storage_dir / site.lstrip('/') / ts_id.lstrip('/')
+
+    def partition_file_path(self, site, ts_id, period):
+        """Return partition file path"""
+        return str(self.series_dir(site, ts_id) / '{}.parquet'.format(
+            partitions.period_name(period)))
+
+    def _partitions(self, site, ts_id, t_start=None, t_end=None):
+        """Return (period, file path) of partitions overlapping time range"""
+        return partitions.list_partitions(
+            self.series_dir(site, ts_id), self.partition, '.parquet',
+            t_start, t_end)
+
+    @staticmethod
+    def lock_wait_stats():
+        """Return lock acquisition count and wait time, by lock mode
+
+        Wait times are cumulated since process start, in seconds.
+        """
+        return PARQUET_LOCKS.stats.as_dict()
+
+    def get(self, site, ts_id, *, t_start=None, t_end=None):
+        t_start = (
+            partitions.to_naive_utc(t_start) if t_start is not None else None)
+        t_end = partitions.to_naive_utc(t_end) if t_end is not None else None
+        tables = []
+        for _, file_path in self._partitions(site, ts_id, t_start, t_end):
+            with self._locked(file_path):
+                table = self._read(file_path, t_start, t_end)
+            if table is not None:
+                tables.append(table)
+        if not tables:
+            return Timeseries()
+        sel_df = self._to_dataframe(pa.concat_tables(tables))
+        # Exact bounds: row groups may straddle them
+        in_range = np.ones(len(sel_df), dtype=bool)
+        if t_start is not None:
+            in_range &= sel_df.index >= t_start
+        if t_end is not None:
+            in_range &= sel_df.index < t_end
+        sel_df = sel_df[in_range]
+        # Same as HDFStoreTimeseriesMgr: missing quality means good quality
+        sel_df[Timeseries.QUALITY_COL] = sel_df[
+            Timeseries.QUALITY_COL].fillna(1)
+        return Timeseries.from_dataframe(sel_df)
+
+    @staticmethod
+    def _read(file_path, t_start=None, t_end=None):
+        """Read row groups overlapping time range
+
+        Return None if file does not exist or no row group overlaps.
+        """
+        if not Path(file_path).is_file():
+            return None
+        parquet_file = pq.ParquetFile(file_path)
+        metadata = parquet_file.metadata
+        ts_col_idx = parquet_file.schema_arrow.get_field_index(
+            Timeseries.TIMESTAMPS_COL)
+        tables = []
+        for idx in range(metadata.num_row_groups):
+            stats = metadata.row_group(idx).column(ts_col_idx).statistics
+            if stats is not None and stats.has_min_max:
+                if (t_start is not None and
+                        _stat_to_timestamp(stats.max) < t_start):
+                    continue
+                if (t_end is not None and
+                        _stat_to_timestamp(stats.min) >= t_end):
+                    continue
+            tables.append(parquet_file.read_row_group(idx, columns=COLUMNS))
+        if not tables:
+            return None
+        return pa.concat_tables(tables)
+
+    @staticmethod
+    def _to_dataframe(table):
+        """Build timeseries dataframe from Arrow table"""
+        dataframe = table.to_pandas()
+        for col in (
+                Timeseries.TIMESTAMPS_COL, Timeseries.UPDATE_TIMESTAMP_COL):
+            dataframe[col] = dataframe[col].astype('datetime64[ns]')
+        return dataframe.set_index(Timeseries.TIMESTAMPS_COL)
+
+    @staticmethod
+    def _to_table(dataframe):
+        """Build Arrow table from timeseries dataframe"""
+        dataframe = dataframe.copy()
+        dataframe.index = partitions.to_naive_utc(dataframe.index)
+        update_ts = pd.to_datetime(
+            dataframe[Timeseries.UPDATE_TIMESTAMP_COL])
+        if update_ts.dt.tz is not None:
+            update_ts = update_ts.dt.tz_convert(None)
+        dataframe[Timeseries.UPDATE_TIMESTAMP_COL] = update_ts
+        dataframe.index.name = Timeseries.TIMESTAMPS_COL
+        dataframe = dataframe.reset_index()
+        return pa.Table.from_pandas(
+            dataframe[list(COLUMNS)], preserve_index=False)
+
+    @staticmethod
+    def _check_resolution(dataframe):
+        """Check timestamps can be stored without loss
+
+        Timestamps are stored with microsecond resolution.
+        """
+        update_ts = pd.to_datetime(dataframe[Timeseries.UPDATE_TIMESTAMP_COL])
+        for timestamps in (dataframe.index, pd.DatetimeIndex(update_ts)):
+            if (timestamps.dropna().nanosecond != 0).any():
+                raise ValueError(
+                    'Timestamps with sub-microsecond resolution '
+                    'are not supported')
+
+    def stats(self, site, ts_id):
+        stats_list = []
+        for _, file_path in self._partitions(site, ts_id):
+            with self._locked(file_path):
+                stats_list.append(self._file_stats(file_path))
+        return merge_stats(stats_list)
+
+    @classmethod
+    def _file_stats(cls, file_path):
+        """Return stats of timeseries in file, from file metadata"""
+        if not Path(file_path).is_file():
+            return {'count': 0}
+        parquet_file = pq.ParquetFile(file_path)
+        metadata = parquet_file.metadata
+        if not metadata.num_rows:
+            return {'count': 0}
+        schema = parquet_file.schema_arrow
+        ts_col_idx = schema.get_field_index(Timeseries.TIMESTAMPS_COL)
+        update_col_idx = schema.get_field_index(
+            Timeseries.UPDATE_TIMESTAMP_COL)
+        starts, ends, update_ts = [], [], []
+        for idx in range(metadata.num_row_groups):
+            row_group = metadata.row_group(idx)
+            stats = row_group.column(ts_col_idx).statistics
+            if stats is None or not stats.has_min_max:
+                # Should not happen as timestamps are never null
+                return dataframe_stats(
+                    cls._to_dataframe(parquet_file.read(columns=COLUMNS)))
+            starts.append(_stat_to_timestamp(stats.min))
+            ends.append(_stat_to_timestamp(stats.max))
+            # No min/max if all update timestamps are null
+            stats = row_group.column(update_col_idx).statistics
+            if stats is not None and stats.has_min_max:
+                update_ts.append(_stat_to_timestamp(stats.max))
+        return {
+            'count': metadata.num_rows,
+            'start': min(starts),
+            'end': max(ends),
+            'update_ts': max(update_ts, default=pd.NaT),
+        }
+
+    def set(self, site, ts_id, ts_obj, *, set_update_ts=True):
+        # Silently ignore empty dataframeframes
+        if ts_obj.dataframe.empty:
+            return
+        # Set update timestamp
+        if set_update_ts:
+            ts_obj.set_update_timestamp(dt.datetime.utcnow())
+        self._check_resolution(ts_obj.dataframe)
+        self.series_dir(site, ts_id).mkdir(parents=True, exist_ok=True)
+        for period, dataframe in partitions.split(
+                ts_obj.dataframe, self.partition):
+            file_path = self.partition_file_path(site, ts_id, period)
+            with self._locked(file_path, write=True):
+                table = self._read(file_path)
+                if table is not None:
+                    stored_df = self._to_dataframe(table)
+                    dataframe = dataframe.copy()
+                    dataframe.index = partitions.to_naive_utc(
+                        dataframe.index)
+                    # New values replace values with same timestamps
+                    dataframe = pd.concat([
+                        stored_df[~stored_df.index.isin(dataframe.index)],
+                        dataframe,
+                    ])
+                self._write(file_path, dataframe)
+
+    def _write(self, file_path, dataframe):
+        """Write dataframe to file, sorted by timestamp
+
+        Data is written to a temporary file which is flushed to disk and
+        then replaces the file. The directory is flushed to disk as well,
+        for the replacement to survive a crash.
+        """
+        table = self._to_table(dataframe.sort_index())
+        tmp_path = '{}.tmp'.format(file_path)
+        try:
+            pq.write_table(
+                table, tmp_path, compression=self.compression,
+                row_group_size=self.row_group_size, coerce_timestamps='us')
+            fsync(tmp_path)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if Path(tmp_path).exists():
+                Path(tmp_path).unlink()
+            raise
+        fsync(str(Path(file_path).parent))
+
+    def delete(self, site, ts_id, t_start, t_end):
+        t_start = partitions.to_naive_utc(t_start)
+        t_end = partitions.to_naive_utc(t_end)
+        for period, file_path in self._partitions(
+                site, ts_id, t_start, t_end):
+            with self._locked(file_path, write=True):
+                if partitions.is_covered(period, t_start, t_end):
+                    try:
+                        Path(file_path).unlink()
+                    except FileNotFoundError:
+                        pass
+                    continue
+                table = self._read(file_path)
+                if table is None:
+                    continue
+                stored_df = self._to_dataframe(table)
+                in_range = (
+                    (stored_df.index >= t_start) & (stored_df.index < t_end))
+                if in_range.any():
+                    self._write(file_path, stored_df[~in_range])
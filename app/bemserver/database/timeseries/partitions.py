@@ -0,0 +1,97 @@
+"""Time partitioning for file based timeseries storage
+
+A partitioned timeseries is stored as one file per time period (e.g. one file
+per month). Periods are computed on UTC timestamps.
+"""
+
+import pandas as pd
+
+
+# Partition name -> pandas period frequency
+PARTITION_FREQS = {
+    'month': 'M',
+    'year': 'A',
+}
+
+
+def to_naive_utc(timestamps):
+    """Convert timestamp(s) to naive UTC
+
+    :param datetime|DatetimeIndex timestamps: Naive (implicit UTC) or aware
+        timestamp(s)
+    """
+    if isinstance(timestamps, pd.DatetimeIndex):
+        return (
+            timestamps if timestamps.tz is None
+            else timestamps.tz_convert(None))
+    timestamp = pd.Timestamp(timestamps)
+    if timestamp.tz is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp
+
+
+def period_name(period):
+    """Return period name, to be used as file name"""
+    return str(period)
+
+
+def parse_period(name, partition):
+    """Return period from period name
+
+    Return None if name is not a valid period name.
+    """
+    try:
+        return pd.Period(name, freq=PARTITION_FREQS[partition])
+    except ValueError:
+        return None
+
+
+def list_partitions(series_dir, partition, suffix, t_start=None, t_end=None):
+    """List partition files of a timeseries overlapping a time range
+
+    :param Path series_dir: Timeseries directory
+    :param str partition: Partition name (key in PARTITION_FREQS)
+    :param str suffix: Partition files suffix (e.g. '.hdf5')
+    :param datetime t_start: (optional) Start time
+    :param datetime t_end: (optional) End time (exclusive)
+
+    Return a list of (period, file path) tuples sorted by period.
+    """
+    if not series_dir.is_dir():
+        return []
+    ret = []
+    for file_path in series_dir.glob('*{}'.format(suffix)):
+        period = parse_period(file_path.stem, partition)
+        if period is not None and overlaps(period, t_start, t_end):
+            ret.append((period, str(file_path)))
+    return sorted(ret)
+
+
+def split(dataframe, partition):
+    """Split dataframe by period
+
+    :param DataFrame dataframe: Dataframe with a DatetimeIndex
+    :param str partition: Partition name (key in PARTITION_FREQS)
+
+    Return a list of (period, sub-dataframe) tuples.
+    """
+    periods = to_naive_utc(dataframe.index).to_period(
+        PARTITION_FREQS[partition])
+    return [
+        (period, dataframe[periods == period]) for period in periods.unique()]
+
+
+def overlaps(period, t_start=None, t_end=None):
+    """Return True if period overlaps [t_start, t_end)"""
+    if t_start is not None and period.end_time < to_naive_utc(t_start):
+        return False
+    if t_end is not None and period.start_time >= to_naive_utc(t_end):
+        return False
+    return True
+
+
+def is_covered(period, t_start, t_end):
+    """Return True if period is entirely in [t_start, t_end)"""
+    return (
+        period.start_time >= to_naive_utc(t_start) and
+        period.end_time < to_naive_utc(t_end))
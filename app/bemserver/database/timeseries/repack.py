@@ -0,0 +1,76 @@
+"""Online repack of HDFStore timeseries storage files
+
+HDF5 files don't release the space of removed rows: overwritten and deleted
+values leave the file fragmented until it is rewritten. Each file records
+the (uncompressed) size of rows removed since it was created or last
+repacked in a root attribute. Files whose removed size reaches a threshold
+are repacked one at a time: copied to a temporary file by ptrepack, which
+then replaces the original file atomically, while holding the file write
+lock.
+"""
+
+from contextlib import ExitStack
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+
+# File root attribute storing size of rows removed since last repack
+REMOVED_BYTES_ATTR = 'bemserver_removed_bytes'
+
+
+def record_removed(store, key, nrows):
+    """Record removal of rows of a table in store
+
+    Must be called when rows are removed, with the number of removed rows.
+    """
+    if nrows:
+        add_removed_bytes(
+            store, nrows * store.get_storer(key).table.rowsize)
+
+
+def removed_bytes(store):
+    """Return size of rows removed from store since last repack"""
+    return int(getattr(store.root._v_attrs, REMOVED_BYTES_ATTR, 0))
+
+
+def add_removed_bytes(store, size):
+    """Add size to rows removed from store since last repack"""
+    setattr(
+        store.root._v_attrs, REMOVED_BYTES_ATTR, removed_bytes(store) + size)
+
+
+def repack(file_path, complib, complevel, *, replace_lock=None):
+    """Rewrite file compactly, using given compression
+
+    Must be called holding file write lock.
+
+    The file is copied to a temporary file in the same directory by ptrepack,
+    run in a subprocess: the copy makes no PyTables call in this process.
+    The temporary file is flushed to disk, then replaces the original file,
+    holding replace_lock, if any. Should the copy fail, the original file is
+    left unchanged.
+
+    Root attributes, such as the size of removed rows, are not copied.
+    """
+    file_path = Path(file_path)
+    tmp_path = file_path.with_name(file_path.name + '.repack')
+    try:
+        subprocess.run(
+            [
+                sys.executable, '-c',
+                'from tables.scripts.ptrepack import main; main()',
+                '--overwrite', '--propindexes',
+                '--complib', complib, '--complevel', str(complevel),
+                '{}:/'.format(file_path), '{}:/'.format(tmp_path),
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        with open(str(tmp_path), 'rb') as tmp_file:
+            os.fsync(tmp_file.fileno())
+        with replace_lock or ExitStack():
+            os.replace(str(tmp_path), str(file_path))
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
@@ -0,0 +1,250 @@
+"""Resampling rollups for HDFStore timeseries storage
+
+Rollups are partial aggregates of a timeseries per hour, day and month
+bucket: data sum, min, max and count, quality sum, row count and last update
+timestamp. They are stored next to the timeseries, in the same file, and
+updated on each write for the buckets it affects. Hour rollups are computed
+from raw data, day rollups from hour rollups and month rollups from day
+rollups.
+
+Any resampling whose buckets are unions of rollup buckets is computed from
+rollups instead of raw data. Mean is derived from sum and count.
+
+Buckets are computed on UTC timestamps.
+"""
+
+import warnings
+
+import pandas as pd
+from tables import NaturalNameWarning
+
+from bemserver.models.timeseries import Timeseries
+
+from . import partitions
+from . import repack
+
+
+# Rollup levels, from finest to coarsest, and their bucket frequency
+LEVELS = ('hour', 'day', 'month')
+LEVEL_FREQS = {
+    'hour': 'H',
+    'day': 'D',
+    'month': 'MS',
+}
+
+# Resampling frequency -> rollup levels nested in its buckets, coarsest first
+# ('week' is not served from rollups: weekly bins are closed right)
+RESAMPLE_LEVELS = {
+    'hour': ('hour', ),
+    '3hour': ('hour', ),
+    '6hour': ('hour', ),
+    '12hour': ('hour', ),
+    'day': ('day', 'hour'),
+    'month': ('month', 'day', 'hour'),
+    '3month': ('month', 'day', 'hour'),
+    '6month': ('month', 'day', 'hour'),
+    'year': ('month', 'day', 'hour'),
+}
+
+# Partial aggregates and how to merge them
+PARTIALS = {
+    'data_sum': 'sum',
+    'data_min': 'min',
+    'data_max': 'max',
+    'data_count': 'sum',
+    'quality_sum': 'sum',
+    'row_count': 'sum',
+    'update_ts': 'max',
+}
+
+# Timeseries table attribute flagging rollups as complete
+COMPLETE_ATTR = 'bemserver_rollups'
+
+_ONE_NS = pd.Timedelta(1, unit='ns')
+
+
+def rollup_key(ts_id, level):
+    """Return rollup table key"""
+    return '/_rollups/{}/{}'.format(level, ts_id.lstrip('/'))
+
+
+def is_rollup_key(key):
+    """Return True if store key is a rollup table key"""
+    return key.startswith('/_rollups/')
+
+
+def floor(timestamps, level):
+    """Return start of bucket(s) containing naive timestamp(s)"""
+    if level == 'month':
+        return timestamps.to_period('M').to_timestamp()
+    return timestamps.floor(LEVEL_FREQS[level])
+
+
+def ceil(timestamp, level):
+    """Return end of bucket containing naive timestamp, if not aligned"""
+    return (
+        floor(timestamp - _ONE_NS, level) +
+        pd.tseries.frequencies.to_offset(LEVEL_FREQS[level]))
+
+
+def is_aligned(timestamp, level):
+    """Return True if naive timestamp is the start of a bucket"""
+    return floor(timestamp, level) == timestamp
+
+
+def resample_level(freq, t_start=None, t_end=None):
+    """Return the rollup level to use to resample data
+
+    Return None if resampling can't be computed from rollups.
+
+    :param str freq: Resampling frequency (key in Timeseries.AGG_FREQUENCIES)
+    :param datetime t_start: (optional) Start time
+    :param datetime t_end: (optional) End time (exclusive)
+    """
+    bounds = [
+        partitions.to_naive_utc(bound) for bound in (t_start, t_end)
+        if bound is not None]
+    for level in RESAMPLE_LEVELS.get(freq, ()):
+        # Bounds must not split buckets
+        if all(is_aligned(bound, level) for bound in bounds):
+            return level
+    return None
+
+
+def to_partials(dataframe):
+    """Return partial aggregates of each row of raw timeseries dataframe"""
+    data = dataframe[Timeseries.DATA_COL]
+    update_ts = pd.to_datetime(dataframe[Timeseries.UPDATE_TIMESTAMP_COL])
+    if update_ts.dt.tz is not None:
+        update_ts = update_ts.dt.tz_convert(None)
+    return pd.DataFrame({
+        'data_sum': data,
+        'data_min': data,
+        'data_max': data,
+        'data_count': data.notnull().astype('int64'),
+        # Quality is read as 1 when unknown
+        'quality_sum': dataframe[Timeseries.QUALITY_COL].fillna(1),
+        'row_count': 1,
+        'update_ts': update_ts,
+    }, index=dataframe.index, columns=list(PARTIALS.keys()))
+
+
+def merge(partials, level):
+    """Merge partial aggregates by bucket
+
+    Only non-empty buckets are returned.
+    """
+    return partials.groupby(floor(partials.index, level)).agg(PARTIALS)
+
+
+def fold(partials, freq):
+    """Merge partial aggregates by resampling bucket
+
+    Only non-empty buckets are returned. Folding again partials returned by
+    fold, or a concatenation of them, gives the same buckets.
+
+    :param DataFrame partials: Partial aggregates, with naive UTC index
+    :param str freq: Resampling frequency (key in Timeseries.AGG_FREQUENCIES)
+    """
+    partials = partials.resample(
+        Timeseries.AGG_FREQUENCIES[freq]).agg(PARTIALS)
+    return partials[partials['row_count'] > 0]
+
+
+def resample(partials, freq, operation):
+    """Resample partial aggregates and return Timeseries
+
+    Same as Timeseries.resample on raw data.
+
+    :param DataFrame partials: Partial aggregates of buckets nested in
+        resampling buckets
+    :param str freq: Resampling frequency (key in Timeseries.AGG_FREQUENCIES)
+    :param str operation: Aggregation operation (in Timeseries.AGG_OPERATIONS)
+    """
+    if partials.empty:
+        return Timeseries()
+    partials = partials.resample(
+        Timeseries.AGG_FREQUENCIES[freq]).agg(PARTIALS)
+    # Buckets with no data are dropped
+    partials = partials[partials['data_count'] > 0]
+    if operation == 'mean':
+        data = partials['data_sum'] / partials['data_count']
+    else:
+        data = partials['data_{}'.format(operation)]
+    index = partials.index.rename(Timeseries.TIMESTAMPS_COL)
+    return Timeseries(
+        index=index, data=data.values,
+        quality=(partials['quality_sum'] / partials['row_count']).values,
+        update_ts=partials['update_ts'].values)
+
+
+def select(store, key, t_start=None, t_end=None):
+    """Select naive UTC time range from store, with naive UTC index
+
+    Return None if key is not in store.
+    """
+    if key not in store:
+        return None
+    bounds = []
+    if t_start is not None:
+        bounds.append('index>=t_start')
+    if t_end is not None:
+        bounds.append('index<t_end')
+    dataframe = store.select(key, where=' and '.join(bounds) or None)
+    dataframe.index = partitions.to_naive_utc(dataframe.index)
+    return dataframe
+
+
+def update(store, ts_id, t_min, t_max):
+    """Update rollups of buckets containing raw data time range
+
+    Must be called after raw data in [t_min, t_max] was modified.
+    """
+    t_start = floor(partitions.to_naive_utc(t_min), LEVELS[0])
+    t_end = ceil(partitions.to_naive_utc(t_max) + _ONE_NS, LEVELS[0])
+    # Raw data is read once, rollups of each level are computed from the
+    # rollups of the previous level
+    source = to_partials(select(store, ts_id, t_start, t_end))
+    previous = None
+    for level in LEVELS:
+        t_start, t_end = floor(t_start, level), ceil(t_end, level)
+        if previous is not None:
+            source = select(
+                store, rollup_key(ts_id, previous), t_start, t_end)
+        previous = level
+        buckets = merge(source, level) if source is not None else None
+        key = rollup_key(ts_id, level)
+        if key in store:
+            repack.record_removed(store, key, store.remove(
+                key, where='index>=t_start and index<t_end'))
+        if buckets is not None and not buckets.empty:
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", category=NaturalNameWarning)
+                store.append(key, buckets)
+
+
+def is_complete(store, ts_id):
+    """Return True if rollups cover all raw data of a timeseries"""
+    return getattr(store.get_storer(ts_id).attrs, COMPLETE_ATTR, False)
+
+
+def set_complete(store, ts_id, complete=True):
+    """Flag rollups of a timeseries as complete or not"""
+    attrs = store.get_storer(ts_id).attrs
+    if complete:
+        setattr(attrs, COMPLETE_ATTR, True)
+    elif COMPLETE_ATTR in attrs:
+        delattr(attrs, COMPLETE_ATTR)
+
+
+def rebuild(store, ts_id):
+    """Compute rollups of a timeseries from all its raw data"""
+    for level in LEVELS:
+        key = rollup_key(ts_id, level)
+        if key in store:
+            repack.record_removed(store, key, store.get_storer(key).nrows)
+            store.remove(key)
+    index = store.select_column(ts_id, 'index')
+    if len(index):
+        update(store, ts_id, index.min(), index.max())
+    set_complete(store, ts_id)
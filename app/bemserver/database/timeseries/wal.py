@@ -0,0 +1,437 @@
+"""Write-ahead log buffered timeseries database manager
+
+Writes are appended to a durable log and return without touching the main
+store. A compactor merges the buffered operations of each timeseries into the
+main store, in a few large writes instead of many small ones.
+
+The log is made of numbered segment files. Appends go to the current segment.
+Compaction seals the current segment, applies all sealed segments to the main
+store, in order, then removes them.
+
+Pending operations are also kept in memory, so reads merge them with the
+main store data and always see the latest written values.
+
+A segment that can't be applied after a few compactions is quarantined:
+renamed with a '.failed' suffix and left for inspection, so that it doesn't
+block later segments forever.
+"""
+
+from collections import OrderedDict, defaultdict
+import datetime as dt
+import logging
+import os
+from pathlib import Path
+import pickle
+import struct
+import threading
+
+from bemserver.models.timeseries import Timeseries
+
+from .base import TimeseriesMgr, select_range, upsert
+
+
+logger = logging.getLogger('bemserver')
+
+
+class WriteAheadLog():
+    """Append-only operation log split in numbered segment files
+
+    Each record is a pickled object prefixed with its length. A record
+    truncated by a crash while being written is ignored when reading.
+
+    :param str dir_path: Path to log directory
+    :param bool fsync: (optional, default True)
+        Flush each record to disk before returning from append.
+    """
+
+    SUFFIX = '.wal'
+    FAILED_SUFFIX = '.failed'
+    _HEADER = struct.Struct('>I')
+
+    def __init__(self, dir_path, *, fsync=True):
+        self.dir_path = Path(dir_path)
+        self.dir_path.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        # Never append to a segment left by a previous run
+        segments = self.segments()
+        self.segment = segments[-1] + 1 if segments else 0
+
+    def segment_path(self, segment):
+        """Return segment file path"""
+        return self.dir_path / '{:012d}{}'.format(segment, self.SUFFIX)
+
+    def segments(self):
+        """Return the sorted list of segments on disk"""
+        return sorted(
+            int(file_path.stem)
+            for file_path in self.dir_path.glob('*{}'.format(self.SUFFIX)))
+
+    def append(self, record):
+        """Append a record to the current segment
+
+        Return the segment the record was written to.
+        """
+        return self.append_many([record])
+
+    def append_many(self, records):
+        """Append records to the current segment, flushing them once
+
+        Return the segment the records were written to.
+        """
+        data = b''.join(
+            self._HEADER.pack(len(item)) + item for item in (
+                pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+                for record in records))
+        with self._lock:
+            if self._file is None:
+                self._file = open(str(self.segment_path(self.segment)), 'ab')
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            return self.segment
+
+    def rotate(self):
+        """Seal current segment and start a new one
+
+        Return the sealed segment.
+        """
+        with self._lock:
+            self._close()
+            self.segment += 1
+            return self.segment - 1
+
+    def read(self, segment):
+        """Iterate over the records of a segment"""
+        try:
+            segment_file = open(str(self.segment_path(segment)), 'rb')
+        except FileNotFoundError:
+            return
+        with segment_file:
+            while True:
+                header = segment_file.read(self._HEADER.size)
+                if len(header) < self._HEADER.size:
+                    return
+                length, = self._HEADER.unpack(header)
+                data = segment_file.read(length)
+                if len(data) < length:
+                    logger.warning(
+                        'Ignoring truncated record in timeseries log %s',
+                        self.segment_path(segment))
+                    return
+                yield pickle.loads(data)
+
+    def remove(self, segment):
+        """Remove a sealed segment"""
+        try:
+            self.segment_path(segment).unlink()
+        except FileNotFoundError:
+            pass
+
+    def quarantine(self, segment):
+        """Rename a sealed segment so that it is not read anymore
+
+        Return the new segment file path.
+        """
+        segment_path = self.segment_path(segment)
+        failed_path = segment_path.with_name(
+            segment_path.name + self.FAILED_SUFFIX)
+        try:
+            segment_path.rename(failed_path)
+        except FileNotFoundError:
+            pass
+        return failed_path
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BufferedTimeseriesMgr(TimeseriesMgr):
+    """Timeseries manager buffering writes in a write-ahead log
+
+    Wraps another timeseries manager (the main store). set and delete are
+    recorded in the log and in memory, and applied to the main store by
+    compact, either called explicitly or from a background thread.
+
+    Pending operations only live in the memory of the process that wrote
+    them, so the log directory must not be shared by several processes.
+
+    :param TimeseriesMgr mgr: Main store timeseries manager
+    :param str wal_dir: Path to log directory
+    :param bool fsync: (optional, default True)
+        Flush log to disk on each write.
+    :param float compact_interval: (optional, default None)
+        Background compaction interval, in seconds. If None, no background
+        thread is started.
+    :param int max_pending: (optional, default 10000)
+        Number of pending operations triggering a compaction before the end
+        of the interval.
+    :param int max_failures: (optional, default 3)
+        Number of failed compactions of a segment after which the segment is
+        quarantined and its operations dropped.
+    """
+
+    # Number of locks serializing reads and compaction of timeseries
+    SERIES_LOCKS = 64
+
+    def __init__(
+            self, mgr, wal_dir, *, fsync=True, compact_interval=None,
+            max_pending=10000, max_failures=3):
+        self.mgr = mgr
+        self.wal = WriteAheadLog(wal_dir, fsync=fsync)
+        self.compact_interval = compact_interval
+        self.max_pending = max_pending
+        self.max_failures = max_failures
+        # Protects pending operations and log appends/rotations
+        self._lock = threading.Lock()
+        # Only one compaction at a time
+        self._compact_lock = threading.Lock()
+        # A read of a timeseries and the compaction of its operations
+        # exclude each other. Timeseries share a fixed number of locks.
+        self._series_locks = [
+            threading.Lock() for _ in range(self.SERIES_LOCKS)]
+        # segment -> number of failed compactions
+        self._failures = {}
+        # segment -> (site, ts_id) -> list of operations
+        self._pending = OrderedDict()
+        self._pending_count = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._replay()
+        if compact_interval is not None:
+            self.start()
+
+    @property
+    def max_read_workers(self):
+        return self.mgr.max_read_workers
+
+    def _replay(self):
+        """Load operations left in log by a previous run"""
+        for segment in self.wal.segments():
+            for site, ts_id, operation in self.wal.read(segment):
+                self._add_pending(segment, site, ts_id, operation)
+
+    def _add_pending(self, segment, site, ts_id, operation):
+        self._pending.setdefault(segment, defaultdict(list))[
+            (site, ts_id)].append(operation)
+        self._pending_count += 1
+
+    def _record(self, site, ts_id, operation):
+        self._record_many([(site, ts_id, operation)])
+
+    def _record_many(self, records):
+        """Append (site, ts_id, operation) records to log at once"""
+        with self._lock:
+            segment = self.wal.append_many(records)
+            for site, ts_id, operation in records:
+                self._add_pending(segment, site, ts_id, operation)
+            if self._pending_count >= self.max_pending:
+                self._wakeup.set()
+
+    def pending_count(self):
+        """Return the number of operations not applied to main store"""
+        with self._lock:
+            return self._pending_count
+
+    def _pending_operations(self, site, ts_id):
+        with self._lock:
+            return [
+                operation for series in self._pending.values()
+                for operation in series.get((site, ts_id), [])]
+
+    def _series_lock(self, site, ts_id):
+        return self._series_locks[
+            hash((site, ts_id)) % len(self._series_locks)]
+
+    def get(self, site, ts_id, *, t_start=None, t_end=None):
+        # Get pending operations and read main store while no compaction
+        # applies operations of the timeseries. Pending operations may
+        # already be applied to main store: as no later operation can be,
+        # applying them again is harmless.
+        with self._series_lock(site, ts_id):
+            operations = self._pending_operations(site, ts_id)
+            ts_obj = self.mgr.get(
+                site, ts_id, t_start=t_start, t_end=t_end)
+        if not operations:
+            return ts_obj
+        dataframe = ts_obj.dataframe
+        for operation in operations:
+            if operation[0] == 'set':
+                new_df = select_range(operation[1], t_start, t_end)
+                if not new_df.empty:
+                    dataframe = upsert(dataframe, new_df)
+            else:
+                _, del_start, del_end = operation
+                dataframe = dataframe.drop(
+                    select_range(dataframe, del_start, del_end).index)
+        return Timeseries.from_dataframe(dataframe.sort_index())
+
+    def stats(self, site, ts_id):
+        if self._pending_operations(site, ts_id):
+            # Merge pending operations with main store data
+            return super().stats(site, ts_id)
+        return self.mgr.stats(site, ts_id)
+
+    def last(self, site, ts_id):
+        if self._pending_operations(site, ts_id):
+            # Merge pending operations with main store data
+            return super().last(site, ts_id)
+        return self.mgr.last(site, ts_id)
+
+    def resample(
+            self, site, ts_id, freq, operation, *, t_start=None, t_end=None):
+        if self._pending_operations(site, ts_id):
+            # Merge pending operations with main store data
+            return super().resample(
+                site, ts_id, freq, operation, t_start=t_start, t_end=t_end)
+        return self.mgr.resample(
+            site, ts_id, freq, operation, t_start=t_start, t_end=t_end)
+
+    def set(self, site, ts_id, ts_obj, *, set_update_ts=True):
+        # Silently ignore empty dataframeframes
+        if ts_obj.dataframe.empty:
+            return
+        # Set update timestamp now, not when applying to main store
+        if set_update_ts:
+            ts_obj.set_update_timestamp(dt.datetime.utcnow())
+        self._record(site, ts_id, ('set', ts_obj.dataframe.copy()))
+
+    def set_many(self, site_ts_objs, *, set_update_ts=True):
+        """Set values for several time series
+
+        Operations are appended to the log and flushed to disk at once. If
+        the log can't be written, no time series is.
+
+        See TimeseriesMgr.set_many.
+        """
+        update_ts = dt.datetime.utcnow()
+        exceptions = [None] * len(site_ts_objs)
+        # Positions in site_ts_objs of recorded operations
+        positions = []
+        records = []
+        for position, (site, ts_id, ts_obj) in enumerate(site_ts_objs):
+            try:
+                # Silently ignore empty dataframes
+                if ts_obj.dataframe.empty:
+                    continue
+                if set_update_ts:
+                    ts_obj.set_update_timestamp(update_ts)
+                records.append((site, ts_id, ('set', ts_obj.dataframe.copy())))
+            except Exception as exc:  # pylint: disable=broad-except
+                exceptions[position] = exc
+            else:
+                positions.append(position)
+        if records:
+            try:
+                self._record_many(records)
+            except Exception as exc:  # pylint: disable=broad-except
+                for position in positions:
+                    exceptions[position] = exc
+        return exceptions
+
+    def delete(self, site, ts_id, t_start, t_end):
+        self._record(site, ts_id, ('delete', t_start, t_end))
+
+    def compact(self):
+        """Apply pending operations to main store
+
+        Segments are applied in order. If a segment fails, the exception is
+        raised and the segment is retried on next compaction, unless it
+        failed max_failures times: it is then quarantined, its operations are
+        dropped and compaction goes on with the next segments.
+
+        Return the number of applied operations.
+        """
+        with self._compact_lock:
+            with self._lock:
+                sealed = self.wal.rotate()
+                segments = [
+                    segment for segment in self.wal.segments()
+                    if segment <= sealed]
+            count = 0
+            for segment in segments:
+                series = self._pending.get(segment, {})
+                seg_count = sum(
+                    len(operations) for operations in series.values())
+                try:
+                    for (site, ts_id), operations in series.items():
+                        with self._series_lock(site, ts_id):
+                            self._apply(site, ts_id, operations)
+                except Exception:
+                    failures = self._failures.get(segment, 0) + 1
+                    self._failures[segment] = failures
+                    if failures < self.max_failures:
+                        raise
+                    failed_path = self.wal.quarantine(segment)
+                    logger.exception(
+                        'Timeseries log segment failed %d times, '
+                        '%d operations dropped. Segment moved to %s',
+                        failures, seg_count, failed_path)
+                else:
+                    self.wal.remove(segment)
+                    count += seg_count
+                self._failures.pop(segment, None)
+                with self._lock:
+                    self._pending.pop(segment, None)
+                    self._pending_count -= seg_count
+            return count
+
+    def _apply(self, site, ts_id, operations):
+        """Apply operations of a timeseries to main store
+
+        Consecutive writes are merged into a single write.
+        """
+        dataframe = None
+        for operation in operations:
+            if operation[0] == 'set':
+                dataframe = (
+                    operation[1] if dataframe is None
+                    else upsert(dataframe, operation[1]))
+                continue
+            if dataframe is not None:
+                self._set(site, ts_id, dataframe)
+                dataframe = None
+            _, t_start, t_end = operation
+            self.mgr.delete(site, ts_id, t_start, t_end)
+        if dataframe is not None:
+            self._set(site, ts_id, dataframe)
+
+    def _set(self, site, ts_id, dataframe):
+        self.mgr.set(
+            site, ts_id, Timeseries.from_dataframe(dataframe.sort_index()),
+            set_update_ts=False)
+
+    def start(self):
+        """Start background compaction thread"""
+        self._thread = threading.Thread(
+            target=self._run, name='timeseries-compactor', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.compact_interval)
+            self._wakeup.clear()
+            try:
+                self.compact()
+            except Exception:  # pylint: disable=broad-except
+                # Failed segments are kept and retried on next compaction
+                logger.exception('Error while compacting timeseries log')
+
+    def stop(self):
+        """Stop background compaction thread and apply pending operations"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.compact()
+        self.wal.close()
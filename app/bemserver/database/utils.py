@@ -1,10 +1,23 @@
 """Module with utils class to handle the database interface"""
 
+import re
 import uuid
 
 from .ontology.exceptions import MissingValueError
 
 
+# Characters to escape in string literals
+LITERAL_ESCAPES = {
+    '\\': '\\\\',
+    '"': '\\"',
+    '\n': '\\n',
+    '\r': '\\r',
+}
+
+# Names that can be used to build URIs from a prefix
+LOCAL_NAME_RE = re.compile(r'^[\w.-]+$')
+
+
 def str_insert(dico, obj, attr, optional=False, prefix=None, final=False):
     """Build up the line corresponding to an object attribute, into
     a SPARQL insert method, in the form "relation value". Value is extracted
@@ -83,6 +96,32 @@ def str_filter(mapper, operation='='):
     return 'FILTER({}).'.format(' && '.join(str_)) if str_ else ''
 
 
+def escape_literal(value):
+    '''Escape a value to be inserted between double quotes as a string
+    literal in a SPARQL query
+    :param value Object: the value to escape
+    :return string: the escaped value'''
+    return ''.join(LITERAL_ESCAPES.get(char, char) for char in str(value))
+
+
+def values_clause(name, values, prefix=None):
+    '''Generate a VALUES line binding a variable to a set of values. To be
+    added in a SELECT query to match several values in a single query
+    :param name string: the name of the variable
+    :param values list: the values of the variable
+    :param prefix string: prefix of the values, if they are URIs. Values are
+        quoted literals otherwise
+    :return string: the VALUES line to be added in the query
+    :raise ValueError: if a value is not a valid URI local name'''
+    if prefix:
+        for value in values:
+            if not LOCAL_NAME_RE.match(str(value)):
+                raise ValueError('Invalid name: {}'.format(value))
+    str_ = [prefix.alias_uri(str(value)) if prefix
+            else '"{}"'.format(escape_literal(value)) for value in values]
+    return 'VALUES ?{} {{{}}}.\n'.format(name, ' '.join(str_))
+
+
 def str_filter_relation(map_id, map_relation, operation='EXISTS'):
     '''Generate the FILTER line to be inserted into a query, according to
     the input dictionary
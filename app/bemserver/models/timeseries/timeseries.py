@@ -160,21 +160,68 @@ class Timeseries():
             Muse be in AGG_OPERATIONS
 
         :returns Timeseries: A Timeseries object.
+        :raises ValueError: When operation is not in AGG_OPERATIONS.
         """
-        # Pandas skip nan when calculating mean: mean([np.nan, 2]) return 2
-        # http://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.mean.html
-        def namean(serie):
-            return serie.sum() / serie.size
-
-        concat = pd.concat([ts.dataframe for ts in timeseries], axis=1)
-        if concat.empty:
+        # Series are aligned on the union of their timestamps, then each
+        # column is reduced by accumulating series one at a time in NumPy
+        # arrays of the size of the union index: this avoids building a
+        # (timestamps x series) DataFrame and reducing it row by row.
+        # Missing values are skipped, except for quality, which is the mean
+        # over all series, missing values counting as 0.
+        if operation not in cls.AGG_OPERATIONS:
+            raise ValueError(
+                'Invalid aggregation operation: {}'.format(operation))
+        dataframes = [
+            ts.dataframe for ts in timeseries if not ts.dataframe.empty]
+        if not dataframes:
             return Timeseries()
+        index = dataframes[0].index
+        for dataframe in dataframes[1:]:
+            index = index.union(dataframe.index)
+
+        size = len(index)
+        if operation in ('sum', 'mean'):
+            data = np.zeros(size)
+            data_count = np.zeros(size)
+        else:
+            data = np.full(size, np.nan)
+            reduce_func = np.fmin if operation == 'min' else np.fmax
+        quality_sum = np.zeros(size)
+        # Update timestamps as int64 nanoseconds. NaT is the lowest int64.
+        update_ts_max = np.full(size, np.iinfo(np.int64).min)
+        update_ts_tz = None
+        for dataframe in dataframes:
+            if dataframe.index.equals(index):
+                pos = slice(None)
+            else:
+                pos = index.get_indexer(dataframe.index)
+            values = dataframe[cls.DATA_COL].values.astype(np.float64)
+            if operation in ('sum', 'mean'):
+                notna = ~np.isnan(values)
+                data[pos] += np.where(notna, values, 0)
+                data_count[pos] += notna
+            else:
+                data[pos] = reduce_func(data[pos], values)
+            quality_sum[pos] += np.nan_to_num(
+                dataframe[cls.QUALITY_COL].values.astype(np.float64))
+            update_ts = dataframe[cls.UPDATE_TIMESTAMP_COL]
+            if not pd.api.types.is_datetime64_any_dtype(update_ts):
+                update_ts = pd.to_datetime(update_ts)
+            if update_ts.dt.tz is not None:
+                update_ts_tz = 'UTC'
+            update_ts_max[pos] = np.maximum(
+                update_ts_max[pos],
+                update_ts.values.astype('datetime64[ns]').view(np.int64))
+        if operation == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                data /= data_count
 
         return Timeseries(
-            index=concat.index,
-            data=concat[cls.DATA_COL].agg(operation, axis=1),
-            quality=concat[cls.QUALITY_COL].agg(namean, axis=1),
-            update_ts=concat[cls.UPDATE_TIMESTAMP_COL].agg('max', axis=1))
+            index=index,
+            data=data,
+            quality=quality_sum / len(timeseries),
+            update_ts=pd.DatetimeIndex(
+                update_ts_max.view('datetime64[ns]'), tz=update_ts_tz))
 
     def validate(self):
         """Validates timeseries' dataframe structure.
@@ -230,7 +277,6 @@ class Timeseries():
         self.dataframe[self.UPDATE_TIMESTAMP_COL] = dtime
 
     def stats(self):
-        # TODO: modify TimeseriesMgr to avoid fetching all the data?
         if self.dataframe.empty:
             return {'count': len(self.dataframe)}
         return {
@@ -39,7 +39,8 @@ class Node():
         if child_node.has_parent and child_node.parent != self:
             raise TreeNodeAlreadyHasParentError(child_node.parent.label)
         # add child_node only if it is not already a son of current node
-        if child_node not in self._children:
+        # (a son always has current node as parent: no need to search)
+        if child_node.parent is not self:
             child_node._parent = self
             self._children.append(child_node)
 
@@ -51,6 +52,12 @@ class Node():
         for child in children:
             self.add_child(child)
 
+    def copy(self):
+        """Return a copy of the tree below current node, without parent."""
+        node = Node(self.name, label=self.label)
+        node.add_children(child.copy() for child in self._children)
+        return node
+
     @property
     def has_parent(self):
         """Return True if the node is not orphan."""
@@ -61,10 +61,10 @@ setup(
         'requests>=2.22.0,<2.23.0',
         'numpy>=1.14.0,<1.18.0',
         'pandas>=0.25.0,<0.26.0',
-        'sparqlwrapper>=1.8.4,<1.9.0',
         'flask-jwt-simple>=0.0.3,<0.1.0',
         'python3-saml>=1.4.1,<1.5',
         'tables>=3.3.0,<3.6.0',
+        'pyarrow>=0.15.0,<0.16.0',
         'pint>0.7,<0.9',
         'sqlalchemy>=1.2.5,<1.4.0',
         'sqlalchemy-utils>=0.32.21,<0.35.0',
@@ -0,0 +1,49 @@
+"""Tests for api concurrency limiter extension"""
+
+from flask import Flask, Response
+
+from bemserver.api.extensions.limiter import ConcurrencyLimiter
+
+from tests import TestCoreApi
+
+
+class TestApiExtensionsLimiter(TestCoreApi):
+
+    def test_limiter(self):
+
+        app = Flask('Test app')
+        limiter = ConcurrencyLimiter(app)
+
+        @app.route('/view')
+        @limiter.limit(1)
+        def view():
+            return 'OK'
+
+        @app.route('/stream')
+        @limiter.limit(1)
+        def stream():
+            def generate():
+                yield 'a'
+                yield 'b'
+            return Response(generate())
+
+        client = app.test_client()
+
+        # Slot is released when view returns
+        assert client.get('/view').status_code == 200
+        assert client.get('/view').status_code == 200
+
+        # Slot is held until streamed response is closed
+        resp = client.get('/stream')
+        assert resp.status_code == 200
+        assert client.get('/stream').status_code == 429
+        # Other views are not limited
+        assert client.get('/view').status_code == 200
+        assert resp.data == b'ab'
+        assert client.get('/stream').status_code == 429
+        resp.close()
+        # Buffered response is closed once read
+        resp = client.get('/stream', buffered=True)
+        assert resp.status_code == 200
+        assert resp.data == b'ab'
+        assert client.get('/stream', buffered=True).status_code == 200
@@ -1,6 +1,7 @@
 """Tests for api measure views"""
 
 import datetime as dt
+import json
 import random
 import statistics
 from math import isclose
@@ -8,11 +9,16 @@ from dateutil.tz import tzutc
 import flask
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 import pytest
+from werkzeug.exceptions import UnprocessableEntity
 
 from bemserver.models import Timeseries
+from bemserver.database.timeseries.hdfstore import HDFStoreTimeseriesMgr
 from bemserver.api.views.timeseries.tsio import (
-    get_timeseries_manager, tsload, tsdump)
+    get_timeseries_manager, tsload, tsdump, tsdump_stream,
+    tsdump_columns, tsload_columns, tsdump_csv, tsload_csv,
+    tsdump_arrow, tsload_arrow)
 from bemserver.api.views.timeseries.exceptions import (
     TimeseriesConfigError)
 
@@ -31,9 +37,41 @@ class TestApiTimeseries(TestCore):
         class MissingStorageDirHDFStoreConfig():
             TIMESERIES_BACKEND = 'hdfstore'
 
+        class InvalidLockModeHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_LOCK_MODE = 'dummy'
+
+        class InvalidPartitionHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_PARTITION = 'dummy'
+
+        class InvalidCompressionParquetConfig():
+            TIMESERIES_BACKEND = 'parquet'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_PARQUET_COMPRESSION = 'dummy'
+
+        class ProcessLockCacheHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_LOCK_MODE = 'process'
+            TIMESERIES_BACKEND_CACHE_SIZE = 1024 * 1024
+
+        class InvalidCompressionHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_HDFSTORE_SITE_COMPRESSION = {
+                'site': ('dummy', 5)}
+
         for config_cls in [
                 InvalidBackendConfig,
                 MissingStorageDirHDFStoreConfig,
+                InvalidLockModeHDFStoreConfig,
+                InvalidPartitionHDFStoreConfig,
+                InvalidCompressionParquetConfig,
+                ProcessLockCacheHDFStoreConfig,
+                InvalidCompressionHDFStoreConfig,
         ]:
             app = flask.Flask('Test')
             app.config.from_object(config_cls)
@@ -45,8 +83,46 @@ class TestApiTimeseries(TestCore):
             TIMESERIES_BACKEND = 'hdfstore'
             TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
 
+        class ProcessLockHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_LOCK_MODE = 'process'
+
+        class PartitionHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_PARTITION = 'month'
+
+        class CorrectParquetConfig():
+            TIMESERIES_BACKEND = 'parquet'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+
+        class TailHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_TAIL_WINDOW = 3600
+
+        class CacheHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_CACHE_SIZE = 1024 * 1024
+
+        class CompressionHDFStoreConfig():
+            TIMESERIES_BACKEND = 'hdfstore'
+            TIMESERIES_BACKEND_STORAGE_DIR = str(tmpdir)
+            TIMESERIES_BACKEND_HDFSTORE_COMPLIB = 'blosc:lz4'
+            TIMESERIES_BACKEND_HDFSTORE_COMPLEVEL = 5
+            TIMESERIES_BACKEND_HDFSTORE_SITE_COMPRESSION = {
+                'site': ('zlib', 1)}
+
         for config_cls in [
-                CorrectHDFStoreConfig
+                CorrectHDFStoreConfig,
+                ProcessLockHDFStoreConfig,
+                PartitionHDFStoreConfig,
+                CorrectParquetConfig,
+                TailHDFStoreConfig,
+                CacheHDFStoreConfig,
+                CompressionHDFStoreConfig,
         ]:
             app = flask.Flask('Test')
             app.config.from_object(config_cls)
@@ -136,6 +212,169 @@ class TestApiTimeseries(TestCore):
         assert [v['update_ts'] for v in ts_list] == update_ts_l
         assert [v['quality'] for v in ts_list] == quality_l
 
+        # Null values and ISO 8601 strings
+        ts = Timeseries(
+            index=pd.DatetimeIndex([
+                '2017-01-01T00:00:00', '2017-01-01T00:00:00.5',
+                '1960-01-01T00:00:00.000001']),
+            data=[0, np.nan, 2])
+        ts_list = tsdump(ts, to_isotime=True)
+        assert [v['timestamp'] for v in ts_list] == [
+            '2017-01-01T00:00:00+00:00',
+            '2017-01-01T00:00:00.500000+00:00',
+            '1960-01-01T00:00:00.000001+00:00',
+        ]
+        assert [v['value'] for v in ts_list] == [0, None, 2]
+        assert [v['update_ts'] for v in ts_list] == [None, None, None]
+        assert tsdump(Timeseries()) == []
+
+    def test_timeseries_tsload_parse(self):
+        data_list = [
+            {'timestamp': '2017-01-01T01:00:00+01:00', 'value': 1},
+            {'timestamp': '2017-01-01T01:00:00', 'value': '2.5',
+             'quality': 0.5, 'update_ts': '2018-01-01T00:00:00'},
+        ]
+        ts_df = tsload(data_list, parse=True).dataframe
+        assert ts_df.index.tolist() == [
+            dt.datetime(2017, 1, 1, tzinfo=tzutc()),
+            dt.datetime(2017, 1, 1, 1, tzinfo=tzutc())]
+        assert ts_df[Timeseries.DATA_COL].tolist() == [1, 2.5]
+        assert ts_df[Timeseries.QUALITY_COL].tolist() == [1, 0.5]
+        # update_ts is dump only
+        assert ts_df[Timeseries.UPDATE_TIMESTAMP_COL].isnull().all()
+
+        data_list = [
+            {'timestamp': '2017-01-01T00:00:00', 'value': 1},
+            {'timestamp': 'dummy', 'value': 'dummy', 'quality': 2},
+            {'timestamp': 42},
+        ]
+        with pytest.raises(UnprocessableEntity) as excinfo:
+            tsload(data_list, parse=True)
+        assert excinfo.value.data['errors'] == {'data': {
+            1: {
+                'timestamp': ['Not a valid datetime.'],
+                'value': ['Not a valid number.'],
+                'quality': ['Must be between 0 and 1.'],
+            },
+            2: {
+                'timestamp': ['Not a valid datetime.'],
+                'value': ['Missing data for required field.'],
+            },
+        }}
+
+    def test_timeseries_tsload_parse_awareness(self, tmpdir):
+        """Check PATCH values onto an aware series read back aware"""
+        index = pd.date_range(
+            '2017-01-01', periods=3, freq='D', tz='UTC')
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir))
+        mgr.set('test', 'ts', Timeseries(index=index, data=[0, 1, 2]))
+
+        ts = tsload([
+            {'timestamp': '2017-01-02T01:00:00+01:00', 'value': 10},
+            {'timestamp': '2017-01-04T00:00:00+00:00', 'value': 3},
+        ], parse=True)
+        assert str(ts.dataframe.index.tz) == 'UTC'
+        mgr.set('test', 'ts', ts)
+
+        ts = mgr.get('test', 'ts')
+        assert str(ts.dataframe.index.tz) == 'UTC'
+        ts_list = tsdump(ts)
+        assert [v['timestamp'] for v in ts_list] == [
+            dt.datetime(2017, 1, day, tzinfo=tzutc()) for day in range(1, 5)]
+        assert all(v['timestamp'].tzinfo is not None for v in ts_list)
+        assert [v['value'] for v in ts_list] == [0, 10, 2, 3]
+
+    def test_timeseries_tsdump_stream(self):
+        index = pd.date_range('2017-01-01', periods=5, freq='D')
+        chunks = [
+            Timeseries(index=index[:2], data=[0, 1]),
+            Timeseries(),
+            Timeseries(index=index[2:], data=[2, 3, 4]),
+        ]
+
+        for fmt in ('json', 'ndjson'):
+            assert ''.join(tsdump_stream([], fmt=fmt)) == (
+                '{"data": []}' if fmt == 'json' else '')
+
+        resp = json.loads(''.join(tsdump_stream(chunks)))
+        assert [v['value'] for v in resp['data']] == [0, 1, 2, 3, 4]
+        assert resp['data'][0]['timestamp'] == '2017-01-01T00:00:00+00:00'
+
+        lines = ''.join(tsdump_stream(chunks, fmt='ndjson')).splitlines()
+        assert [json.loads(line)['value'] for line in lines] == [
+            0, 1, 2, 3, 4]
+
+    def test_timeseries_formats(self):
+        index = pd.date_range('2017-01-01', periods=3, freq='D')
+        ts = Timeseries(
+            index=index, data=[0, 1.5, np.nan], quality=[1, 0.5, 1])
+        ts.set_update_timestamp(dt.datetime(2018, 1, 1))
+
+        # Columnar JSON
+        columns = tsdump_columns(ts)
+        assert columns == {
+            'timestamp': [
+                '2017-01-01T00:00:00+00:00', '2017-01-02T00:00:00+00:00',
+                '2017-01-03T00:00:00+00:00'],
+            'value': [0, 1.5, None],
+            'update_ts': ['2018-01-01T00:00:00+00:00'] * 3,
+            'quality': [1, 0.5, 1],
+        }
+        assert tsdump_columns(Timeseries()) == {
+            'timestamp': [], 'value': [], 'update_ts': [], 'quality': []}
+        ts_df = tsload_columns(json.dumps({
+            'timestamp': columns['timestamp'][:2],
+            'value': columns['value'][:2],
+        }).encode()).dataframe
+        assert ts_df.index.equals(index[:2].tz_localize('UTC'))
+        assert ts_df[Timeseries.DATA_COL].tolist() == [0, 1.5]
+        assert ts_df[Timeseries.QUALITY_COL].tolist() == [1, 1]
+        assert tsload_columns(b'{}').dataframe.empty
+        with pytest.raises(UnprocessableEntity) as excinfo:
+            tsload_columns(b'{"timestamp": ["2017-01-01"], "value": []}')
+        assert excinfo.value.data['errors'] == {
+            'data': ['Columns must be lists of same length.']}
+        with pytest.raises(UnprocessableEntity) as excinfo:
+            tsload_columns(b'{"value": [1]}')
+        assert excinfo.value.data['errors'] == {
+            'data': {'timestamp': ['Missing data for required field.']}}
+
+        # CSV
+        csv = tsdump_csv(ts)
+        assert csv.splitlines() == [
+            'timestamp,value,update_ts,quality',
+            '2017-01-01T00:00:00+00:00,0.0,2018-01-01T00:00:00+00:00,1.0',
+            '2017-01-02T00:00:00+00:00,1.5,2018-01-01T00:00:00+00:00,0.5',
+            '2017-01-03T00:00:00+00:00,,2018-01-01T00:00:00+00:00,1.0',
+        ]
+        ts_df = tsload_csv(
+            b'timestamp,value,quality\n'
+            b'2017-01-01T00:00:00+00:00,0,\n'
+            b'2017-01-02T00:00:00,1.5,0.5\n').dataframe
+        assert ts_df.index.equals(index[:2].tz_localize('UTC'))
+        assert ts_df[Timeseries.DATA_COL].tolist() == [0, 1.5]
+        assert ts_df[Timeseries.QUALITY_COL].tolist() == [1, 0.5]
+        assert tsload_csv(b'').dataframe.empty
+        with pytest.raises(UnprocessableEntity) as excinfo:
+            tsload_csv(b'timestamp,value\n2017-01-01,dummy\n')
+        assert excinfo.value.data['errors'] == {
+            'data': {0: {'value': ['Not a valid number.']}}}
+
+        # Arrow IPC
+        arrow = tsdump_arrow(ts)
+        table = pa.ipc.open_stream(pa.py_buffer(arrow)).read_all()
+        assert table.schema.names == [
+            'timestamp', 'value', 'update_ts', 'quality']
+        assert table.column('value').null_count == 1
+        ts_df = tsload_arrow(tsdump_arrow(Timeseries(
+            index=index[:2], data=[0, 1.5], quality=[1, 0.5]))).dataframe
+        assert ts_df.index.equals(index[:2].tz_localize('UTC'))
+        assert ts_df[Timeseries.DATA_COL].tolist() == [0, 1.5]
+        assert ts_df[Timeseries.QUALITY_COL].tolist() == [1, 0.5]
+        assert tsload_arrow(tsdump_arrow(Timeseries())).dataframe.empty
+        with pytest.raises(UnprocessableEntity):
+            tsload_arrow(b'dummy')
+
 
 @pytest.mark.usefixtures('init_app')
 class TestApiViewsTimeseries(TestCoreApi):
@@ -398,6 +637,298 @@ class TestApiViewsTimeseries(TestCoreApi):
     @pytest.mark.usefixtures('init_app', 'init_db_data')
     @pytest.mark.parametrize('init_db_data', [
         {'gen_sensors': True, 'gen_measures': True}], indirect=True)
+    def test_views_timeseries_stream(self):
+        """Check timeseries streaming view"""
+
+        ts_id = 'Test_1'
+        t_start = dt.datetime(2017, 1, 1).isoformat()
+        t_end = dt.datetime(2017, 6, 1).isoformat()
+        timestamp_l = [
+            (dt.datetime(2017, 1, 1, tzinfo=tzutc()) +
+             dt.timedelta(n)).isoformat()
+            for n in range(5)]
+        data_list_v = [
+            {'timestamp': t, 'value': v}
+            for t, v in zip(timestamp_l, range(5))
+        ]
+        query_string = {'start_time': t_start, 'end_time': t_end}
+
+        response = self.patch_item(ts_id, data=data_list_v)
+        assert response.status_code == 204
+
+        # Same document as non-streamed GET
+        response = self.client.get(
+            '/timeseries/{}/stream'.format(ts_id), query_string=query_string)
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+        data = json.loads(response.get_data(as_text=True))['data']
+        assert [v['timestamp'] for v in data] == timestamp_l
+        assert [v['value'] for v in data] == list(range(5))
+        ref = self.client.get(
+            '/timeseries/{}'.format(ts_id), query_string=query_string)
+        assert data == ref.json['data']
+
+        # NDJSON
+        response = self.client.get(
+            '/timeseries/{}/stream'.format(ts_id),
+            query_string=dict(query_string, format='ndjson'))
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data(as_text=True).splitlines()
+        assert [json.loads(line) for line in lines] == data
+
+        # Unit conversion errors are returned before streaming
+        response = self.client.get(
+            '/timeseries/{}/stream'.format(ts_id),
+            query_string=dict(query_string, unit='dummy'))
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize('init_db_data', [
+        {'gen_sensors': True, 'gen_measures': True}], indirect=True)
+    def test_views_timeseries_bulk(self, init_db_data):
+        """Check timeseries bulk GET view"""
+
+        db_data = init_db_data
+        measure_ids = [str(measure_id) for measure_id in db_data['measures']]
+        ts_ids = []
+        for measure_id in measure_ids[:2]:
+            response = self.get_item_by_id(
+                uri='/measures/', item_id=measure_id)
+            ts_ids.append(response.json['external_id'])
+        timestamp_l = [
+            (dt.datetime(2017, 1, 1, tzinfo=tzutc()) +
+             dt.timedelta(n)).isoformat()
+            for n in range(3)]
+        query_string = {
+            'ts_ids': ts_ids,
+            'start_time': dt.datetime(2017, 1, 1).isoformat(),
+            'end_time': dt.datetime(2017, 6, 1).isoformat(),
+        }
+
+        response = self.patch_item(ts_ids[0], data=[
+            {'timestamp': t, 'value': v}
+            for t, v in zip(timestamp_l[:2], [0, 1])])
+        assert response.status_code == 204
+        response = self.patch_item(ts_ids[1], data=[
+            {'timestamp': t, 'value': v}
+            for t, v in zip(timestamp_l[1:], [2, 3])])
+        assert response.status_code == 204
+
+        # Values of each timeseries
+        response = self.client.get(
+            '/timeseries/bulk', query_string=query_string)
+        assert response.status_code == 200
+        data = response.json['data']
+        assert set(data.keys()) == set(ts_ids)
+        for ts_id in ts_ids:
+            ref = self.get_item_by_id(
+                ts_id, start_time=query_string['start_time'],
+                end_time=query_string['end_time'])
+            assert data[ts_id] == ref.json['data']
+
+        # Matrix
+        response = self.client.get(
+            '/timeseries/bulk',
+            query_string=dict(query_string, layout='wide'))
+        assert response.status_code == 200
+        assert response.json == {
+            'timestamp': timestamp_l,
+            'data': {ts_ids[0]: [0, 1, None], ts_ids[1]: [None, 2, 3]},
+        }
+
+        # Unknown timeseries
+        response = self.client.get(
+            '/timeseries/bulk',
+            query_string=dict(query_string, ts_ids=ts_ids + ['dummy']))
+        assert response.status_code == 404
+        response = self.client.get(
+            '/timeseries/bulk', query_string=dict(query_string, ts_ids=[]))
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize('init_db_data', [
+        {'gen_sensors': True, 'gen_measures': True}], indirect=True)
+    def test_views_timeseries_bulk_patch(self, init_db_data):
+        """Check timeseries bulk PATCH view"""
+
+        db_data = init_db_data
+        measure_ids = [str(measure_id) for measure_id in db_data['measures']]
+        ts_ids = []
+        for measure_id in measure_ids[:2]:
+            response = self.get_item_by_id(
+                uri='/measures/', item_id=measure_id)
+            ts_ids.append(response.json['external_id'])
+        timestamp_l = [
+            (dt.datetime(2017, 1, 1, tzinfo=tzutc()) +
+             dt.timedelta(n)).isoformat()
+            for n in range(3)]
+        query_string = {
+            'start_time': dt.datetime(2017, 1, 1).isoformat(),
+            'end_time': dt.datetime(2017, 6, 1).isoformat(),
+        }
+
+        data = {
+            ts_ids[0]: [
+                {'timestamp': t, 'value': v}
+                for t, v in zip(timestamp_l, [0, 1, 2])],
+            ts_ids[1]: [{'timestamp': timestamp_l[0], 'value': 'dummy'}],
+            'dummy': [{'timestamp': timestamp_l[0], 'value': 42}],
+        }
+        response = self.client.patch(
+            '/timeseries/bulk', data=json.dumps({'data': data}),
+            content_type='application/json')
+        assert response.status_code == 200
+        results = response.json['data']
+        assert results[ts_ids[0]] == {'status': 204, 'count': 3}
+        assert results[ts_ids[1]]['status'] == 422
+        assert results[ts_ids[1]]['errors'] == {
+            'data': {'0': {'value': ['Not a valid number.']}}}
+        assert results['dummy'] == {'status': 404}
+
+        # Valid timeseries were written, others were not
+        response = self.get_item_by_id(ts_ids[0], **query_string)
+        assert [val['value'] for val in response.json['data']] == [0, 1, 2]
+        response = self.get_item_by_id(ts_ids[1], **query_string)
+        assert response.json['data'] == []
+
+        # Invalid payloads
+        for body in ({}, {'data': []}, {'data': {ts_ids[0]: 42}}):
+            response = self.client.patch(
+                '/timeseries/bulk', data=json.dumps(body),
+                content_type='application/json')
+            assert response.status_code == 422
+
+    @pytest.mark.parametrize('init_db_data', [
+        {'gen_sensors': True, 'gen_measures': True}], indirect=True)
+    def test_views_timeseries_last(self, init_db_data):
+        """Check timeseries latest value GET view"""
+
+        db_data = init_db_data
+        measure_ids = [str(measure_id) for measure_id in db_data['measures']]
+        ts_ids = []
+        for measure_id in measure_ids[:2]:
+            response = self.get_item_by_id(
+                uri='/measures/', item_id=measure_id)
+            ts_ids.append(response.json['external_id'])
+        timestamp_l = [
+            (dt.datetime(2017, 1, 1, tzinfo=tzutc()) +
+             dt.timedelta(n)).isoformat()
+            for n in range(3)]
+
+        # Latest value is not the last written one
+        response = self.patch_item(ts_ids[0], data=[
+            {'timestamp': t, 'value': v}
+            for t, v in zip(timestamp_l[1:], [1, 2])])
+        assert response.status_code == 204
+        response = self.patch_item(ts_ids[0], data=[
+            {'timestamp': timestamp_l[0], 'value': 0}])
+        assert response.status_code == 204
+
+        response = self.client.get(
+            '/timeseries/last', query_string={'ts_ids': ts_ids})
+        assert response.status_code == 200
+        data = response.json['data']
+        assert data[ts_ids[0]]['timestamp'] == timestamp_l[2]
+        assert data[ts_ids[0]]['value'] == 2
+        # No value
+        assert data[ts_ids[1]] is None
+
+        # Unknown timeseries
+        response = self.client.get(
+            '/timeseries/last', query_string={'ts_ids': ts_ids + ['dummy']})
+        assert response.status_code == 404
+        response = self.client.get(
+            '/timeseries/last', query_string={'ts_ids': []})
+        assert response.status_code == 422
+
+    @pytest.mark.usefixtures('init_app', 'init_db_data')
+    @pytest.mark.parametrize('init_db_data', [
+        {'gen_sensors': True, 'gen_measures': True}], indirect=True)
+    def test_views_timeseries_formats(self):
+        """Check timeseries values content negotiation"""
+
+        ts_id = 'Test_1'
+        uri = '/timeseries/{}'.format(ts_id)
+        query_string = {
+            'start_time': dt.datetime(2017, 1, 1).isoformat(),
+            'end_time': dt.datetime(2017, 6, 1).isoformat(),
+        }
+        timestamp_l = [
+            (dt.datetime(2017, 1, 1, tzinfo=tzutc()) +
+             dt.timedelta(n)).isoformat()
+            for n in range(4)]
+
+        # Set values in each format
+        response = self.client.patch(
+            uri, content_type='application/vnd.bemserver.columns+json',
+            data=json.dumps({'timestamp': timestamp_l[:1], 'value': [0]}))
+        assert response.status_code == 204
+        response = self.client.patch(
+            uri, content_type='text/csv',
+            data='timestamp,value\n{},1\n'.format(timestamp_l[1]))
+        assert response.status_code == 204
+        arrow = tsdump_arrow(Timeseries(
+            index=pd.DatetimeIndex(timestamp_l[2:]).tz_convert(None),
+            data=[2, 3]))
+        response = self.client.patch(
+            uri, content_type='application/vnd.apache.arrow.stream',
+            data=arrow)
+        assert response.status_code == 204
+        response = self.client.patch(
+            uri, content_type='application/xml', data='<data/>')
+        assert response.status_code == 415
+        response = self.client.patch(
+            uri, content_type='application/json', data='{}')
+        assert response.status_code == 422
+
+        # JSON is the default format
+        ref = self.client.get(uri, query_string=query_string)
+        assert ref.status_code == 200
+        assert ref.mimetype == 'application/json'
+        assert [v['timestamp'] for v in ref.json['data']] == timestamp_l
+        assert [v['value'] for v in ref.json['data']] == [0, 1, 2, 3]
+
+        # Get values in each format
+        response = self.client.get(
+            uri, query_string=query_string,
+            headers={'Accept': 'application/vnd.bemserver.columns+json'})
+        assert response.status_code == 200
+        assert response.mimetype == 'application/vnd.bemserver.columns+json'
+        columns = json.loads(response.get_data(as_text=True))
+        assert columns['timestamp'] == timestamp_l
+        assert columns['value'] == [0, 1, 2, 3]
+        response = self.client.get(
+            uri, query_string=query_string, headers={'Accept': 'text/csv'})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        lines = response.get_data(as_text=True).splitlines()
+        assert len(lines) == 5
+        assert lines[1].startswith(timestamp_l[0] + ',0.0,')
+        response = self.client.get(
+            uri, query_string=query_string,
+            headers={'Accept': 'application/vnd.apache.arrow.stream'})
+        assert response.status_code == 200
+        table = pa.ipc.open_stream(
+            pa.py_buffer(response.get_data())).read_all()
+        assert table.column('value').to_pylist() == [0, 1, 2, 3]
+
+        # Resample and aggregate
+        response = self.client.get(
+            '/timeseries/{}/resample'.format(ts_id),
+            query_string=dict(query_string, freq='day', aggregation='sum'),
+            headers={'Accept': 'text/csv'})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert len(response.get_data(as_text=True).splitlines()) == 5
+        response = self.client.get(
+            '/timeseries/aggregate',
+            query_string=dict(
+                query_string, ts_ids=[ts_id], freq='day',
+                resampling_method='sum', operation='sum'),
+            headers={'Accept': 'application/vnd.bemserver.columns+json'})
+        assert response.status_code == 200
+        columns = json.loads(response.get_data(as_text=True))
+        assert columns['value'] == [0, 1, 2, 3]
+
     def test_views_timeseries_stats(self):
         """Check timeseries stats view"""
 
@@ -628,6 +1159,23 @@ class TestApiViewsTimeseries(TestCoreApi):
         assert response.status_code == 422
         assert response.json['errors'] == {'data': '1 duplicate indexe(s)'}
 
+    @pytest.mark.usefixtures('init_app', 'init_db_data')
+    @pytest.mark.parametrize('init_db_data', [
+        {'gen_sensors': True, 'gen_measures': True}], indirect=True)
+    def test_timeseries_patch_invalid_values(self):
+        """Check timeseries values validation"""
+        ts_id = 'Test_1'
+        data_list = [
+            {'timestamp': dt.datetime(2017, 1, 1).isoformat(), 'value': 0},
+            {'timestamp': 'dummy', 'value': 1},
+        ]
+        response = self.patch_item(ts_id, data=data_list)
+        assert response.status_code == 422
+        assert response.json['errors'] == {
+            'data': {'1': {'timestamp': ['Not a valid datetime.']}}}
+        response = self.patch_item(ts_id, data=['dummy'])
+        assert response.status_code == 422
+
     @pytest.mark.parametrize('init_db_data', [
         {'gen_sensors': True, 'gen_measures': True}], indirect=True)
     def test_timeseries_clean_ugly_hack(self, init_db_data):
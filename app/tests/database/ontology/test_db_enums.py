@@ -1,8 +1,12 @@
 """Tests for a a ontology inteface so as to build enumerations"""
 
+from unittest import mock
+
 import pytest
 
-from bemserver.database.db_enums import DBEnumHandler
+from bemserver.database.db_enums import DBEnumHandler, enum_cache
+from bemserver.database.ontology.manager import (
+    SPARQLOP, PREFIX, QueryResult)
 
 from tests import TestCoreDatabaseOntology
 
@@ -163,3 +167,70 @@ class TestDBEnum(TestCoreDatabaseOntology):
         assert result.name == 'ElectricChargeUnit'
         assert result.label == 'ElectricChargeUnit'
         # assert len(result.children) > 0
+
+    def test_db_enums_build_tree(self):
+        """Test enum tree building from query result."""
+        enum_dbhandler = DBEnumHandler()
+        uri = PREFIX.BUILDING_INFRA.url
+        query_result = QueryResult(values=[
+            {'class': uri + 'Size', 'parent': uri + 'Dimension',
+             'label': 'Size'},
+            {'class': uri + 'Small', 'parent': uri + 'Size',
+             'label': 'Small'},
+            {'class': uri + 'Big', 'indiv': uri + 'huge'},
+            {'class': uri + 'Big', 'parent': uri + 'Size', 'label': 'Big'},
+            {'class': uri + 'Big', 'indiv': uri + 'large',
+             'label': 'Large'},
+            {'class': uri + 'Size', 'parent': uri + 'Other',
+             'label': 'Size'},
+        ])
+        result = enum_dbhandler._build_tree(uri + 'Size', query_result)
+        assert result.name == 'Size'
+        assert result.get_son_names() == ['Small', 'Big']
+        assert result.get_son('Small').get_son_names() == []
+        assert result.get_son('Big').get_son_names() == ['huge', 'Large']
+
+    def test_db_enums_cache(self):
+        """Test enum trees are cached until ontology version changes."""
+        enum_dbhandler = DBEnumHandler()
+        onto_mgr = enum_dbhandler.onto_mgr
+        check_interval = enum_cache.check_interval
+        enum_cache.check_interval = 3600
+        enum_cache.clear()
+        try:
+            with mock.patch.object(
+                    onto_mgr, 'perform', wraps=onto_mgr.perform) as perform:
+                # version marker and enum are queried once
+                result = enum_dbhandler.get_orientation_types()
+                assert perform.call_count == 2
+                assert DBEnumHandler().get_orientation_types() is result
+                assert perform.call_count == 2
+                # composed trees don't alter cached trees
+                units = enum_dbhandler.get_units()
+                assert enum_dbhandler.get_units() is units
+                temperature = enum_dbhandler.get_temperature_units()
+                assert not temperature.has_parent
+                assert units.get_son('TemperatureUnit') is not temperature
+                # clear cache
+                enum_cache.clear()
+                perform.reset_mock()
+                assert enum_dbhandler.get_orientation_types() is not result
+                assert perform.call_count == 2
+                result = enum_dbhandler.get_orientation_types()
+
+                # ontology version change invalidates cache
+                onto_mgr.perform(SPARQLOP.INSERT, """
+                    INSERT DATA {
+                        <http://test.bemserver/onto> rdf:type owl:Ontology.
+                        <http://test.bemserver/onto> owl:versionInfo "1.0".
+                    }""")
+                # not checked yet
+                assert enum_dbhandler.get_orientation_types() is result
+                enum_cache.check_interval = 0
+                new_result = enum_dbhandler.get_orientation_types()
+                assert new_result is not result
+                # version unchanged
+                assert enum_dbhandler.get_orientation_types() is new_result
+        finally:
+            enum_cache.check_interval = check_interval
+            enum_cache.clear()
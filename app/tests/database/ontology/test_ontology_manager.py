@@ -5,7 +5,7 @@ from unittest import mock
 import pytest
 from bemserver.database.ontology.exceptions import SPARQLError
 from bemserver.database.ontology.manager import (
-    PREFIX, SPARQLOP, ontology_manager_factory)
+    PREFIX, SPARQLOP, OntologyMgrFactory, ontology_manager_factory)
 
 from tests import TestCoreDatabaseOntology
 
@@ -24,6 +24,40 @@ class TestOntologyManagerPrefixEnum():
             PREFIX.get_name('du#mm#y')
 
 
+class TestOntologyManagerFactory():
+    """Unit test for OntologyMgrFactory"""
+
+    def test_ontology_manager_factory(self):
+        factory = OntologyMgrFactory()
+        with pytest.raises(RuntimeError):
+            factory.get_ontology_manager()
+
+        factory.open('http://localhost:3030/dummy', pool_size=3,
+                     connect_timeout=1, read_timeout=None)
+        onto_mgr = factory.get_ontology_manager()
+        assert onto_mgr.base_url == 'http://localhost:3030/dummy/'
+        assert onto_mgr.timeout == (1, None)
+        adapter = onto_mgr.session.get_adapter(onto_mgr.base_url)
+        assert adapter._pool_maxsize == 3
+        # Instance is shared
+        assert factory.get_ontology_manager() is onto_mgr
+
+        # Opening another URL produces a new instance
+        factory.open('http://localhost:3030/dummy_2/')
+        onto_mgr_2 = factory.get_ontology_manager()
+        assert onto_mgr_2 is not onto_mgr
+        assert onto_mgr_2.base_url == 'http://localhost:3030/dummy_2/'
+        assert onto_mgr_2.timeout == (5, 60)
+
+        # A forked process gets its own instance
+        with mock.patch('os.getpid', return_value=-1):
+            assert factory.get_ontology_manager() is not onto_mgr_2
+
+        factory.close()
+        with pytest.raises(RuntimeError):
+            factory.get_ontology_manager()
+
+
 @pytest.mark.usefixtures('init_onto_mgr_fact')
 class TestOntologyManager(TestCoreDatabaseOntology):
     """Tests on Jena manager"""
@@ -53,6 +87,13 @@ INSERT DATA
             """)
         assert count_values() == count + 1
 
+        # Latency is recorded for each query
+        stats = onto_mgr.latency_stats()
+        assert stats[SPARQLOP.SELECT]['count'] >= 2
+        assert stats[SPARQLOP.INSERT]['count'] >= 1
+        for op_stats in stats.values():
+            assert 0 < op_stats['max'] <= op_stats['total']
+
     def test_ontology_manager_exceptions(self):
 
         logger = logging.getLogger('bemserver')
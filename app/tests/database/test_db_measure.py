@@ -1,8 +1,12 @@
 """Tests the interface Measure/DB"""
 
+from unittest import mock
+
 import pytest
+from marshmallow import ValidationError
 
 from bemserver.database import MeasureDB, SensorDB, SpaceDB
+from bemserver.database.ontology.manager import PREFIX, SPARQLOP
 from bemserver.database.exceptions import ItemNotFoundError
 from bemserver.models import Measure, MeasureValueProperties
 
@@ -97,8 +101,26 @@ class TestMeasureDB(TestCoreDatabaseOntology):
                         str(space_ids[1]), str(space_ids[0])],
                     description='New sample measure'))
 
-        measures = list(measure_db.get_all(location_id=space_ids[0]))
+        # Locations of all measures are fetched in a single query
+        with mock.patch.object(
+                measure_db.onto_mgr, 'perform',
+                wraps=measure_db.onto_mgr.perform) as mock_perform:
+            measures = list(measure_db.get_all(location_id=space_ids[0]))
+        assert mock_perform.call_count == 2
         assert len(measures) == 2
+        for measure in measures:
+            locations = measure.associated_locations
+            assert [loc.type for loc in locations] == sorted(
+                (loc.type for loc in locations),
+                key=list(MeasureDB.LOCATION_TYPES).index)
+            assert {
+                (loc.type, loc.id) for loc in locations} == {
+                (loc.type, loc.id) for loc in
+                measure_db.get_by_id(measure.id).associated_locations}
+        assert {
+            len([loc for loc in measure.associated_locations
+                 if loc.type == 'space'])
+            for measure in measures} == {1, 2}
         result = measure_db.get_all(location_id=space_ids[1])
         assert len(list(result)) == 1
 
@@ -108,6 +130,78 @@ class TestMeasureDB(TestCoreDatabaseOntology):
             location_id=space_db.get_parent(str(space_ids[0])))
         assert len(list(result)) == 2
 
+    def test_db_measure_validate_refs(self, init_sensors):
+        sensor_ids, space_ids, _, _, _ = init_sensors
+        measure_db = MeasureDB()
+
+        measures = [
+            Measure(sensor_ids[0], 'DegreeCelsius', 'Air', 'Temperature',
+                    associated_locations=space_ids),
+            Measure(sensor_ids[1], 'DegreeCelsius', 'Dummy', 'Temperature',
+                    associated_locations=[space_ids[0], 'dummy']),
+        ]
+        # All references of all elements are checked in a single query
+        with mock.patch.object(
+                measure_db.onto_mgr, 'perform',
+                wraps=measure_db.onto_mgr.perform) as mock_perform:
+            errors, prefixes = measure_db._validate_refs_many(measures)
+        assert mock_perform.call_count == 1
+        assert errors == [
+            {},
+            {
+                'medium': ['Reference not found'],
+                'associated_locations': {'1': ['Reference not found']},
+            },
+        ]
+        # Prefixes with which enumerated references exist
+        assert prefixes[0] == {
+            'medium': PREFIX.BUILDING_INFRA,
+            'observation_type': PREFIX.PROPERTY,
+            'unit': PREFIX.UNIT,
+        }
+        assert 'medium' not in prefixes[1]
+        assert prefixes[1]['unit'] is PREFIX.UNIT
+        assert measure_db._validate_refs(measures[0]) == prefixes[0]
+        with pytest.raises(ValidationError) as exc:
+            measure_db._validate_refs(measures[1])
+        assert exc.value.messages == errors[1]
+        with pytest.raises(ValidationError):
+            measure_db.create(measures[1])
+
+        # Create uses the unit prefix found while validating references:
+        # one query to validate, one to insert
+        with mock.patch.object(
+                measure_db.onto_mgr, 'perform',
+                wraps=measure_db.onto_mgr.perform) as mock_perform:
+            measure_id = measure_db.create(measures[0])
+        assert mock_perform.call_count == 2
+        assert measure_db.get_by_id(measure_id).unit == 'DegreeCelsius'
+
+    def test_db_measure_locations_multi_path(self, init_measures):
+        """Check locations reached by several class paths are unique"""
+        measure_ids, _, space_ids, _, _, _ = init_measures
+        measure_db = MeasureDB()
+
+        # Space is an IfcSpace, and a subclass of IfcSpace through two paths
+        measure_db.onto_mgr.perform(SPARQLOP.INSERT, """
+            INSERT DATA {{
+                bem:TestSpace rdfs:subClassOf bem:TestSpaceA, bem:TestSpaceB.
+                bem:TestSpaceA rdfs:subClassOf ifc2x3:IfcSpace.
+                bem:TestSpaceB rdfs:subClassOf ifc2x3:IfcSpace.
+                {} a bem:TestSpace.
+            }}""".format(PREFIX.ROOT.alias_uri(str(space_ids[0]))))
+
+        related = measure_db.get_related_individuals_ids(
+            [str(measure_ids[0])],
+            measure_db.OPT_LINKS['associated_locations'],
+            parent_classes=[PREFIX.IFC2x3.alias_uri('IfcSpace')])
+        assert related == {
+            str(measure_ids[0]): [(str(space_ids[0]), 'IfcSpace')]}
+        locations = measure_db.get_by_id(
+            measure_ids[0]).associated_locations
+        assert [loc.id for loc in locations if loc.type == 'space'] == [
+            space_ids[0]]
+
     def test_db_measure_update(self, init_measures):
 
         measure_ids, _, _, _, building_ids, _ = init_measures
@@ -2,8 +2,12 @@
 
 import pytest
 
+from bemserver.database.dbaccessor import DBAccessor
 from bemserver.database.exceptions import (
     ItemNotFoundError, ItemSaveError, ItemDeleteError)
+from bemserver.models import (
+    Site, Building, Floor, Space, Zone, Sensor, Measure, OutputTimeSeries,
+    GeographicInfo, Localization, ValuesDescription)
 
 from tests import TestCoreDatabaseMock
 from tests.utils import uuid_gen
@@ -176,3 +180,59 @@ class TestDatabaseMock(TestCoreDatabaseMock):
         # delete error
         with pytest.raises(ItemDeleteError):
             self.db.delete(item, mock_error=True)
+
+    def test_database_mock_list_sieve(self):
+        """Test filtering on a list of values"""
+
+        db_accessor = DBAccessor()
+        measures = [
+            Measure('sensor', 'DegreeCelsius', external_id=ext_id)
+            for ext_id in ('ext_1', 'ext_2', 'ext_3')]
+        for measure in measures:
+            db_accessor.create(measure)
+        item_list = db_accessor.get_list(
+            Measure, {'external_ids': ['ext_1', 'ext_3', 'dummy']})
+        assert item_list == [measures[0], measures[2]]
+        assert db_accessor.get_list(Measure, {'external_ids': []}) == []
+
+    def test_database_mock_get_parents(self):
+        """Test parent sites search, following references"""
+
+        db_accessor = DBAccessor()
+        site_id = db_accessor.create(
+            Site('Site', GeographicInfo(latitude=42, longitude=4)))
+        building_id = db_accessor.create(
+            Building('Building', 'House', str(site_id)))
+        floor_id = db_accessor.create(
+            Floor('Floor', 0, str(building_id), 'Ground'))
+        space_id = db_accessor.create(Space('Space', str(floor_id)))
+        zone_id = db_accessor.create(
+            Zone('Zone', [], [], building_id=str(building_id)))
+        sensor_id = db_accessor.create(
+            Sensor('Sensor', localization=Localization(
+                space_id=str(space_id))))
+        measure_id = db_accessor.create(
+            Measure(str(sensor_id), 'DegreeCelsius'))
+        output_id = db_accessor.create(OutputTimeSeries(
+            'module', 'model', str(zone_id),
+            ValuesDescription('Temperature', 'DegreeCelsius')))
+
+        assert db_accessor.get_parents(
+            Sensor, [str(sensor_id), 'dummy']) == {
+                str(sensor_id): str(site_id)}
+        assert db_accessor.get_parents(
+            Measure, [str(measure_id)]) == {str(measure_id): str(site_id)}
+        assert db_accessor.get_parents(
+            OutputTimeSeries, [str(output_id)]) == {
+                str(output_id): str(site_id)}
+
+        # Locations of several classes
+        location_ids = [
+            str(item_id) for item_id in (
+                site_id, building_id, floor_id, space_id, zone_id)]
+        assert db_accessor.get_parents(Space, location_ids) == {
+            str(space_id): str(site_id)}
+        assert db_accessor.get_parents_many_classes(
+            [Space, Zone, Floor, Building, Site],
+            location_ids + ['dummy']) == {
+                location_id: str(site_id) for location_id in location_ids}
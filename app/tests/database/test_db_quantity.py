@@ -4,7 +4,7 @@ import pytest
 
 from bemserver.models.quantity import Quantity
 from bemserver.database.db_quantity import QuantityDB
-from bemserver.database.ontology.manager import PREFIX
+from bemserver.database.ontology.manager import PREFIX, SPARQLOP
 from bemserver.database.exceptions import ItemNotFoundError
 
 
@@ -39,6 +39,59 @@ class TestDBQuantity():
         with pytest.raises(ItemNotFoundError):
             quantity_get = quantity_db.get(uri)
 
+    @pytest.mark.usefixtures('init_onto_mgr_fact')
+    def test_db_quantity_get_all_for_many(self):
+        quantity_db = QuantityDB()
+        relation = PREFIX.SSN.alias_uri('hasProperty')
+        elt_ids = ['elt_{}'.format(i) for i in range(3)]
+        elt_uris = [PREFIX.ROOT.alias_uri(elt_id) for elt_id in elt_ids]
+        quantities = [
+            Quantity("Area", 323.324, "SquareMeter"),
+            Quantity("Height", 2.5, "Meter"),
+            Quantity("Area", 12., "SquareMeter"),
+        ]
+        quantity_db.create_for(quantities[0], relation, elt_uris[0])
+        quantity_db.create_for(quantities[1], relation, elt_uris[0])
+        quantity_db.create_for(quantities[2], relation, elt_uris[1])
+
+        result = quantity_db.get_all_for_many(elt_ids, relation=relation)
+        assert set(result) == {'elt_0', 'elt_1'}
+        # Same result as getting quantities element by element
+        for idx in range(2):
+            elt_quantities = sorted(
+                result['elt_{}'.format(idx)], key=lambda q: q.kind)
+            expected = sorted(
+                quantity_db.get_all_for(elt_uris[idx], relation=relation),
+                key=lambda q: q.kind)
+            assert len(elt_quantities) == len(expected)
+            for quantity, expected_quantity in zip(elt_quantities, expected):
+                self._assert_equal(quantity, expected_quantity)
+        self._assert_equal(result['elt_1'][0], quantities[2])
+
+        result = quantity_db.get_all_for_many(
+            elt_ids, relation=relation, kind='Height')
+        assert set(result) == {'elt_0'}
+        self._assert_equal(result['elt_0'][0], quantities[1])
+
+        assert quantity_db.get_all_for_many([]) == {}
+
+        # Quantities of a subclass of a kind are matched with that kind
+        quantity_db.onto_mgr.perform(SPARQLOP.INSERT, """
+            INSERT DATA {{{} rdfs:subClassOf {}.}}""".format(
+                PREFIX.PROPERTY.alias_uri('TestArea'),
+                PREFIX.PROPERTY.alias_uri('Area')))
+        quantity_db.create_for(
+            Quantity("TestArea", 7., "SquareMeter"), relation, elt_uris[2])
+        result = quantity_db.get_all_for_many(
+            elt_ids, relation=relation, kinds=['Area', 'Width'])
+        assert set(result) == {'elt_0', 'elt_1', 'elt_2'}
+        assert [q.kind for q in result['elt_0']] == ['Area']
+        self._assert_equal(
+            result['elt_2'][0], Quantity("Area", 7., "SquareMeter"))
+        # Without kinds, the quantity kind is its own class
+        result = quantity_db.get_all_for_many(['elt_2'], relation=relation)
+        assert result['elt_2'][0].kind == 'TestArea'
+
 #     def test_create_get(self):
 #         """Basic test: create a quantity in the model and find it back"""
 #         quantity_db = QuantityDB()
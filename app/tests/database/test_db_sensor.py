@@ -71,6 +71,8 @@ class TestSensorDB(TestCoreDatabaseOntology):
         sites = SiteDB().get_all()
         assert sensor_db.get_parent(sensor.id) in [
             str(site.id) for site in sites]
+        assert sensor_db.get_parents([str(sensor.id), 'dummy']) == {
+            str(sensor.id): sensor_db.get_parent(sensor.id)}
 
     def test_db_sensor_filter(self, init_spaces):
         space_ids, _, building_ids, _ = init_spaces
@@ -0,0 +1,31 @@
+"""Tests for database interface utils"""
+
+import pytest
+
+from bemserver.database.ontology.manager import PREFIX
+from bemserver.database.utils import escape_literal, values_clause
+
+from tests import TestCoreDatabase
+
+
+class TestDatabaseUtils(TestCoreDatabase):
+    """Tests on database interface utils"""
+
+    def test_database_utils_values_clause(self):
+        """Test VALUES line generation"""
+
+        assert values_clause('ext', ['ext_1', 'ext_2']) == (
+            'VALUES ?ext {"ext_1" "ext_2"}.\n')
+        assert values_clause(
+            'uri', ['id_1', 'id-2.a'], prefix=PREFIX.ROOT) == (
+            'VALUES ?uri {{{0}:id_1 {0}:id-2.a}}.\n'.format(
+                PREFIX.ROOT.alias))
+
+        # Literals are escaped
+        assert escape_literal('a"b\\c\nd\re') == 'a\\"b\\\\c\\nd\\re'
+        assert values_clause('ext', ['x" } . ?s ?p ?o . VALUES ?y { "z']) == (
+            'VALUES ?ext {"x\\" } . ?s ?p ?o . VALUES ?y { \\"z"}.\n')
+
+        # Names of URIs are validated
+        with pytest.raises(ValueError):
+            values_clause('uri', ['id_1', 'id_2> } #'], prefix=PREFIX.ROOT)
@@ -0,0 +1,134 @@
+"""Tests on read cache timeseries manager"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from bemserver.models import Timeseries
+from bemserver.database.timeseries.hdfstore import HDFStoreTimeseriesMgr
+from bemserver.database.timeseries.cache import CachedTimeseriesMgr
+
+from tests import TestCoreDatabase
+
+
+class TestCachedTimeseriesManager(TestCoreDatabase):
+    """Tests for read cache timeseries manager"""
+
+    def test_cached_timeseries_manager(self, tmpdir):
+
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 3), freq='H',
+            closed='left')
+        store = HDFStoreTimeseriesMgr(str(tmpdir))
+        mgr = CachedTimeseriesMgr(store)
+        # get_many parallelism is that of the cached manager
+        assert mgr.max_read_workers == store.max_read_workers
+        mgr.set('test', 'ts', Timeseries(index=index, data=range(48)))
+
+        # Second read is a hit and returns the same values
+        day_1 = {'t_start': index[0], 't_end': index[24]}
+        day_2 = {'t_start': index[24], 't_end': dt.datetime(2017, 1, 3)}
+        ts_obj = mgr.get('test', 'ts', **day_1)
+        assert mgr.cache_stats()['misses'] == 1
+        # Returned values are copies
+        ts_obj.dataframe['data'] = -1
+        ts_obj = mgr.get('test', 'ts', **day_1)
+        assert mgr.cache_stats()['hits'] == 1
+        assert ts_obj.dataframe['data'].tolist() == list(range(24))
+        # Aware bounds share entries with naive UTC bounds
+        mgr.get(
+            'test', 'ts', t_start=index[0].tz_localize('UTC'),
+            t_end=index[24].tz_localize('UTC'))
+        assert mgr.cache_stats()['hits'] == 2
+        # Resampled values are cached by frequency and operation
+        assert mgr.resample('test', 'ts', 'day', 'sum', **day_1).dataframe[
+            'data'].tolist() == [sum(range(24))]
+        mgr.resample('test', 'ts', 'day', 'sum', **day_1)
+        mgr.resample('test', 'ts', 'day', 'max', **day_1)
+        mgr.get('test', 'ts', **day_2)
+        stats = mgr.cache_stats()
+        assert (stats['hits'], stats['misses']) == (3, 4)
+        assert stats['entries'] == 4
+        assert stats['size'] > 0
+
+        # Writing in day 2 only invalidates day 2 entries
+        mgr.set('test', 'ts', Timeseries(
+            index=index[30:31], data=np.array([100])))
+        assert mgr.cache_stats()['invalidations'] == 1
+        assert mgr.get('test', 'ts', **day_2).dataframe['data'][6] == 100
+        mgr.get('test', 'ts', **day_1)
+        assert mgr.resample('test', 'ts', 'day', 'sum', **day_1).dataframe[
+            'data'].tolist() == [sum(range(24))]
+        stats = mgr.cache_stats()
+        assert (stats['hits'], stats['misses']) == (5, 5)
+
+        # Deleting day 1 invalidates day 1 entries
+        mgr.delete('test', 'ts', index[0], index[24])
+        assert mgr.cache_stats()['invalidations'] == 4
+        assert mgr.get('test', 'ts', **day_1).dataframe.empty
+        assert mgr.resample(
+            'test', 'ts', 'day', 'sum', **day_1).dataframe.empty
+        mgr.get('test', 'ts', **day_2)
+        stats = mgr.cache_stats()
+        assert (stats['hits'], stats['misses']) == (6, 7)
+
+        # Unbounded reads are invalidated by any write
+        mgr.get('test', 'ts')
+        mgr.set('test', 'ts', Timeseries(
+            index=index[:1], data=np.array([0])))
+        assert len(mgr.get('test', 'ts').dataframe) == 25
+
+        mgr.reset_cache_stats()
+        assert mgr.cache_stats()['hits'] == 0
+        mgr.clear()
+        assert mgr.cache_stats()['entries'] == 0
+        assert mgr.cache_stats()['size'] == 0
+
+    def test_cached_timeseries_manager_eviction(self, tmpdir):
+
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 2), freq='H',
+            closed='left')
+        store = HDFStoreTimeseriesMgr(str(tmpdir))
+        for idx in range(3):
+            store.set('test', 'ts_{}'.format(idx), Timeseries(
+                index=index, data=range(24)))
+        entry_size = int(
+            store.get('test', 'ts_0').dataframe.memory_usage().sum())
+        mgr = CachedTimeseriesMgr(store, max_size=2 * entry_size)
+
+        mgr.get('test', 'ts_0')
+        mgr.get('test', 'ts_1')
+        # Least recently used entry is evicted
+        mgr.get('test', 'ts_0')
+        mgr.get('test', 'ts_2')
+        stats = mgr.cache_stats()
+        assert stats['evictions'] == 1
+        assert stats['entries'] == 2
+        assert stats['size'] == 2 * entry_size
+        mgr.get('test', 'ts_0')
+        mgr.get('test', 'ts_1')
+        stats = mgr.cache_stats()
+        assert (stats['hits'], stats['misses']) == (2, 4)
+
+        # Values bigger than cache are not cached
+        mgr = CachedTimeseriesMgr(store, max_size=entry_size - 1)
+        mgr.get('test', 'ts_0')
+        assert mgr.cache_stats()['entries'] == 0
+
+    def test_cached_timeseries_manager_set_many(self, tmpdir):
+
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 2), freq='H',
+            closed='left')
+        mgr = CachedTimeseriesMgr(HDFStoreTimeseriesMgr(str(tmpdir)))
+        mgr.get('test', 'ts_0')
+        mgr.get('test', 'ts_1')
+        exceptions = mgr.set_many([
+            ('test', 'ts_0', Timeseries(index=index, data=range(24))),
+            ('test', 'ts_1', 'dummy Timeseries'),
+        ])
+        assert exceptions[0] is None
+        assert mgr.cache_stats()['invalidations'] == 2
+        assert len(mgr.get('test', 'ts_0').dataframe) == 24
@@ -0,0 +1,128 @@
+"""Tests on timeseries storage locks"""
+
+import fcntl
+import threading
+import time
+
+import pytest
+
+from bemserver.database.timeseries.locks import (
+    RWLock, FileLocks, TimedLock, os_file_lock)
+
+from tests import TestCoreDatabase
+
+
+class TestTimeseriesLocks(TestCoreDatabase):
+    """Tests for timeseries file locks"""
+
+    def test_rwlock_shared_read(self):
+        lock = RWLock()
+        lock.acquire_read()
+        lock.acquire_read()
+        assert lock.locked()
+        lock.release_read()
+        lock.release_read()
+        assert not lock.locked()
+
+    def test_rwlock_exclusive_write(self):
+        lock = RWLock()
+        events = []
+
+        def reader():
+            lock.acquire_read()
+            events.append('read')
+            lock.release_read()
+
+        lock.acquire_write()
+        thread = threading.Thread(target=reader)
+        thread.start()
+        time.sleep(0.05)
+        # Reader is blocked by writer
+        assert events == []
+        events.append('write')
+        lock.release_write()
+        thread.join()
+        assert events == ['write', 'read']
+        assert not lock.locked()
+
+    def test_file_locks(self):
+        locks = FileLocks()
+        assert locks.get('a') is locks.get('a')
+        assert locks.get('a') is not locks.get('b')
+
+        # Writing a file does not block readers of another file
+        with locks.locked('a', write=True):
+            with locks.locked('b'):
+                assert locks.get('a').locked()
+                assert locks.get('b').locked()
+        assert not locks.get('a').locked()
+        assert not locks.get('b').locked()
+
+        stats = locks.stats.as_dict()
+        assert stats['write']['count'] == 1
+        assert stats['read']['count'] == 1
+        locks.stats.reset()
+        assert locks.stats.as_dict()['read']['count'] == 0
+
+    def test_file_locks_pruned(self):
+        locks = FileLocks()
+        for idx in range(100):
+            with locks.locked(str(idx), write=bool(idx % 2)):
+                assert len(locks) == 1
+        # Idle locks are dropped
+        assert len(locks) == 0
+
+        # A lock in use is kept and shared
+        with locks.locked('a'):
+            lock = locks.get('a')
+            assert lock.locked()
+            with locks.locked('a'):
+                assert locks.get('a') is lock
+            assert len(locks) == 1
+        del lock
+        assert len(locks) == 0
+
+    def test_timed_lock(self):
+        locks = FileLocks(extra_stats_modes=('global', ))
+        lock = TimedLock(locks.stats, 'global')
+        # Lock is reentrant
+        with lock:
+            with lock:
+                pass
+        stats = locks.stats.as_dict()
+        assert stats['global']['count'] == 2
+        assert stats['global']['wait_time'] >= 0
+        assert stats['read']['count'] == 0
+        locks.stats.reset()
+        assert locks.stats.as_dict()['global']['count'] == 0
+
+    def test_os_file_lock(self, tmpdir):
+        file_path = str(tmpdir / 'file.hdf5')
+        lock_path = file_path + '.lock'
+
+        def try_lock(write):
+            # A new open file description conflicts like another process
+            with open(lock_path, 'a') as lock_file:
+                mode = fcntl.LOCK_EX if write else fcntl.LOCK_SH
+                try:
+                    fcntl.flock(lock_file.fileno(), mode | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                return True
+
+        with os_file_lock(file_path):
+            assert try_lock(write=False)
+            assert not try_lock(write=True)
+        with os_file_lock(file_path, write=True):
+            assert not try_lock(write=False)
+        assert try_lock(write=True)
+
+    @pytest.mark.parametrize('process', (False, True))
+    def test_file_locks_process(self, tmpdir, process):
+        locks = FileLocks()
+        file_path = str(tmpdir / 'file.hdf5')
+        with locks.locked(file_path, write=True, process=process):
+            assert locks.get(file_path).locked()
+        assert not locks.get(file_path).locked()
+        assert (tmpdir / 'file.hdf5.lock').exists() == process
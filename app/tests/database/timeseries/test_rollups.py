@@ -0,0 +1,45 @@
+"""Tests on timeseries resampling rollups"""
+
+import datetime as dt
+
+import pandas as pd
+import pytz
+
+from bemserver.database.timeseries import rollups
+
+from tests import TestCoreDatabase
+
+
+class TestRollups(TestCoreDatabase):
+    """Tests for rollups helpers"""
+
+    def test_rollups_buckets(self):
+        timestamp = pd.Timestamp('2017-02-15 10:30')
+        assert rollups.floor(timestamp, 'hour') == pd.Timestamp(
+            '2017-02-15 10:00')
+        assert rollups.floor(timestamp, 'day') == pd.Timestamp('2017-02-15')
+        assert rollups.floor(timestamp, 'month') == pd.Timestamp('2017-02-01')
+        assert rollups.ceil(timestamp, 'hour') == pd.Timestamp(
+            '2017-02-15 11:00')
+        assert rollups.ceil(timestamp, 'month') == pd.Timestamp('2017-03-01')
+        # Aligned timestamps are their own ceil
+        timestamp = pd.Timestamp('2017-02-01')
+        for level in rollups.LEVELS:
+            assert rollups.ceil(timestamp, level) == timestamp
+            assert rollups.is_aligned(timestamp, level)
+
+    def test_rollups_resample_level(self):
+        t_day = dt.datetime(2017, 1, 2)
+        t_hour = dt.datetime(2017, 1, 2, 3)
+        t_min = dt.datetime(2017, 1, 2, 3, 4)
+        assert rollups.resample_level('year') == 'month'
+        assert rollups.resample_level('year', t_day) == 'day'
+        assert rollups.resample_level('year', t_day, t_hour) == 'hour'
+        assert rollups.resample_level('day', t_day, t_hour) == 'hour'
+        assert rollups.resample_level('hour', t_min) is None
+        assert rollups.resample_level('min') is None
+        assert rollups.resample_level('week') is None
+        # Aware bounds are converted to UTC
+        t_aware = pytz.timezone('Europe/Paris').localize(
+            dt.datetime(2017, 1, 2, 1))
+        assert rollups.resample_level('day', t_aware) == 'day'
@@ -1,6 +1,8 @@
 """Tests on database timeseries manager"""
 
 import datetime as dt
+from pathlib import Path
+import threading
 import pytz
 import numpy as np
 import pandas as pd
@@ -8,7 +10,9 @@ import pytest
 
 from bemserver.models import Timeseries
 from bemserver.database.timeseries.hdfstore import (
-    HDFStoreTimeseriesMgr, HDF_LOCK)
+    HDFStoreTimeseriesMgr, HDF_LOCKS)
+from bemserver.database.timeseries.parquet import ParquetTimeseriesMgr
+from bemserver.database.timeseries.base import resample_chunks
 
 from tests import TestCoreDatabase
 
@@ -16,7 +20,8 @@ from tests import TestCoreDatabase
 class TestHDFStoreTimeseriesManager(TestCoreDatabase):
     """Tests for HDFStore timeseries manager"""
 
-    def test_hdfstore_timeseries_manager(self, tmpdir):
+    @pytest.mark.parametrize('partition', (None, 'month', 'year'))
+    def test_hdfstore_timeseries_manager(self, tmpdir, partition):
 
         t_before_start_1 = dt.datetime(2016, 12, 1)
         t_before_start_2 = dt.datetime(2016, 12, 2)
@@ -28,7 +33,7 @@ class TestHDFStoreTimeseriesManager(TestCoreDatabase):
         t_after_end_2 = dt.datetime(2017, 2, 2)
         index = pd.date_range(t_start, t_end, freq='min', closed='left')
 
-        mgr = HDFStoreTimeseriesMgr(str(tmpdir))
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
 
         # Get unknown timestore ID
         df = mgr.get('test', 'dummy', t_start=t_start, t_end=t_end).dataframe
@@ -87,6 +92,162 @@ class TestHDFStoreTimeseriesManager(TestCoreDatabase):
             'test', '/df', t_start=index[0], t_end=index[10]).dataframe
         assert new_df['data'].tolist() == [float(x) for x in range(5)]
 
+    def test_hdfstore_timeseries_manager_process_lock_mode(self, tmpdir):
+        """Check process lock mode uses lock files"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 1, 2)
+        index = pd.date_range(t_start, t_end, freq='H', closed='left')
+
+        with pytest.raises(ValueError):
+            HDFStoreTimeseriesMgr(str(tmpdir), lock_mode='dummy')
+
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), lock_mode='process')
+        # Reading or deleting missing timeseries creates no file
+        assert mgr.get('test', 'df').dataframe.empty
+        assert mgr.stats('test', 'df') == {'count': 0}
+        mgr.delete('test', 'df', t_start, t_end)
+        assert tmpdir.listdir() == []
+        ts = Timeseries(index=index, data=np.random.rand(len(index)))
+        mgr.set('test', 'df', ts)
+        assert (tmpdir / 'test' / 'df.hdf5.lock').exists()
+        df = mgr.get('test', 'df', t_start=t_start, t_end=t_end).dataframe
+        assert df['data'].equals(ts.dataframe['data'])
+        mgr.delete('test', 'df', t_start, t_end)
+        assert mgr.get('test', 'df').dataframe.empty
+
+    def test_hdfstore_timeseries_manager_compression(self, tmpdir):
+        """Check compression is configurable by site"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 2), freq='H',
+            closed='left')
+        ts = Timeseries(index=index, data=np.random.rand(len(index)))
+
+        for kwargs in (
+                {'complib': 'dummy'},
+                {'complevel': 10},
+                {'site_compression': {'test': ('blosc:dummy', 5)}},
+        ):
+            with pytest.raises(ValueError):
+                HDFStoreTimeseriesMgr(str(tmpdir), **kwargs)
+
+        def filters(mgr, site):
+            with pd.HDFStore(mgr.file_path(site, 'df'), mode='r') as store:
+                filters = store.get_storer('df').table.filters
+                return filters.complib, filters.complevel
+
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir))
+        mgr.set('test_1', 'df', ts)
+        assert filters(mgr, 'test_1') == ('zlib', 9)
+
+        mgr = HDFStoreTimeseriesMgr(
+            str(tmpdir), complib='blosc:lz4', complevel=5,
+            site_compression={'test_3': ('blosc:zstd', 1)})
+        mgr.set('test_2', 'df', ts)
+        mgr.set('test_3', 'df', ts)
+        assert filters(mgr, 'test_2') == ('blosc:lz4', 5)
+        assert filters(mgr, 'test_3') == ('blosc:zstd', 1)
+        # Files written with another compression remain readable and
+        # writable
+        mgr.set('test_1', 'df', ts)
+        assert filters(mgr, 'test_1') == ('zlib', 9)
+        for site in ('test_1', 'test_2', 'test_3'):
+            df = mgr.get(site, 'df').dataframe
+            assert df['data'].equals(ts.dataframe['data'])
+
+    @pytest.mark.parametrize('partition', (None, 'month'))
+    def test_hdfstore_timeseries_manager_repack(self, tmpdir, partition):
+        """Check fragmented files are repacked"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 11), freq='min',
+            closed='left')
+
+        mgr = HDFStoreTimeseriesMgr(
+            str(tmpdir), partition=partition, rollups=True)
+        mgr.set(
+            'test', 'df', Timeseries(index=index, data=np.ones(len(index))))
+        assert mgr.removed_bytes() == {}
+        # Overwrite values, one day at a time
+        for day in range(10):
+            day_index = index[day * 1440:(day + 1) * 1440]
+            mgr.set('test', 'df', Timeseries(
+                index=day_index, data=np.random.rand(len(day_index))))
+        mgr.delete('test', 'df', index[0], index[1440])
+        removed = mgr.removed_bytes()
+        file_path = mgr._file_paths('test', 'df')[0]
+        assert list(removed.keys()) == [file_path]
+        # Raw data and rollups rows
+        assert removed[file_path] > 11 * 1440 * 8
+
+        df = mgr.get('test', 'df').dataframe
+        stats = mgr.stats('test', 'df')
+        old_size = Path(file_path).stat().st_size
+        assert mgr.repack(threshold=removed[file_path] + 1) == []
+        assert mgr.repack(threshold=removed[file_path]) == [file_path]
+        assert mgr.removed_bytes() == {}
+        assert Path(file_path).stat().st_size < old_size
+        # Values, stats and rollups are kept
+        assert mgr.get('test', 'df').dataframe.equals(df)
+        assert mgr.stats('test', 'df') == stats
+        resampled = mgr.resample('test', 'df', 'day', 'mean').dataframe
+        assert np.allclose(
+            resampled['data'], df['data'].resample('D').mean().dropna())
+        assert mgr.repack(threshold=0) == []
+
+        # Files modified by other managers are found by a scan
+        other_mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+        other_mgr.delete('test', 'df', index[1440], index[2880])
+        assert mgr.repack(threshold=0) == []
+        assert mgr.repack(threshold=0, scan=True) == [file_path]
+
+        # Background repack
+        other_mgr.delete('test', 'df', index[2880], index[4320])
+        mgr = HDFStoreTimeseriesMgr(
+            str(tmpdir), partition=partition, repack_threshold=0,
+            repack_interval=60)
+        mgr.stop_repacker()
+        assert mgr.removed_bytes() == {}
+        assert len(mgr.get('test', 'df').dataframe) == len(index) - 3 * 1440
+
+    def test_hdfstore_timeseries_manager_partitions(self, tmpdir):
+        """Check partitioned storage layout"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 4, 1)
+        index = pd.date_range(t_start, t_end, freq='H', closed='left')
+
+        with pytest.raises(ValueError):
+            HDFStoreTimeseriesMgr(str(tmpdir), partition='dummy')
+
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition='month')
+        ts = Timeseries(index=index, data=np.random.rand(len(index)))
+        mgr.set('test', '/df', ts)
+        series_dir = tmpdir / 'test' / 'df'
+        assert sorted(p.basename for p in series_dir.listdir()) == [
+            '2017-01.hdf5', '2017-02.hdf5', '2017-03.hdf5']
+
+        # Read straddling two partitions
+        t_1 = dt.datetime(2017, 1, 31, 22)
+        t_2 = dt.datetime(2017, 2, 1, 2)
+        assert [p for _, p in mgr._partitions('test', 'df', t_1, t_2)] == [
+            str(series_dir / '2017-01.hdf5'), str(series_dir / '2017-02.hdf5')]
+        df = mgr.get('test', 'df', t_start=t_1, t_end=t_2).dataframe
+        assert len(df) == 4
+
+        # Write in a single partition
+        mtimes = {p.basename: p.mtime() for p in series_dir.listdir()}
+        mgr.set('test', 'df', Timeseries(index=index[-2:], data=[1, 2]))
+        assert series_dir.join('2017-01.hdf5').mtime() == mtimes[
+            '2017-01.hdf5']
+        df = mgr.get('test', 'df', t_start=t_start, t_end=t_end).dataframe
+        assert len(df) == len(index)
+        assert df['data'].tolist()[-2:] == [1, 2]
+
+        # Delete a whole partition and part of another one
+        mgr.delete('test', 'df', dt.datetime(2017, 2, 1), t_end - index.freq)
+        assert sorted(p.basename for p in series_dir.listdir()) == [
+            '2017-01.hdf5', '2017-03.hdf5']
+        df = mgr.get('test', 'df').dataframe
+        assert len(df) == 31 * 24 + 1
+
     def test_hdfstore_timeseries_manager_persistance(self, tmpdir):
         """Ensure data is persistance accross manager instances"""
 
@@ -109,13 +270,14 @@ class TestHDFStoreTimeseriesManager(TestCoreDatabase):
         df = mgr.get('test', '/df', t_start=t_start, t_end=t_end).dataframe
         assert len(df) == 60 * 24
 
-    def test_hdfstore_timeseries_manager_get_bounds(self, tmpdir):
+    @pytest.mark.parametrize('partition', (None, 'month', 'year'))
+    def test_hdfstore_timeseries_manager_get_bounds(self, tmpdir, partition):
         """Test get optional time bounds"""
         t_start = dt.datetime(2017, 1, 1)
         t_end = dt.datetime(2017, 1, 2)
         index = pd.date_range(t_start, t_end, freq='min', closed='left')
 
-        mgr = HDFStoreTimeseriesMgr(str(tmpdir))
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
         ts = Timeseries(index=index, data=np.random.rand(len(index)))
         mgr.set('test', '/df', ts)
         df = ts.dataframe
@@ -136,7 +298,9 @@ class TestHDFStoreTimeseriesManager(TestCoreDatabase):
         assert new_df['data'].equals(df['data'])
         assert new_df.index.equals(df.index)
 
-    def test_hdfstore_timeseries_manager_datetime_awareness(self, tmpdir):
+    @pytest.mark.parametrize('partition', (None, 'month', 'year'))
+    def test_hdfstore_timeseries_manager_datetime_awareness(
+            self, tmpdir, partition):
         """Check behavior with regard to datetime awareness"""
 
         # To test for awareness, see https://stackoverflow.com/a/27596917
@@ -162,7 +326,7 @@ class TestHDFStoreTimeseriesManager(TestCoreDatabase):
             index=index_a, data=np.random.rand(len(index_a)),
             update_ts=index_a)
 
-        mgr = HDFStoreTimeseriesMgr(str(tmpdir))
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
 
         # Naive index dataframe
         mgr.set('test', '/df_n', ts_n)
@@ -185,7 +349,39 @@ class TestHDFStoreTimeseriesManager(TestCoreDatabase):
         assert isaware(ts_0)
         assert isaware(ts_1)
 
-    def test_hdfstore_timeseries_manager_sorted(self, tmpdir):
+    @pytest.mark.parametrize('partition', (None, 'month', 'year'))
+    def test_hdfstore_timeseries_manager_upsert(self, tmpdir, partition):
+        """Check set only replaces rows with same timestamps"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 1, 2)
+        index = pd.date_range(t_start, t_end, freq='H', closed='left')
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+
+        mgr.set('test', 'df', Timeseries(index=index[:12], data=range(12)))
+        # Append only
+        mgr.set('test', 'df', Timeseries(
+            index=index[12:], data=range(12, 24)))
+        df = mgr.get('test', 'df').dataframe
+        assert df['data'].tolist() == list(range(24))
+
+        # Overwrite some values in the middle. Values in new data time range
+        # but not in new data are kept.
+        mgr.set('test', 'df', Timeseries(
+            index=index[[2, 5, 9]], data=[-2, -5, -9]))
+        df = mgr.get('test', 'df').dataframe
+        expected = list(range(24))
+        expected[2], expected[5], expected[9] = -2, -5, -9
+        assert df['data'].tolist() == expected
+
+        # New timestamps inside stored time range, no overlap
+        index_30 = index + dt.timedelta(minutes=30)
+        mgr.set('test', 'df', Timeseries(index=index_30[3:5], data=[0, 0]))
+        df = mgr.get('test', 'df').dataframe
+        assert len(df) == 26
+        assert df.index.is_monotonic_increasing
+
+    @pytest.mark.parametrize('partition', (None, 'month', 'year'))
+    def test_hdfstore_timeseries_manager_sorted(self, tmpdir, partition):
         """Check hdfstore returns a sorted index dataframe"""
         t_start1 = dt.datetime(2017, 1, 1)
         t_end1 = dt.datetime(2017, 1, 6)
@@ -196,19 +392,460 @@ class TestHDFStoreTimeseriesManager(TestCoreDatabase):
         df1 = pd.DataFrame({'data': range(len(index1))}, index=index1)
         df2 = pd.DataFrame({'data': range(len(index2))}, index=index2)
 
-        mgr = HDFStoreTimeseriesMgr(str(tmpdir))
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
         mgr.set('test', 'df', Timeseries.from_dataframe(df1))
         mgr.set('test', 'df', Timeseries.from_dataframe(df2))
         ts_out = mgr.get('test', 'df', t_start=t_start1, t_end=t_end1)
         assert ts_out.dataframe.index.equals(index1)
 
+    @pytest.mark.parametrize('partition', (None, 'month', 'year'))
+    def test_hdfstore_timeseries_manager_stats(self, tmpdir, partition):
+        """Check stats are maintained on set/delete"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 3, 1), freq='D',
+            closed='left')
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+        assert mgr.stats('test', 'df') == {'count': 0}
+
+        ts = Timeseries(index=index[10:], data=range(49), update_ts=index[10:])
+        mgr.set('test', 'df', ts, set_update_ts=False)
+        assert mgr.stats('test', 'df') == {
+            'count': 49, 'start': index[10], 'end': index[-1],
+            'update_ts': index[-1]}
+
+        # Overlapping set
+        ts = Timeseries(index=index[:20], data=range(20), update_ts=index[:20])
+        mgr.set('test', 'df', ts, set_update_ts=False)
+        assert mgr.stats('test', 'df') == {
+            'count': 59, 'start': index[0], 'end': index[-1],
+            'update_ts': index[-1]}
+
+        # Stats are read from metadata
+        for file_path in mgr._file_paths('test', 'df'):
+            with pd.HDFStore(file_path, mode='r') as store:
+                assert store.get_storer('df').attrs.bemserver_stats
+
+        # Delete invalidates stats, which are computed again
+        mgr.delete('test', 'df', index[50], index[-1] + dt.timedelta(1))
+        assert mgr.stats('test', 'df') == {
+            'count': 50, 'start': index[0], 'end': index[49],
+            'update_ts': index[49]}
+        assert mgr.stats('test', 'df') == mgr.get('test', 'df').stats()
+
+    @pytest.mark.parametrize('partition', (None, 'month', 'year'))
+    def test_hdfstore_timeseries_manager_last(self, tmpdir, partition):
+        """Check latest value is maintained on set/delete"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 3, 1), freq='D',
+            closed='left')
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+        assert mgr.last('test', 'df').dataframe.empty
+
+        def check_last(position, value):
+            df = mgr.last('test', 'df').dataframe
+            assert df.index.tolist() == [index[position]]
+            assert df['data'].tolist() == [value]
+            assert df['quality'].tolist() == [1]
+            assert df['update_ts'].tolist() == [index[position]]
+
+        # Values are not written in time order
+        ts = Timeseries(
+            index=index[[10, 30, 20]], data=[10, 30, 20],
+            update_ts=index[[10, 30, 20]])
+        mgr.set('test', 'df', ts, set_update_ts=False)
+        check_last(30, 30)
+
+        # Older values don't change latest value, newer values do
+        ts = Timeseries(index=index[:5], data=range(5), update_ts=index[:5])
+        mgr.set('test', 'df', ts, set_update_ts=False)
+        check_last(30, 30)
+        ts = Timeseries(
+            index=index[30:41], data=range(11), update_ts=index[30:41])
+        mgr.set('test', 'df', ts, set_update_ts=False)
+        check_last(40, 10)
+
+        # Latest value is read from metadata
+        with pd.HDFStore(
+                mgr._file_paths('test', 'df')[-1], mode='r') as store:
+            assert store.get_storer('df').attrs.bemserver_last
+
+        # Delete invalidates latest value, which is found again
+        mgr.delete('test', 'df', index[35], index[-1])
+        check_last(34, 4)
+        mgr.delete('test', 'df', index[0], index[-1])
+        assert mgr.last('test', 'df').dataframe.empty
+
+    @pytest.mark.parametrize('partition', (None, 'month'))
+    def test_hdfstore_timeseries_manager_rollups(self, tmpdir, partition):
+        """Check resampling from rollups gives same results as raw data"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 3, 1)
+        index = pd.date_range(t_start, t_end, freq='10min', closed='left')
+        data = np.random.rand(len(index))
+        data[::7] = np.NaN
+        quality = np.random.rand(len(index))
+        quality[::5] = np.NaN
+        ts = Timeseries(
+            index=index, data=data, quality=quality, update_ts=index)
+
+        mgr = HDFStoreTimeseriesMgr(
+            str(tmpdir), partition=partition, rollups=True)
+        raw_mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+
+        def check_resample(freq, operation, t_start=None, t_end=None):
+            rs_ts = mgr.resample(
+                'test', 'df', freq, operation, t_start=t_start, t_end=t_end)
+            raw_ts = raw_mgr.get('test', 'df', t_start=t_start, t_end=t_end)
+            raw_ts.resample(freq, operation)
+            rs_df, raw_df = rs_ts.dataframe, raw_ts.dataframe
+            assert rs_df.index.equals(raw_df.index)
+            for col in ('data', 'quality'):
+                assert np.allclose(rs_df[col], raw_df[col])
+            assert rs_df['update_ts'].equals(raw_df['update_ts'])
+
+        # Write in several batches, with overlap
+        mgr.set('test', 'df', Timeseries.from_dataframe(
+            ts.dataframe[:5000]), set_update_ts=False)
+        mgr.set('test', 'df', Timeseries.from_dataframe(
+            ts.dataframe[4000:]), set_update_ts=False)
+        mgr.set('test', 'df', Timeseries(
+            index=index[100:110], data=np.full(10, 42.), update_ts=index[:10]
+        ), set_update_ts=False)
+        for freq in ('hour', '6hour', 'day', 'month', 'year'):
+            for operation in Timeseries.AGG_OPERATIONS:
+                check_resample(freq, operation)
+        check_resample('day', 'mean', index[144], index[-144])
+        check_resample('month', 'sum', t_start, t_end)
+
+        # Delete
+        mgr.delete('test', 'df', index[1000], index[1500])
+        check_resample('hour', 'mean')
+        check_resample('month', 'max', t_start, t_end)
+
+        # Rollups are used
+        for file_path in mgr._file_paths('test', 'df'):
+            with pd.HDFStore(file_path, mode='r') as store:
+                assert '/_rollups/hour/df' in store
+                assert '/_rollups/month/df' in store
+        assert mgr._read_rollups('test', 'df', 'day') is not None
+
+        # Unaligned bounds: raw data is used
+        check_resample('day', 'sum', index[1], index[-1])
+
+        # Writing with rollups disabled: raw data is used until rebuilt
+        raw_mgr.set('test', 'df', Timeseries(
+            index=index[:3], data=[1, 2, 3], update_ts=index[-3:]),
+            set_update_ts=False)
+        assert mgr._read_rollups('test', 'df', 'day') is None
+        check_resample('day', 'sum')
+        mgr.build_rollups('test', 'df')
+        assert mgr._read_rollups('test', 'df', 'day') is not None
+        check_resample('day', 'sum')
+
+    def test_hdfstore_timeseries_manager_iter_get(self, tmpdir):
+        """Check values are read by chunks of consecutive time windows"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 1, 2)
+        index = pd.date_range(t_start, t_end, freq='min', closed='left')
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir))
+        assert list(mgr.iter_get('test', 'df')) == []
+
+        mgr.set('test', 'df', Timeseries(index=index, data=range(1440)))
+        chunks = list(mgr.iter_get('test', 'df', chunksize=100))
+        assert 10 < len(chunks) < 20
+        assert all(len(chunk.dataframe) <= 101 for chunk in chunks)
+        df = pd.concat([chunk.dataframe for chunk in chunks])
+        assert df.index.equals(index)
+
+        chunks = list(mgr.iter_get(
+            'test', 'df', t_start=index[10], t_end=index[-10], chunksize=100))
+        df = pd.concat([chunk.dataframe for chunk in chunks])
+        assert df.index.equals(index[10:-10])
+
+    @pytest.mark.parametrize('partition', (None, 'month'))
+    def test_hdfstore_timeseries_manager_resample_chunks(
+            self, tmpdir, partition):
+        """Check resampling by chunks gives same results as raw data"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 3, 1)
+        index = pd.date_range(t_start, t_end, freq='10min', closed='left')
+        data = np.random.rand(len(index))
+        data[::7] = np.NaN
+        ts = Timeseries(index=index, data=data, update_ts=index)
+
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+        assert list(mgr.iter_chunks('test', 'df')) == []
+        assert mgr.resample('test', 'df', 'day', 'sum').dataframe.empty
+
+        # Values are not sorted in storage
+        mgr.set('test', 'df', Timeseries.from_dataframe(
+            ts.dataframe[4000:]), set_update_ts=False)
+        mgr.set('test', 'df', Timeseries.from_dataframe(
+            ts.dataframe[:5000]), set_update_ts=False)
+        chunks = list(mgr.iter_chunks('test', 'df', chunksize=1000))
+        assert len(chunks) > len(index) // 1000
+        assert all(len(chunk) <= 1000 for chunk in chunks)
+        assert len(pd.concat(chunks)) == len(index)
+
+        def check_resample(freq, operation, t_start=None, t_end=None):
+            rs_ts = resample_chunks(
+                mgr.iter_chunks(
+                    'test', 'df', t_start=t_start, t_end=t_end,
+                    chunksize=1000),
+                freq, operation)
+            raw_ts = mgr.get('test', 'df', t_start=t_start, t_end=t_end)
+            raw_ts.resample(freq, operation)
+            rs_df, raw_df = rs_ts.dataframe, raw_ts.dataframe
+            assert rs_df.index.equals(raw_df.index)
+            for col in ('data', 'quality'):
+                assert np.allclose(rs_df[col], raw_df[col])
+            assert rs_df['update_ts'].equals(raw_df['update_ts'])
+
+        for freq in ('30min', 'hour', 'day', 'week', 'month', 'year'):
+            for operation in Timeseries.AGG_OPERATIONS:
+                check_resample(freq, operation)
+        check_resample('day', 'mean', index[100], index[-100])
+        # Manager resamples by chunks
+        rs_df = mgr.resample(
+            'test', 'df', 'week', 'max', t_start=index[1]).dataframe
+        raw_ts = mgr.get('test', 'df', t_start=index[1])
+        raw_ts.resample('week', 'max')
+        assert rs_df['data'].equals(raw_ts.dataframe['data'])
+
+    @pytest.mark.parametrize('partition', (None, 'month'))
+    def test_hdfstore_timeseries_manager_get_many(self, tmpdir, partition):
+        """Check several timeseries are read at once"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 3, 1), freq='D',
+            closed='left')
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+        assert mgr.get_many([]) == []
+        for idx in range(10):
+            mgr.set('test', 'ts_{}'.format(idx), Timeseries(
+                index=index, data=np.full(len(index), idx)))
+
+        pairs = [('test', 'ts_{}'.format(idx)) for idx in (3, 1, 3, 9)]
+        pairs.append(('test', 'dummy'))
+        ts_list = mgr.get_many(
+            pairs, t_start=index[10], t_end=index[40], max_workers=3)
+        assert len(ts_list) == 5
+        for idx, ts_obj in zip((3, 1, 3, 9), ts_list):
+            assert ts_obj.dataframe.index.equals(index[10:40])
+            assert (ts_obj.dataframe['data'] == idx).all()
+        assert ts_list[4].dataframe.empty
+
+        # PyTables calls are serialized: read sequentially by default
+        assert mgr.max_read_workers == 1
+        ts_list_seq = mgr.get_many(pairs, t_start=index[10], t_end=index[40])
+        for ts_obj, ts_obj_seq in zip(ts_list, ts_list_seq):
+            assert ts_obj_seq.dataframe.equals(ts_obj.dataframe)
+
+    @pytest.mark.parametrize('partition', (None, 'month'))
+    def test_hdfstore_timeseries_manager_set_many(self, tmpdir, partition):
+        """Check several timeseries are written at once"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 3, 1), freq='D',
+            closed='left')
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+        assert mgr.set_many([]) == []
+        mgr.set('test', 'ts_0', Timeseries(
+            index=index, data=np.zeros(len(index))))
+
+        HDF_LOCKS.stats.reset()
+        exceptions = mgr.set_many([
+            ('test', 'ts_0', Timeseries(
+                index=index[10:40], data=np.ones(30))),
+            ('test', 'ts_1', Timeseries(index=index, data=range(59))),
+            ('test', 'ts_2', Timeseries()),
+            ('test', 'ts_3', 'dummy Timeseries'),
+        ], max_workers=3)
+        assert exceptions[:3] == [None, None, None]
+        assert isinstance(exceptions[3], AttributeError)
+        # One lock per file
+        nb_files = 2 if partition is None else 4
+        assert mgr.lock_wait_stats()['write']['count'] == nb_files
+
+        ts_obj = mgr.get('test', 'ts_0')
+        assert ts_obj.dataframe.index.equals(index)
+        assert (ts_obj.dataframe['data'][10:40] == 1).all()
+        assert (ts_obj.dataframe['data'][:10] == 0).all()
+        assert mgr.stats('test', 'ts_0')['count'] == 59
+        ts_obj = mgr.get('test', 'ts_1')
+        assert ts_obj.dataframe.index.equals(index)
+        assert ts_obj.dataframe['data'].tolist() == list(range(59))
+        assert mgr.get('test', 'ts_2').dataframe.empty
+
+    @pytest.mark.parametrize('partition', (None, 'month'))
+    def test_hdfstore_timeseries_manager_concurrency(self, tmpdir, partition):
+        """Check concurrent reads and writes of several files"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 3, 1), freq='H',
+            closed='left')
+        # One batch per day, each written in a single file
+        batches = np.split(np.arange(len(index)), len(index) // 24)
+        ts_ids = ['ts_{}'.format(idx) for idx in range(4)]
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+        done = threading.Event()
+        errors = []
+
+        def write(ts_id):
+            try:
+                for batch in batches:
+                    mgr.set('test', ts_id, Timeseries(
+                        index=index[batch], data=batch))
+            except Exception as exc:
+                errors.append(exc)
+
+        def read(ts_id, chunks):
+            try:
+                while not done.is_set():
+                    if chunks:
+                        values = [
+                            val for chunk in mgr.iter_chunks(
+                                'test', ts_id, chunksize=100)
+                            for val in chunk['data']]
+                    else:
+                        values = mgr.get(
+                            'test', ts_id).dataframe['data'].tolist()
+                    # Batches are read entirely or not at all
+                    counts = pd.Series(values).floordiv(24).value_counts()
+                    assert (counts == 24).all()
+                    assert len(set(values)) == len(values)
+            except Exception as exc:
+                errors.append(exc)
+
+        writers = [
+            threading.Thread(target=write, args=(ts_id, ))
+            for ts_id in ts_ids]
+        readers = [
+            threading.Thread(target=read, args=(ts_id, chunks))
+            for ts_id in ts_ids for chunks in (False, True)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+        assert errors == []
+
+        for ts_id in ts_ids:
+            df = mgr.get('test', ts_id).dataframe
+            assert df.index.equals(index)
+            assert df['data'].tolist() == list(range(len(index)))
+        # Locks of idle files are dropped
+        assert len(HDF_LOCKS) == 0
+
+    @pytest.mark.parametrize('partition', (None, 'month'))
+    def test_hdfstore_timeseries_manager_tail(self, tmpdir, partition):
+        """Check recent values are kept in memory"""
+        now = dt.datetime.utcnow().replace(microsecond=0)
+        index = pd.date_range(
+            now - dt.timedelta(days=3), now, freq='H', closed='left')
+        with pytest.raises(ValueError):
+            HDFStoreTimeseriesMgr(
+                str(tmpdir), lock_mode='process', tail_window=3600)
+        mgr = HDFStoreTimeseriesMgr(
+            str(tmpdir), partition=partition, tail_window=24 * 3600,
+            tail_max_series=2)
+        ref = HDFStoreTimeseriesMgr(str(tmpdir), partition=partition)
+        recent = {'t_start': now - dt.timedelta(hours=12)}
+
+        # Tail is loaded from files on first read, not on first write
+        ref.set('test', 'ts', Timeseries(index=index, data=range(72)))
+        HDF_LOCKS.stats.reset()
+        mgr.set('test', 'ts', Timeseries(
+            index=index[-2:], data=np.array([100, 101])))
+        assert mgr.lock_wait_stats()['read']['count'] == 0
+        ts_obj = mgr.get('test', 'ts', **recent)
+        assert mgr.lock_wait_stats()['read']['count'] > 0
+        HDF_LOCKS.stats.reset()
+        ts_obj = mgr.get('test', 'ts', **recent)
+        assert mgr.lock_wait_stats()['read']['count'] == 0
+        ref_df = ref.get('test', 'ts', **recent).dataframe
+        assert ts_obj.dataframe[['data', 'quality']].equals(
+            ref_df[['data', 'quality']])
+        assert ts_obj.dataframe['data'].tolist()[-3:] == [69, 100, 101]
+        # Older values are read from files
+        ts_obj = mgr.get('test', 'ts', t_start=index[0], t_end=index[10])
+        assert mgr.lock_wait_stats()['read']['count'] > 0
+        assert ts_obj.dataframe['data'].tolist() == list(range(10))
+
+        # Tail is updated by writes and deletes
+        mgr.set('test', 'ts', Timeseries(
+            index=index[-5:-4], data=np.array([42])))
+        mgr.delete('test', 'ts', index[-2], now)
+        HDF_LOCKS.stats.reset()
+        ts_obj = mgr.get('test', 'ts', **recent)
+        assert mgr.lock_wait_stats()['read']['count'] == 0
+        ref_df = ref.get('test', 'ts', **recent).dataframe
+        assert ts_obj.dataframe[['data', 'quality']].equals(
+            ref_df[['data', 'quality']])
+        assert ts_obj.dataframe['data'].tolist()[-3:] == [42, 68, 69]
+        assert len(mgr.get('test', 'ts', t_start=index[-3]).dataframe) == 1
+
+        # Least recently used tails are dropped
+        for ts_id in ('ts_1', 'ts_2'):
+            mgr.set('test', ts_id, Timeseries(
+                index=index[-2:], data=np.array([0, 1])))
+        HDF_LOCKS.stats.reset()
+        mgr.get('test', 'ts', **recent)
+        assert mgr.lock_wait_stats()['read']['count'] == 1
+        # Tail is loaded once
+        mgr.get('test', 'ts_2', **recent)
+        mgr.get('test', 'ts_2', **recent)
+        assert mgr.lock_wait_stats()['read']['count'] == 2
+
+        # Latest value is read from tail
+        HDF_LOCKS.stats.reset()
+        assert mgr.last('test', 'ts_2').dataframe['data'].tolist() == [1]
+        assert mgr.lock_wait_stats()['read']['count'] == 0
+
+        # Bulk writes update tails
+        mgr.set_many([
+            ('test', 'ts_1', Timeseries(
+                index=index[-1:], data=np.array([2]))),
+            ('test', 'ts_2', Timeseries(
+                index=index[-1:], data=np.array([3]))),
+        ])
+        assert mgr.get('test', 'ts_1', **recent).dataframe[
+            'data'].tolist() == [0, 2]
+        HDF_LOCKS.stats.reset()
+        assert mgr.get('test', 'ts_1', **recent).dataframe[
+            'data'].tolist() == [0, 2]
+        assert mgr.get('test', 'ts_2', **recent).dataframe[
+            'data'].tolist() == [0, 3]
+        assert mgr.lock_wait_stats()['read']['count'] == 0
+
+        # Tail locks are only kept while in use
+        assert mgr._tail_locks == {}
+
     def test_hdfstore_timeseries_manager_exception(self, tmpdir):
         """Check hdfstore exceptions are not ignored"""
         mgr = HDFStoreTimeseriesMgr(str(tmpdir))
         with pytest.raises(AttributeError):
             mgr.set('test', 'df', 'dummy Timeseries')
         # Check lock was released
-        assert not HDF_LOCK.locked()
+        assert not HDF_LOCKS.get(mgr.file_path('test', 'df')).locked()
+
+    def test_hdfstore_timeseries_manager_lock_wait_stats(self, tmpdir):
+        """Check lock acquisitions are counted"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 1, 2)
+        index = pd.date_range(t_start, t_end, freq='H', closed='left')
+        mgr = HDFStoreTimeseriesMgr(str(tmpdir))
+
+        HDF_LOCKS.stats.reset()
+        mgr.set('test', 'df', Timeseries(index=index, data=range(24)))
+        mgr.get('test', 'df')
+        mgr.get('test', 'df')
+        stats = mgr.lock_wait_stats()
+        assert stats['write']['count'] == 1
+        assert stats['read']['count'] == 2
+        assert stats['read']['wait_time'] >= 0
+        # Each PyTables call (or short sequence of calls) acquires the lock
+        assert stats['pytables']['count'] > 3
+        assert stats['pytables']['wait_time'] >= 0
 
     def test_hdfstore_timeseries_manager_quality_defaults_to_1(self, tmpdir):
         """Check quality read as NaN in DB is changed into 1
@@ -237,3 +874,217 @@ class TestHDFStoreTimeseriesManager(TestCoreDatabase):
         mgr.set('test', '/df', ts)
         df = mgr.get('test', '/df').dataframe
         assert (df.quality == 1).all()
+
+
+class TestParquetTimeseriesManager(TestCoreDatabase):
+    """Tests for Parquet timeseries manager"""
+
+    @pytest.mark.parametrize('partition', ('month', 'year'))
+    def test_parquet_timeseries_manager(self, tmpdir, partition):
+
+        t_before_start = dt.datetime(2016, 12, 1)
+        t_start = dt.datetime(2017, 1, 1)
+        t_inside_1 = dt.datetime(2017, 1, 1, 8, 12, 42)
+        t_inside_2 = dt.datetime(2017, 1, 1, 16, 42, 12)
+        t_end = dt.datetime(2017, 1, 2)
+        index = pd.date_range(t_start, t_end, freq='min', closed='left')
+
+        with pytest.raises(ValueError):
+            ParquetTimeseriesMgr(str(tmpdir), partition=None)
+        with pytest.raises(ValueError):
+            ParquetTimeseriesMgr(str(tmpdir), compression='dummy')
+
+        mgr = ParquetTimeseriesMgr(
+            str(tmpdir), partition=partition, row_group_size=100)
+
+        # Get unknown timestore ID
+        df = mgr.get('test', 'dummy', t_start=t_start, t_end=t_end).dataframe
+        assert df.empty
+
+        ts = Timeseries(
+            index=index, data=np.random.rand(len(index)),
+            quality=np.random.rand(len(index)), update_ts=index)
+        mgr.set('test', '/df', ts)
+        df = ts.dataframe
+
+        new_df = mgr.get('test', '/df', t_start=t_start, t_end=t_end).dataframe
+        assert new_df['data'].equals(df['data'])
+        assert new_df['quality'].equals(df['quality'])
+        assert new_df.index.equals(df.index)
+        new_df = mgr.get('test', '/df').dataframe
+        assert new_df.index.equals(df.index)
+
+        # Out of bounds, sub-timerange, straddling a bound
+        new_df = mgr.get(
+            'test', '/df', t_start=t_before_start, t_end=t_start).dataframe
+        assert new_df.empty
+        new_df = mgr.get(
+            'test', '/df', t_start=t_inside_1, t_end=t_inside_2).dataframe
+        assert len(new_df) == 510
+        new_df = mgr.get(
+            'test', '/df', t_start=t_before_start, t_end=t_inside_1
+        ).dataframe
+        assert len(new_df) == 493
+
+        # Override some values
+        ts = Timeseries(
+            index=index[:5], data=np.arange(5, dtype='float'),
+            quality=np.random.rand(5), update_ts=index[:5])
+        mgr.set('test', '/df', ts)
+        new_df = mgr.get('test', '/df', t_start=t_start, t_end=t_end).dataframe
+        assert len(new_df) == 1440
+        new_df = mgr.get(
+            'test', '/df', t_start=index[0], t_end=index[5]).dataframe
+        assert new_df['data'].tolist() == [float(x) for x in range(5)]
+
+        # Delete values
+        mgr.delete('test', '/df', index[5], index[10])
+        new_df = mgr.get('test', '/df', t_start=t_start, t_end=t_end).dataframe
+        assert len(new_df) == 1435
+        new_df = mgr.get(
+            'test', '/df', t_start=index[0], t_end=index[10]).dataframe
+        assert new_df['data'].tolist() == [float(x) for x in range(5)]
+
+        # Delete whole partition
+        mgr.delete('test', '/df', t_before_start, dt.datetime(2018, 1, 1))
+        assert mgr.get('test', '/df').dataframe.empty
+        assert not (tmpdir / 'test' / 'df').listdir()
+
+    def test_parquet_timeseries_manager_row_groups(self, tmpdir):
+        """Check only row groups overlapping time range are read"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 1, 2)
+        index = pd.date_range(t_start, t_end, freq='min', closed='left')
+
+        mgr = ParquetTimeseriesMgr(str(tmpdir), row_group_size=100)
+        # Write unsorted data: rows are sorted when written
+        ts = Timeseries(index=index[::-1], data=range(len(index)))
+        mgr.set('test', 'df', ts)
+
+        file_path = mgr.partition_file_path(
+            'test', 'df', pd.Period('2017-01', freq='M'))
+        table = mgr._read(file_path)
+        assert table.num_rows == 1440
+        table = mgr._read(file_path, index[150], index[250])
+        assert table.num_rows == 200
+        table = mgr._read(file_path, index[150], index[151])
+        assert table.num_rows == 100
+
+        df = mgr.get('test', 'df', t_start=index[150], t_end=index[250]
+                     ).dataframe
+        assert df.index.equals(index[150:250])
+
+    def test_parquet_timeseries_manager_datetime_awareness(self, tmpdir):
+        """Check aware datetimes are stored as naive UTC"""
+        t_start = dt.datetime(2017, 1, 1, tzinfo=pytz.UTC)
+        t_end = dt.datetime(2017, 1, 2, tzinfo=pytz.UTC)
+        index = pd.date_range(t_start, t_end, freq='H', closed='left')
+
+        mgr = ParquetTimeseriesMgr(str(tmpdir))
+        mgr.set('test', 'df', Timeseries(index=index, data=range(24)))
+        df = mgr.get('test', 'df', t_start=t_start, t_end=t_end).dataframe
+        assert df.index.equals(index.tz_convert(None))
+        df = mgr.get(
+            'test', 'df', t_start=t_start.replace(tzinfo=None),
+            t_end=t_end.replace(tzinfo=None)).dataframe
+        assert len(df) == 24
+
+    def test_parquet_timeseries_manager_keep_update_ts(self, tmpdir):
+        """Check update timestamps can be kept"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 1, 2)
+        index = pd.date_range(t_start, t_end, freq='H', closed='left')
+
+        mgr = ParquetTimeseriesMgr(str(tmpdir))
+        ts = Timeseries(index=index, data=range(24), update_ts=index)
+        mgr.set('test', 'df', ts, set_update_ts=False)
+        df = mgr.get('test', 'df').dataframe
+        assert df['update_ts'].tolist() == index.tolist()
+        mgr.set('test', 'df', ts)
+        df = mgr.get('test', 'df').dataframe
+        assert (df['update_ts'] > index[-1]).all()
+
+    def test_parquet_timeseries_manager_stats(self, tmpdir):
+        """Check stats are read from file metadata"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 3, 1), freq='H',
+            closed='left')
+        mgr = ParquetTimeseriesMgr(str(tmpdir), row_group_size=100)
+        assert mgr.stats('test', 'df') == {'count': 0}
+
+        ts = Timeseries(index=index, data=range(len(index)), update_ts=index)
+        mgr.set('test', 'df', ts, set_update_ts=False)
+        assert mgr.stats('test', 'df') == {
+            'count': len(index), 'start': index[0], 'end': index[-1],
+            'update_ts': index[-1]}
+
+        # Latest value
+        df = mgr.last('test', 'df').dataframe
+        assert df.index.tolist() == [index[-1]]
+        assert df['data'].tolist() == [len(index) - 1]
+
+        # Null update timestamps
+        mgr.set('test', 'other', Timeseries(index=index, data=index.hour),
+                set_update_ts=False)
+        stats = mgr.stats('test', 'other')
+        assert stats['count'] == len(index)
+        assert stats['update_ts'] is pd.NaT
+
+    def test_parquet_timeseries_manager_sub_microsecond(self, tmpdir):
+        """Check sub-microsecond timestamps are rejected, not truncated"""
+        index = pd.DatetimeIndex([
+            dt.datetime(2017, 1, 1), pd.Timestamp('2017-01-01 00:00:01.5')])
+        mgr = ParquetTimeseriesMgr(str(tmpdir))
+        mgr.set('test', 'df', Timeseries(index=index, data=[1., 2.]))
+
+        index_ns = pd.DatetimeIndex([pd.Timestamp(2017, 1, 1, nanosecond=1)])
+        with pytest.raises(ValueError):
+            mgr.set('test', 'df', Timeseries(index=index_ns, data=[3.]))
+        update_ts = index + pd.Timedelta(1, 'ns')
+        with pytest.raises(ValueError):
+            mgr.set('test', 'df', Timeseries(
+                index=index, data=[3., 4.], update_ts=update_ts),
+                set_update_ts=False)
+        # Stored data is unchanged
+        df = mgr.get('test', 'df').dataframe
+        assert df.index.equals(index)
+        assert df['data'].tolist() == [1., 2.]
+        assert not list((tmpdir / 'test' / 'df').visit('*.tmp'))
+
+    @pytest.mark.parametrize('partition', ('month', 'year'))
+    def test_parquet_timeseries_manager_hdfstore_parity(
+            self, tmpdir, partition):
+        """Check Parquet and HDFStore managers return the same data"""
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 3, 1)
+        index = pd.date_range(t_start, t_end, freq='H', closed='left')
+        quality = np.random.rand(len(index))
+        quality[::3] = np.nan
+        ts = Timeseries(
+            index=index, data=np.random.rand(len(index)), quality=quality,
+            update_ts=index)
+        update_ts = index[:48] + pd.Timedelta(1, 'D')
+        upsert_ts = Timeseries(
+            index=index[:48], data=np.arange(48, dtype='float'),
+            quality=np.full(48, np.nan), update_ts=update_ts)
+
+        mgrs = (
+            HDFStoreTimeseriesMgr(str(tmpdir / 'hdf'), partition=partition),
+            ParquetTimeseriesMgr(str(tmpdir / 'pq'), partition=partition),
+        )
+        for mgr in mgrs:
+            mgr.set('test', 'df', ts, set_update_ts=False)
+            mgr.set('test', 'df', upsert_ts, set_update_ts=False)
+            mgr.delete('test', 'df', index[100], index[200])
+
+        hdf_mgr, pq_mgr = mgrs
+        for bounds in (
+                {}, {'t_start': index[10], 't_end': index[150]},
+                {'t_start': dt.datetime(2017, 2, 1)}):
+            hdf_df = hdf_mgr.get('test', 'df', **bounds).dataframe
+            pq_df = pq_mgr.get('test', 'df', **bounds).dataframe
+            assert not pq_df['quality'].isnull().any()
+            assert pq_df.index.equals(hdf_df.index)
+            for col in hdf_df.columns:
+                assert pq_df[col].equals(hdf_df[col])
+        assert pq_mgr.stats('test', 'df') == hdf_mgr.stats('test', 'df')
@@ -0,0 +1,286 @@
+"""Tests on write-ahead log buffered timeseries manager"""
+
+import datetime as dt
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bemserver.models import Timeseries
+from bemserver.database.timeseries.hdfstore import HDFStoreTimeseriesMgr
+from bemserver.database.timeseries.wal import (
+    WriteAheadLog, BufferedTimeseriesMgr, logger)
+
+from tests import TestCoreDatabase
+
+
+class TestWriteAheadLog(TestCoreDatabase):
+    """Tests for write-ahead log"""
+
+    def test_write_ahead_log(self, tmpdir):
+
+        wal = WriteAheadLog(str(tmpdir))
+        assert wal.segments() == []
+        assert wal.append('a') == 0
+        assert wal.append('b') == 0
+        assert wal.rotate() == 0
+        assert wal.append('c') == 1
+        # Several records are flushed at once
+        with mock.patch('os.fsync') as fsync_mock:
+            assert wal.append_many(['e', 'f']) == 1
+        assert fsync_mock.call_count == 1
+        wal.close()
+        assert wal.segments() == [0, 1]
+        assert list(wal.read(0)) == ['a', 'b']
+        assert list(wal.read(1)) == ['c', 'e', 'f']
+
+        # Truncated record is ignored
+        with open(str(wal.segment_path(1)), 'ab') as segment_file:
+            segment_file.write(b'\x00\x00\x01\x00abc')
+        assert list(wal.read(1)) == ['c', 'e', 'f']
+
+        # New log starts a new segment
+        wal = WriteAheadLog(str(tmpdir))
+        assert wal.append('d') == 2
+        wal.close()
+
+        wal.remove(0)
+        assert wal.segments() == [1, 2]
+        assert list(wal.read(0)) == []
+
+        # Quarantined segment is not read anymore
+        failed_path = wal.quarantine(1)
+        assert failed_path.name == '{:012d}.wal.failed'.format(1)
+        assert failed_path.exists()
+        assert wal.segments() == [2]
+        assert list(wal.read(1)) == []
+
+
+class TestBufferedTimeseriesManager(TestCoreDatabase):
+    """Tests for write-ahead log buffered timeseries manager"""
+
+    def test_buffered_timeseries_manager(self, tmpdir):
+
+        t_start = dt.datetime(2017, 1, 1)
+        t_end = dt.datetime(2017, 1, 2)
+        index = pd.date_range(t_start, t_end, freq='min', closed='left')
+
+        store = HDFStoreTimeseriesMgr(str(tmpdir.mkdir('store')))
+        mgr = BufferedTimeseriesMgr(store, str(tmpdir / 'wal'))
+
+        # Writes are visible before compaction but not in store
+        ts = Timeseries(index=index, data=np.arange(len(index), dtype=float))
+        mgr.set('test', 'df', ts)
+        assert mgr.pending_count() == 1
+        assert store.get('test', 'df').dataframe.empty
+        pending_df = mgr.get('test', 'df').dataframe
+        assert pending_df['data'].equals(ts.dataframe['data'])
+        assert not pending_df['update_ts'].isnull().any()
+        assert mgr.stats('test', 'df')['count'] == 1440
+        new_df = mgr.get(
+            'test', 'df', t_start=index[10], t_end=index[20]).dataframe
+        assert len(new_df) == 10
+
+        # Compaction writes to store
+        assert mgr.compact() == 1
+        assert mgr.pending_count() == 0
+        assert mgr.stats('test', 'df') == store.stats('test', 'df')
+        store_df = store.get('test', 'df').dataframe
+        assert store_df['data'].equals(ts.dataframe['data'])
+        # Update timestamps are those of the initial write
+        assert store_df['update_ts'].equals(pending_df['update_ts'])
+
+        # Pending writes and deletes are merged with stored data, in order
+        ts = Timeseries(index=index[:5], data=np.full(5, -1.))
+        mgr.set('test', 'df', ts)
+        mgr.delete('test', 'df', index[3], index[10])
+        ts = Timeseries(index=index[4:6], data=np.full(2, -2.))
+        mgr.set('test', 'df', ts)
+        new_df = mgr.get('test', 'df').dataframe
+        assert len(new_df) == 1440 - 5
+        assert list(new_df['data'][:6]) == [-1, -1, -1, -2, -2, 10]
+        assert mgr.compact() == 3
+        assert store.get('test', 'df').dataframe['data'].equals(
+            new_df['data'])
+
+        # Empty timeseries are ignored
+        mgr.set('test', 'df', Timeseries())
+        assert mgr.pending_count() == 0
+
+    def test_buffered_timeseries_manager_set_many(self, tmpdir):
+
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 2), freq='H',
+            closed='left')
+        store = HDFStoreTimeseriesMgr(str(tmpdir.mkdir('store')))
+        mgr = BufferedTimeseriesMgr(store, str(tmpdir / 'wal'))
+        assert mgr.set_many([]) == []
+
+        # All operations are appended to log at once
+        with mock.patch.object(
+                mgr.wal, 'append_many', wraps=mgr.wal.append_many
+                ) as append_mock:
+            exceptions = mgr.set_many([
+                ('test', 'ts_{}'.format(idx), Timeseries(
+                    index=index, data=np.full(len(index), idx)))
+                for idx in range(3)] + [('test', 'empty', Timeseries())])
+        assert exceptions == [None] * 4
+        assert append_mock.call_count == 1
+        assert mgr.pending_count() == 3
+        for idx in range(3):
+            assert (
+                mgr.get('test', 'ts_{}'.format(idx)).dataframe['data'] == idx
+            ).all()
+        assert mgr.compact() == 3
+        assert (store.get('test', 'ts_2').dataframe['data'] == 2).all()
+
+        # A log write error is reported for all timeseries
+        with mock.patch.object(
+                mgr.wal, 'append_many', side_effect=OSError('Disk full')):
+            exceptions = mgr.set_many([
+                ('test', 'ts_0', Timeseries(index=index, data=range(24))),
+                ('test', 'empty', Timeseries()),
+            ])
+        assert isinstance(exceptions[0], OSError)
+        assert exceptions[1] is None
+        assert mgr.pending_count() == 0
+
+    def test_buffered_timeseries_manager_replay(self, tmpdir):
+
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 2), freq='min',
+            closed='left')
+        store = HDFStoreTimeseriesMgr(str(tmpdir.mkdir('store')))
+
+        # Operations not compacted before shutdown are replayed
+        mgr = BufferedTimeseriesMgr(store, str(tmpdir / 'wal'))
+        mgr.set('test', 'df', Timeseries(index=index, data=np.ones(1440)))
+        mgr.delete('test', 'df', index[0], index[720])
+        mgr.wal.close()
+
+        mgr = BufferedTimeseriesMgr(store, str(tmpdir / 'wal'))
+        assert mgr.pending_count() == 2
+        assert len(mgr.get('test', 'df').dataframe) == 720
+        mgr.stop()
+        assert mgr.pending_count() == 0
+        assert len(store.get('test', 'df').dataframe) == 720
+        assert mgr.wal.segments() == []
+
+    def test_buffered_timeseries_manager_background(self, tmpdir):
+
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 2), freq='min',
+            closed='left')
+        store = HDFStoreTimeseriesMgr(str(tmpdir.mkdir('store')))
+
+        mgr = BufferedTimeseriesMgr(
+            store, str(tmpdir / 'wal'), compact_interval=60, max_pending=2)
+        mgr.set('test', 'df', Timeseries(index=index[:10], data=np.ones(10)))
+        mgr.set('test', 'df', Timeseries(index=index[10:], data=np.ones(1430)))
+        # max_pending reached: compaction is triggered without waiting
+        for _ in range(50):
+            if not mgr.pending_count():
+                break
+            time.sleep(0.1)
+        assert mgr.pending_count() == 0
+        assert len(store.get('test', 'df').dataframe) == 1440
+        mgr.stop()
+
+    def test_buffered_timeseries_manager_read_during_compaction(
+            self, tmpdir):
+        """Check a read never mixes stale pending and newer stored data"""
+
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 2), freq='H',
+            closed='left')
+        store = HDFStoreTimeseriesMgr(str(tmpdir.mkdir('store')))
+        mgr = BufferedTimeseriesMgr(store, str(tmpdir / 'wal'))
+
+        # Block the first main store read
+        reading, proceed = threading.Event(), threading.Event()
+        store_get = store.get
+
+        def slow_get(*args, **kwargs):
+            if not reading.is_set():
+                reading.set()
+                assert proceed.wait(10)
+            return store_get(*args, **kwargs)
+
+        mgr.set('test', 'df', Timeseries(index=index[:2], data=[1., 1.]))
+        result = {}
+        with mock.patch.object(store, 'get', slow_get):
+            reader = threading.Thread(
+                target=lambda: result.update(
+                    df=mgr.get('test', 'df').dataframe))
+            reader.start()
+            assert reading.wait(10)
+
+            # Compact, write newer values over the same timestamps, compact
+            def write():
+                mgr.compact()
+                mgr.set('test', 'df', Timeseries(
+                    index=index[:3], data=[2., 2., 2.]))
+                mgr.compact()
+
+            writer = threading.Thread(target=write)
+            writer.start()
+            # Compaction waits for the read
+            writer.join(0.5)
+            assert writer.is_alive()
+            proceed.set()
+            reader.join(10)
+            writer.join(10)
+
+        # Read state as before compaction
+        assert result['df']['data'].tolist() == [1., 1.]
+        assert mgr.get('test', 'df').dataframe['data'].tolist() == [2.] * 3
+        mgr.stop()
+
+    def test_buffered_timeseries_manager_failed_segment(self, tmpdir):
+        """Check a failing segment is quarantined and doesn't block log"""
+
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), dt.datetime(2017, 1, 2), freq='H',
+            closed='left')
+        store = HDFStoreTimeseriesMgr(str(tmpdir.mkdir('store')))
+        mgr = BufferedTimeseriesMgr(
+            store, str(tmpdir / 'wal'), max_failures=2)
+        store_set = store.set
+
+        def failing_set(site, ts_id, *args, **kwargs):
+            if ts_id == 'poison':
+                raise OSError('Write error')
+            return store_set(site, ts_id, *args, **kwargs)
+
+        ts = Timeseries(index=index, data=np.ones(24))
+        mgr.set('test', 'poison', ts)
+        mgr.set('test', 'df', ts)
+        mgr.wal.rotate()
+        mgr.set('test', 'other', ts)
+        with mock.patch.object(store, 'set', failing_set):
+            # Failed segment is retried, next segments wait
+            with pytest.raises(OSError):
+                mgr.compact()
+            assert mgr.pending_count() == 3
+            assert mgr.wal.segments() == [0, 1]
+            assert store.get('test', 'other').dataframe.empty
+            assert len(mgr.get('test', 'poison').dataframe) == 24
+
+            # Failed too many times: segment is quarantined
+            with mock.patch.object(logger, 'exception') as mock_exception:
+                assert mgr.compact() == 1
+                assert mock_exception.called
+        assert mgr.pending_count() == 0
+        assert mgr.wal.segments() == []
+        assert (tmpdir / 'wal' / '{:012d}.wal.failed'.format(0)).exists()
+        assert mgr.get('test', 'poison').dataframe.empty
+        assert len(store.get('test', 'other').dataframe) == 24
+
+        # Quarantined segment is not replayed
+        mgr.stop()
+        mgr = BufferedTimeseriesMgr(store, str(tmpdir / 'wal'))
+        assert mgr.pending_count() == 0
+        mgr.stop()
@@ -277,3 +277,46 @@ class TestTimeseries(TestCoreModel):
             assert isclose(sample.quality[index], quality_mean)
             assert 0 <= sample.data[index] <= 100
             assert 0 <= sample.quality[index] <= 1
+
+    def test_timeseries_aggregate_missing_values(self):
+        """Check aggregate function on unaligned series with missing values"""
+        index = pd.date_range(
+            dt.datetime(2017, 1, 1), periods=4, freq='D', name='index')
+        ts0 = Timeseries(
+            index=index[:3], data=[1, np.nan, 3], quality=[1, 1, 0.5],
+            update_ts=pd.to_datetime(['2018-01-01', '2018-01-03', None]))
+        ts1 = Timeseries(
+            index=index[1:], data=[2, np.nan, 4], quality=[1, 0, 1],
+            update_ts=pd.to_datetime(['2018-01-02', '2018-01-02', None]))
+
+        # Empty timeseries count for quality mean
+        timeseries = [ts0, ts1, Timeseries()]
+        for operation, expected in (
+                ('sum', [1, 2, 3, 4]),
+                ('mean', [1, 2, 3, 4]),
+                ('min', [1, 2, 3, 4]),
+                ('max', [1, 2, 3, 4]),
+        ):
+            aggregation = Timeseries.aggregate(timeseries, operation)
+            df_agg = aggregation.dataframe
+            assert (df_agg.index == index).all()
+            assert np.allclose(df_agg.data, expected)
+            assert np.allclose(df_agg.quality, [1 / 3, 2 / 3, 0.5 / 3, 1 / 3])
+            assert (
+                df_agg.update_ts.iloc[:2] ==
+                pd.to_datetime(['2018-01-01', '2018-01-03'])).all()
+            assert df_agg.update_ts.iloc[2] == dt.datetime(2018, 1, 2)
+            assert pd.isnull(df_agg.update_ts.iloc[3])
+
+        ts2 = Timeseries(index=index[:2], data=[5, np.nan])
+        aggregation = Timeseries.aggregate([ts0, ts2], 'mean')
+        assert np.allclose(
+            aggregation.dataframe.data, [3, np.nan, 3], equal_nan=True)
+        aggregation = Timeseries.aggregate([ts0, ts2], 'sum')
+        assert np.allclose(aggregation.dataframe.data, [6, 0, 3])
+        aggregation = Timeseries.aggregate([ts0, ts2], 'max')
+        assert np.allclose(
+            aggregation.dataframe.data, [5, np.nan, 3], equal_nan=True)
+
+        assert Timeseries.aggregate([Timeseries()], 'sum').dataframe.empty
+        assert Timeseries.aggregate([], 'sum').dataframe.empty
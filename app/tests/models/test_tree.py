@@ -117,6 +117,25 @@ class TestModelTree(TestCoreModel):
         assert delorean_node.get_label_breadcrumb(
             ' |> ') == 'Vehicle |> Car |> Time travelling machine'
 
+    def test_model_tree_node_copy(self):
+        """Test tree node copy."""
+
+        car_copy = self.car_node.copy()
+        assert car_copy is not self.car_node
+        assert car_copy.name == 'car'
+        assert car_copy.label == 'Car'
+        assert not car_copy.has_parent
+        assert car_copy.get_son_names(indirect=True) == ['delorean']
+        delorean_copy = car_copy.get_son('delorean')
+        assert delorean_copy is not self.delorean_node
+        assert delorean_copy.label == 'Time travelling machine'
+        assert delorean_copy.parent is car_copy
+
+        # copy can be added to another tree, original tree is unchanged
+        Node('garage').add_child(car_copy)
+        assert self.car_node.parent is self.vehicle_tree
+        assert len(self.car_node.children) == 1
+
     def test_model_tree_node_errors(self):
         """Tests tree node exceptions."""
 
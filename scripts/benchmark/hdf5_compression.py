@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Compare HDF5 compression codecs of the hdfstore timeseries backend
+
+Writes a minute resolution timeseries in daily batches, like a live
+ingestion, then reads it back. Reports write and read throughput and disk
+usage for each compression library and level. Codecs not available in the
+local PyTables build are skipped.
+
+Usage: hdf5_compression.py [--days DAYS] [--partition PARTITION]
+    [--codecs COMPLIB:COMPLEVEL [COMPLIB:COMPLEVEL ...]]
+"""
+
+import argparse
+import datetime as dt
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bemserver.models import Timeseries
+from bemserver.database.timeseries.hdfstore import (
+    HDFStoreTimeseriesMgr, check_compression)
+
+
+SITE = 'site'
+TS_ID = 'ts'
+CODECS = [
+    'zlib:9', 'zlib:5', 'zlib:1', 'blosc:blosclz:5', 'blosc:lz4:5',
+    'blosc:lz4hc:5', 'blosc:zstd:5', 'blosc:zlib:5', 'bzip2:5', 'lzo:5',
+]
+
+
+def make_batches(days):
+    start = dt.datetime(2020, 1, 1)
+    for day in range(days):
+        index = pd.date_range(
+            start + dt.timedelta(days=day), periods=24 * 60, freq='T',
+            name='index')
+        # Smooth signal with noise, like a sensor measure
+        data = (
+            20 + 5 * np.sin(np.arange(len(index)) * 2 * np.pi / len(index)) +
+            np.random.normal(scale=.1, size=len(index))).round(2)
+        yield Timeseries(index=index, data=data, quality=np.ones(len(index)))
+
+
+def disk_usage(dir_path):
+    return sum(
+        f.stat().st_size for f in Path(dir_path).glob('**/*') if f.is_file())
+
+
+def run(codec, batches, partition):
+    complib, _, complevel = codec.rpartition(':')
+    complevel = int(complevel)
+    try:
+        check_compression(complib, complevel)
+    except ValueError as exc:
+        print('{:<18}{}'.format(codec, exc))
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        (Path(tmp_dir) / SITE).mkdir()
+        mgr = HDFStoreTimeseriesMgr(
+            tmp_dir, partition=partition, complib=complib,
+            complevel=complevel)
+
+        start = time.perf_counter()
+        for ts_obj in batches:
+            mgr.set(SITE, TS_ID, ts_obj, set_update_ts=False)
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = len(mgr.get(SITE, TS_ID).dataframe)
+        read_time = time.perf_counter() - start
+
+        print('{:<18}{:>10}{:>14.0f}{:>14.0f}{:>12.1f}'.format(
+            codec, rows, rows / write_time, rows / read_time,
+            disk_usage(tmp_dir) / 2 ** 20))
+
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--days', type=int, default=365)
+parser.add_argument('--partition', choices=('month', 'year'))
+parser.add_argument('--codecs', nargs='+', default=CODECS)
+args = parser.parse_args()
+
+# Same values for all codecs
+batches = list(make_batches(args.days))
+update_ts = dt.datetime.utcnow()
+for batch in batches:
+    batch.set_update_timestamp(update_ts)
+
+print('{:<18}{:>10}{:>14}{:>14}{:>12}'.format(
+    'codec', 'rows', 'write (row/s)', 'read (row/s)', 'size (MB)'))
+for codec in args.codecs:
+    run(codec, batches, args.partition)
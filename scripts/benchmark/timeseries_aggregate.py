@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Compare row-wise and vectorized multi-series timeseries aggregation
+
+Aggregates resampled timeseries like GET /timeseries/aggregate, for each
+aggregation operation. Reports time spent with the former implementation
+(concatenated DataFrame reduced row by row, quality mean with a Python
+function) and with the current implementation (NumPy arrays accumulated
+series by series), for 100 series of 100k buckets. One series in ten has
+missing buckets, so that series are not aligned.
+
+Usage: timeseries_aggregate.py [--series SERIES] [--buckets BUCKETS]
+"""
+
+import argparse
+import datetime as dt
+import time
+
+import numpy as np
+import pandas as pd
+
+from bemserver.models import Timeseries
+
+
+def rowwise_aggregate(timeseries, operation):
+    """Former Timeseries.aggregate implementation"""
+    def namean(serie):
+        return serie.sum() / serie.size
+
+    concat = pd.concat([ts.dataframe for ts in timeseries], axis=1)
+    if concat.empty:
+        return Timeseries()
+
+    return Timeseries(
+        index=concat.index,
+        data=concat[Timeseries.DATA_COL].agg(operation, axis=1),
+        quality=concat[Timeseries.QUALITY_COL].agg(namean, axis=1),
+        update_ts=concat[Timeseries.UPDATE_TIMESTAMP_COL].agg('max', axis=1))
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    ret = func(*args)
+    return time.perf_counter() - start, ret
+
+
+def generate(series, buckets):
+    index = pd.date_range(
+        dt.datetime(2020, 1, 1), periods=buckets, freq='T', name='index')
+    update_ts = dt.datetime.utcnow()
+    for idx in range(series):
+        ts_index = index
+        if idx % 10 == 0:
+            ts_index = index[np.random.rand(buckets) > 0.1]
+        timeseries = Timeseries(
+            index=ts_index, data=np.random.rand(len(ts_index)),
+            quality=np.random.randint(2, size=len(ts_index)))
+        timeseries.set_update_timestamp(update_ts)
+        yield timeseries
+
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--series', type=int, default=100)
+parser.add_argument('--buckets', type=int, default=100000)
+args = parser.parse_args()
+
+timeseries = list(generate(args.series, args.buckets))
+
+print('{} series x {} buckets'.format(args.series, args.buckets))
+print('{:>10}{:>12}{:>12}{:>10}'.format(
+    'operation', 'rows (s)', 'fast (s)', 'speedup'))
+for operation in Timeseries.AGG_OPERATIONS:
+    row_time, row_ts = timeit(rowwise_aggregate, timeseries, operation)
+    col_time, col_ts = timeit(Timeseries.aggregate, timeseries, operation)
+    assert np.allclose(
+        row_ts.dataframe[Timeseries.DATA_COL],
+        col_ts.dataframe[Timeseries.DATA_COL], equal_nan=True)
+    print('{:>10}{:>12.3f}{:>12.3f}{:>10.1f}'.format(
+        operation, row_time, col_time, row_time / col_time))
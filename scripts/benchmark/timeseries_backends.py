@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Compare HDF5 and Parquet timeseries backends
+
+Writes a minute resolution timeseries in daily batches, like a live
+ingestion, then reads it back. Reports write time, full read time, one day
+range read time and disk usage for each backend.
+
+Usage: timeseries_backends.py [--days DAYS]
+"""
+
+import argparse
+import datetime as dt
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bemserver.models import Timeseries
+from bemserver.database.timeseries.hdfstore import HDFStoreTimeseriesMgr
+from bemserver.database.timeseries.parquet import ParquetTimeseriesMgr
+
+
+SITE = 'site'
+TS_ID = 'ts'
+
+
+def make_batches(days):
+    start = dt.datetime(2020, 1, 1)
+    for day in range(days):
+        index = pd.date_range(
+            start + dt.timedelta(days=day), periods=24 * 60, freq='T',
+            name='index')
+        yield Timeseries(
+            index=index, data=np.random.rand(len(index)),
+            quality=np.ones(len(index)))
+
+
+def disk_usage(dir_path):
+    return sum(
+        f.stat().st_size for f in Path(dir_path).glob('**/*') if f.is_file())
+
+
+def run(name, mgr_cls, days):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        (Path(tmp_dir) / SITE).mkdir()
+        mgr = mgr_cls(tmp_dir, partition='month')
+
+        start = time.perf_counter()
+        for ts_obj in make_batches(days):
+            mgr.set(SITE, TS_ID, ts_obj)
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        full = mgr.get(SITE, TS_ID)
+        full_read_time = time.perf_counter() - start
+
+        t_start = dt.datetime(2020, 1, 1) + dt.timedelta(days=days // 2)
+        start = time.perf_counter()
+        mgr.get(
+            SITE, TS_ID, t_start=t_start,
+            t_end=t_start + dt.timedelta(days=1))
+        range_read_time = time.perf_counter() - start
+
+        print(
+            '{:<10}{:>10}{:>12.3f}{:>12.3f}{:>12.4f}{:>12.1f}'.format(
+                name, len(full.dataframe), write_time, full_read_time,
+                range_read_time, disk_usage(tmp_dir) / 2 ** 20))
+
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--days', type=int, default=90)
+args = parser.parse_args()
+
+print('{:<10}{:>10}{:>12}{:>12}{:>12}{:>12}'.format(
+    'backend', 'rows', 'write (s)', 'read (s)', '1 day (s)', 'size (MB)'))
+run('hdfstore', HDFStoreTimeseriesMgr, args.days)
+run('parquet', ParquetTimeseriesMgr, args.days)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Compare row-wise and column-wise timeseries values serialization
+
+Dumps a timeseries to a list of dicts with ISO 8601 timestamps, like GET
+/timeseries/<id>, and loads such a list, like PATCH /timeseries/<id>,
+including payload validation. Reports time spent with the former row-wise
+implementation (per-value marshmallow validation and Python loops) and with
+the current column-wise implementation, for 10k, 100k and 1M values.
+
+Usage: timeseries_serialization.py [--sizes SIZE [SIZE ...]]
+"""
+
+import argparse
+import datetime as dt
+import time
+
+import numpy as np
+import pandas as pd
+
+from bemserver.models import Timeseries
+from bemserver.api.views.timeseries.schemas import (
+    TimeseriesSchema, TimeseriesLoadSchema)
+from bemserver.api.views.timeseries.tsio import tsload, tsdump
+
+
+def rowwise_tsload(data_list):
+    """Former tsload implementation"""
+    dataframe = pd.DataFrame(data_list)
+    dataframe = dataframe.rename(columns={
+        'timestamp': Timeseries.TIMESTAMPS_COL,
+        'value': Timeseries.DATA_COL,
+        'update_ts': Timeseries.UPDATE_TIMESTAMP_COL,
+        'quality': Timeseries.QUALITY_COL,
+    })
+    return Timeseries.from_dataframe(dataframe)
+
+
+def rowwise_tsdump(timeseries):
+    """Former tsdump implementation, with ISO 8601 timestamps"""
+    dataframe = timeseries.dataframe.rename(columns={
+        Timeseries.DATA_COL: 'value',
+        Timeseries.UPDATE_TIMESTAMP_COL: 'update_ts',
+        Timeseries.QUALITY_COL: 'quality',
+    })
+    dataframe.index.names = ['timestamp']
+    dataframe = dataframe.where((pd.notnull(dataframe)), None)
+    dataframe.reset_index(inplace=True)
+    result = []
+    for src_row in dataframe.values:
+        row = {}
+        for key, val in zip(dataframe.columns, src_row):
+            if key in ('timestamp', 'update_ts',):
+                val = (
+                    None if pd.isnull(val)
+                    else val.replace(tzinfo=dt.timezone.utc).isoformat())
+            row[key] = val
+        result.append(row)
+    return result
+
+
+def rowwise_load(data_list):
+    data = TimeseriesSchema().load({'data': data_list})[0]
+    return rowwise_tsload(data['data'])
+
+
+def columnwise_load(data_list):
+    data = TimeseriesLoadSchema().load({'data': data_list})[0]
+    return tsload(data['data'], parse=True)
+
+
+def columnwise_dump(timeseries):
+    return tsdump(timeseries, to_isotime=True)
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run(size):
+    index = pd.date_range(
+        dt.datetime(2020, 1, 1), periods=size, freq='T', name='index')
+    data = np.random.rand(size)
+    # Some missing values
+    data[::100] = np.nan
+    timeseries = Timeseries(index=index, data=data, quality=np.ones(size))
+    timeseries.set_update_timestamp(dt.datetime.utcnow())
+    # Payload as decoded from a JSON request
+    payload = [
+        {'timestamp': row['timestamp'], 'value': row['value']}
+        for row in columnwise_dump(timeseries) if row['value'] is not None]
+
+    row_dump = timeit(rowwise_tsdump, timeseries)
+    col_dump = timeit(columnwise_dump, timeseries)
+    row_load = timeit(rowwise_load, payload)
+    col_load = timeit(columnwise_load, payload)
+    print((
+        '{:>10}{:>12.3f}{:>12.3f}{:>10.1f}{:>12.3f}{:>12.3f}{:>10.1f}').format(
+        size, row_dump, col_dump, row_dump / col_dump,
+        row_load, col_load, row_load / col_load))
+
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument(
+    '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+args = parser.parse_args()
+
+print('{:>10}{:>12}{:>12}{:>10}{:>12}{:>12}{:>10}'.format(
+    'rows', 'dump (s)', 'fast (s)', 'speedup',
+    'load (s)', 'fast (s)', 'speedup'))
+for size in args.sizes:
+    run(size)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Build resampling rollups of timeseries stored in HDF5 files
+
+Rollups of all timeseries are computed from raw data. This is needed once
+for data written before rollups were enabled (TIMESERIES_BACKEND_ROLLUPS),
+or written while they were disabled.
+
+Both single file (<site>/<ts_id>.hdf5) and partitioned
+(<site>/<ts_id>/<period>.hdf5) layouts are supported.
+
+The application must be stopped or in maintenance mode.
+
+Usage: build_rollups.py <storage dir>
+"""
+
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from bemserver.database.timeseries import rollups
+
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('storage_dir', help='Timeseries storage directory')
+args = parser.parse_args()
+
+storage_dir = Path(args.storage_dir)
+
+for file_path in sorted(storage_dir.glob('**/*.hdf5')):
+    print('Building rollups for {}'.format(
+        file_path.relative_to(storage_dir)))
+    with pd.HDFStore(str(file_path), mode='a') as store:
+        for key in store.keys():
+            if not rollups.is_rollup_key(key):
+                rollups.rebuild(store, key)
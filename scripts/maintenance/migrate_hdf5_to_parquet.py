@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Copy timeseries from HDF5 storage to Parquet storage
+
+Both single file (<site>/<ts_id>.hdf5) and partitioned
+(<site>/<ts_id>/<period>.hdf5) HDF5 layouts are supported. Update timestamps
+are kept. HDF5 files are left untouched.
+
+The application must be stopped or in maintenance mode. Once data is copied,
+set TIMESERIES_BACKEND to 'parquet' and TIMESERIES_BACKEND_STORAGE_DIR to the
+Parquet storage directory.
+
+Usage: migrate_hdf5_to_parquet.py <hdf5 dir> <parquet dir>
+"""
+
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from bemserver.models import Timeseries
+from bemserver.database.timeseries import rollups
+from bemserver.database.timeseries.parquet import ParquetTimeseriesMgr
+
+
+CHUNKSIZE = 500000
+
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('hdf5_dir', help='HDF5 timeseries storage directory')
+parser.add_argument('parquet_dir', help='Parquet timeseries storage directory')
+parser.add_argument(
+    '--partition', choices=ParquetTimeseriesMgr.PARTITIONS, default='month')
+parser.add_argument(
+    '--compression', choices=ParquetTimeseriesMgr.COMPRESSIONS,
+    default='zstd')
+args = parser.parse_args()
+
+hdf5_dir = Path(args.hdf5_dir)
+mgr = ParquetTimeseriesMgr(
+    args.parquet_dir, partition=args.partition, compression=args.compression)
+
+for file_path in sorted(hdf5_dir.glob('**/*.hdf5')):
+    rel_path = file_path.relative_to(hdf5_dir)
+    site = rel_path.parts[0]
+    print('Migrating {}'.format(rel_path))
+    with pd.HDFStore(str(file_path), mode='r') as store:
+        for key in store.keys():
+            if rollups.is_rollup_key(key):
+                continue
+            ts_id = key.lstrip('/')
+            for chunk in store.select(key, chunksize=CHUNKSIZE):
+                mgr.set(
+                    site, ts_id, Timeseries.from_dataframe(chunk),
+                    set_update_ts=False)
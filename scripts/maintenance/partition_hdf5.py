@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Move timeseries stored as single HDF5 files to a partitioned layout
+
+Each <site>/<ts_id>.hdf5 file is rewritten as <site>/<ts_id>/<period>.hdf5
+files, then removed. Update timestamps are kept. Rollups are not copied:
+they must be built again with build_rollups.py.
+
+The application must be stopped or in maintenance mode.
+
+Usage: partition_hdf5.py <storage dir> <month|year>
+"""
+
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from bemserver.models import Timeseries
+from bemserver.database.timeseries import rollups
+from bemserver.database.timeseries.hdfstore import HDFStoreTimeseriesMgr
+
+
+CHUNKSIZE = 500000
+
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('storage_dir', help='Timeseries storage directory')
+parser.add_argument('partition', choices=HDFStoreTimeseriesMgr.PARTITIONS)
+args = parser.parse_args()
+
+storage_dir = Path(args.storage_dir)
+mgr = HDFStoreTimeseriesMgr(str(storage_dir), partition=args.partition)
+
+for file_path in sorted(storage_dir.glob('*/*.hdf5')):
+    site = file_path.parent.name
+    print('Partitioning {}'.format(file_path.relative_to(storage_dir)))
+    with pd.HDFStore(str(file_path), mode='r') as store:
+        for key in store.keys():
+            if rollups.is_rollup_key(key):
+                continue
+            ts_id = key.lstrip('/')
+            for chunk in store.select(key, chunksize=CHUNKSIZE):
+                mgr.set(
+                    site, ts_id, Timeseries.from_dataframe(chunk),
+                    set_update_ts=False)
+    file_path.unlink()
@@ -1,10 +1,28 @@
 #!/usr/bin/env python3
+"""Repack HDF5 files of the hdfstore timeseries backend
 
+Files are rewritten with the compression of their site, read from
+TIMESERIES_BACKEND_HDFSTORE_SITE_COMPRESSION setting, or with the default
+compression: --complib/--complevel if given, else
+TIMESERIES_BACKEND_HDFSTORE_COMPLIB/COMPLEVEL settings.
+
+Usage: repack_hdf5.py [--complib COMPLIB] [--complevel COMPLEVEL]
+"""
+
+import argparse
+import json
 import os
 from pathlib import Path
 import subprocess
 import shutil
 
+from flask import Config
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--complib')
+parser.add_argument('--complevel', type=int)
+args = parser.parse_args()
+
 DATA_PATH = Path(os.getenv('BEMSERVER_SETTINGS_PATH'))
 VENV = Path(os.getenv('VIRTUAL_ENV'))
 
@@ -13,6 +31,36 @@ HDF5_DIR = DATA_PATH / 'hdf5'
 TMP_DIR = DATA_PATH / 'tmp_dir_repack'
 TMP_DIR.mkdir(exist_ok=True)
 
+SETTINGS = Config(str(DATA_PATH))
+SETTINGS.from_pyfile('settings.cfg', silent=True)
+COMPRESSION = (
+    args.complib or SETTINGS.get(
+        'TIMESERIES_BACKEND_HDFSTORE_COMPLIB', 'zlib'),
+    args.complevel if args.complevel is not None else SETTINGS.get(
+        'TIMESERIES_BACKEND_HDFSTORE_COMPLEVEL', 9),
+)
+SITE_COMPRESSION = {
+    site: tuple(compression) for site, compression in (
+        SETTINGS.get('TIMESERIES_BACKEND_HDFSTORE_SITE_COMPRESSION') or {}
+    ).items()}
+
+# Files not modified since last repack (e.g. past periods partitions when
+# timeseries are partitioned) don't need to be repacked again, unless their
+# site compression changed. Compression used for each site is recorded next
+# to the last repack marker.
+LAST_REPACK_FILE = DATA_PATH / 'hdf5_last_repack'
+LAST_REPACK = (
+    LAST_REPACK_FILE.stat().st_mtime if LAST_REPACK_FILE.exists() else None)
+LAST_COMPRESSION_FILE = DATA_PATH / 'hdf5_last_repack_compression.json'
+try:
+    with LAST_COMPRESSION_FILE.open() as compression_file:
+        LAST_COMPRESSION = {
+            site: tuple(compression)
+            for site, compression in json.load(compression_file).items()}
+except FileNotFoundError:
+    LAST_COMPRESSION = {}
+compression_by_site = {}
+
 
 for p in HDF5_DIR.rglob("*.hdf5"):
     old_path = p.resolve()
@@ -23,9 +71,24 @@ for p in HDF5_DIR.rglob("*.hdf5"):
     tmp_path.parent.mkdir(parents=True, exist_ok=True)
     tmp_path = tmp_path.parent.resolve() / tmp_path.name
 
+    site = p.relative_to(HDF5_DIR).parts[0]
+    complib, complevel = SITE_COMPRESSION.get(site, COMPRESSION)
+    compression_by_site[site] = [complib, complevel]
+
+    if (LAST_REPACK is not None and
+            old_path.stat().st_mtime < LAST_REPACK and
+            LAST_COMPRESSION.get(site) == (complib, complevel)):
+        os.link(str(old_path), str(tmp_path))
+        continue
+
     res = subprocess.run(
-        [str(PTREPACK), str(old_path), '-o', str(tmp_path), '--complevel=9'])
+        [str(PTREPACK), str(old_path), '-o', str(tmp_path),
+         '--complib={}'.format(complib),
+         '--complevel={}'.format(complevel)])
 
 
 shutil.rmtree(str(HDF5_DIR))
 TMP_DIR.replace(HDF5_DIR)
+with LAST_COMPRESSION_FILE.open('w') as compression_file:
+    json.dump(compression_by_site, compression_file)
+LAST_REPACK_FILE.touch()
@@ -52,7 +52,7 @@ echo $(date) "Apache reloaded"
 # Repack
 # Redirect stderr to stdout and filter out NaturalNameWarning
 echo $(date) "Repack..."
-$REPACK_SCRIPT 2>&1 | grep -v NaturalNameWarning
+$REPACK_SCRIPT "$@" 2>&1 | grep -v NaturalNameWarning
 echo $(date) "Repack done"
 
 # Give ownership of repacked files to apache